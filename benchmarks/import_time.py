@@ -0,0 +1,63 @@
+"""
+Measure how long a fresh interpreter takes to start, to import plasmidin and to find the cut sites of one plasmid.
+Each measurement is the wall clock time of a new process, the median of --repeat runs. Results are printed as JSON
+
+The --target-ms budget is for what plasmidin itself adds. Importing plasmidin.plasmidin must fit it outright.
+Finding cut sites needs numpy and the Bio.Restriction enzyme classes, which take longer than the budget to import
+on their own, so the workflow is measured against importing those dependencies (dependency_floor) and must add less
+than the budget on top of it
+
+    python benchmarks/import_time.py --repeat 10 --target-ms 150
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+from os import path
+
+REPO = path.dirname(path.dirname(path.abspath(__file__)))
+PLASMID = path.join(REPO, 'data', 'pUC19_plasmid.fa')
+
+SNIPPETS = {
+    'interpreter' : 'pass',
+    'import_plasmidin' : 'import plasmidin.plasmidin',
+    'dependency_floor' : 'import numpy, Bio.Restriction',
+    'cut_sites_workflow' : f'from plasmidin.plasmidin import RSFinder\nRSFinder({PLASMID!r}, False, lazy = True).all_cut_enzymes',
+}
+#Modules that a cut site only workflow should not import
+HEAVY_MODULES = ['pandas', 'reportlab', 'Bio.SeqIO']
+
+def run_snippet(snippet):
+    """Return the seconds a new interpreter takes to run snippet and exit"""
+    start = time.perf_counter()
+    subprocess.run([sys.executable, '-c', snippet], check = True, cwd = REPO)
+    return time.perf_counter() - start
+
+def loaded_modules(snippet):
+    """Return the HEAVY_MODULES that running snippet imports"""
+    check = snippet + f'\nimport json, sys; print(json.dumps([module for module in {HEAVY_MODULES!r} if module in sys.modules]))'
+    result = subprocess.run([sys.executable, '-c', check], capture_output = True, text = True, check = True, cwd = REPO)
+    return json.loads(result.stdout.splitlines()[-1])
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type = int, default = 10)
+    parser.add_argument('--target-ms', type = float, default = 150)
+    args = parser.parse_args(argv)
+
+    results = {}
+    for name, snippet in SNIPPETS.items():
+        times = [run_snippet(snippet) * 1000 for _ in range(args.repeat)]
+        results[name] = {'median_ms' : round(statistics.median(times), 1), 'min_ms' : round(min(times), 1)}
+    workflow = results['cut_sites_workflow']
+    workflow['heavy_modules_loaded'] = loaded_modules(SNIPPETS['cut_sites_workflow'])
+    workflow['overhead_ms'] = round(workflow['median_ms'] - results['dependency_floor']['median_ms'], 1)
+    results['import_plasmidin']['target_ms'] = workflow['target_ms'] = args.target_ms
+    results['import_plasmidin']['within_target'] = results['import_plasmidin']['median_ms'] <= args.target_ms
+    workflow['within_target'] = workflow['overhead_ms'] <= args.target_ms
+    print(json.dumps(results, indent = 2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,165 @@
+"""
+Time the RSFinder, RSInserter and PlasmidDrawer hot paths on data/pUC19_plasmid.fa and generated 10 kb, 100 kb and 5 Mb
+backbones, each stage separately. Every benchmark records the median and min of --repeat timed runs and the peak memory
+(tracemalloc) of one more run. Results are printed or written as JSON. Given a --baseline (an earlier --output) every
+benchmark gets a threshold of baseline median * --tolerance and the exit code is 1 if any median is over its threshold
+
+    python benchmarks/pipeline.py --output results.json
+    python benchmarks/pipeline.py --inputs pUC19 10kb --baseline results.json --tolerance 1.25
+"""
+import argparse
+import json
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from os import path
+
+import numpy
+from Bio.Seq import Seq
+
+REPO = path.dirname(path.dirname(path.abspath(__file__)))
+sys.path.insert(0, REPO)
+
+from plasmidin.cache import clear_site_cache
+from plasmidin.plasmid_diagrams import PlasmidDrawer
+from plasmidin.plasmidin import RSFinder, RSInserter, parse_input_seq
+
+INPUTS = {'pUC19' : None, '10kb' : 10_000, '100kb' : 100_000, '5Mb' : 5_000_000}
+INSERT = path.join(REPO, 'data', 'insert_XbaI_BamHI.fa')
+ENZYMES = ('XbaI', 'BamHI')
+SITES = {'XbaI' : 'TCTAGA', 'BamHI' : 'GGATCC'}
+SEED = 514
+SUPPLIERS = ['N', 'B']
+DRAW_SETTINGS = {'pagesize' : 'A4', 'circle_core' : 0.5, 'track_size' : 0.1}
+
+def synthetic_backbone(length, seed = SEED):
+    """
+    Return a random backbone of length bases with exactly one XbaI and one BamHI site,
+    a third and two thirds of the way along, so the insert can be integrated at every size
+    """
+    bases = numpy.frombuffer(b'ACGT', dtype = numpy.uint8)[numpy.random.default_rng(seed).integers(0, 4, length)]
+    seq = bases.tobytes().decode('ascii')
+    #Break up every chance site, repeating as a change could make a new one
+    while any(site in seq for site in SITES.values()):
+        for site in SITES.values():
+            seq = seq.replace(site, site[:3] + 'A' + site[4:] if site[3] != 'A' else site[:3] + 'T' + site[4:])
+    for position, site in zip((length // 3, 2 * length // 3), SITES.values()):
+        seq = seq[:position] + site + seq[position + len(site):]
+    return Seq(seq)
+
+def load_backbone(name):
+    if INPUTS[name] is None:
+        return parse_input_seq(path.join(REPO, 'data', 'pUC19_plasmid.fa'))
+    return synthetic_backbone(INPUTS[name])
+
+def stages(backbone, insert, output_dir):
+    """
+    Return the benchmark stages for a backbone as (name, setup, run). setup is not timed and returns the argument
+    given to run. The process wide site cache is cleared in every setup so cut sites are searched each time
+    """
+    def fresh(make):
+        def setup():
+            clear_site_cache()
+            return make()
+        return setup
+
+    rsfinder = RSFinder(backbone, False)
+    rsinserter = RSInserter(backbone, insert)
+    rsinserter.integrate_seq(ENZYMES, ENZYMES)
+    integrated = rsinserter.integrated_rsfinder
+    integrated.create_enzyme_records(max_n_cut_sites = 2)
+    diagram_file = path.join(output_dir, 'benchmark_map.pdf')
+
+    return [
+        ('RSFinder.__init__', fresh(lambda: None), lambda _: RSFinder(backbone, False)),
+        ('RSFinder._make_table', fresh(lambda: rsfinder), lambda finder: finder._make_table(finder.all_cut_enzymes)),
+        ('RSFinder.filter_supplier', fresh(lambda: rsfinder), lambda finder: finder.filter_supplier(SUPPLIERS)),
+        ('RSInserter.__init__', fresh(lambda: None), lambda _: RSInserter(backbone, insert)),
+        ('RSInserter.integrate_seq', fresh(lambda: RSInserter(backbone, insert)), lambda inserter: inserter.integrate_seq(ENZYMES, ENZYMES)),
+        ('RSFinder.create_enzyme_records', fresh(lambda: RSFinder(integrated.input_seq, False)), lambda finder: finder.create_enzyme_records(max_n_cut_sites = 2)),
+        ('PlasmidDrawer.draw_gd_diagram', lambda: PlasmidDrawer(integrated.input_seq, 'benchmark', integrated.feature_info),
+            lambda drawer: drawer.draw_gd_diagram(diagram_file, 'circular', DRAW_SETTINGS)),
+    ]
+
+def measure(setup, run, repeat):
+    """Return the seconds of repeat timed runs and the peak MB allocated by one more run"""
+    times = []
+    for _ in range(repeat):
+        argument = setup()
+        start = time.perf_counter()
+        run(argument)
+        times.append(time.perf_counter() - start)
+
+    argument = setup()
+    tracemalloc.start()
+    try:
+        run(argument)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return times, peak / 1024 ** 2
+
+def run_benchmarks(input_names, repeat = 5, stage_names = None):
+    """Return {input/stage : result} for every stage (or those in stage_names) of every input"""
+    insert = parse_input_seq(INSERT)
+    results = {}
+    with tempfile.TemporaryDirectory() as output_dir:
+        for input_name in input_names:
+            backbone = load_backbone(input_name)
+            for stage_name, setup, run in stages(backbone, insert, output_dir):
+                if stage_names and stage_name not in stage_names:
+                    continue
+                times, peak_mb = measure(setup, run, repeat)
+                results[f'{input_name}/{stage_name}'] = {
+                    'input' : input_name,
+                    'stage' : stage_name,
+                    'length' : len(backbone),
+                    'repeat' : repeat,
+                    'median_s' : statistics.median(times),
+                    'min_s' : min(times),
+                    'peak_mb' : round(peak_mb, 3),
+                    }
+                print(f'{input_name:>6} {stage_name:<32} {statistics.median(times):10.4f} s {peak_mb:10.2f} MB', file = sys.stderr)
+    return results
+
+def apply_thresholds(results, baseline, tolerance):
+    """Add a threshold_s (baseline median * tolerance) and regressed flag to every result in the baseline"""
+    regressions = []
+    for key, result in results.items():
+        if key not in baseline:
+            continue
+        result['baseline_s'] = baseline[key]['median_s']
+        result['threshold_s'] = baseline[key]['median_s'] * tolerance
+        result['regressed'] = result['median_s'] > result['threshold_s']
+        if result['regressed']:
+            regressions.append(key)
+    return regressions
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--inputs', nargs = '+', choices = list(INPUTS), default = list(INPUTS))
+    parser.add_argument('--stages', nargs = '+', default = None, help = 'only run these stages, e.g. RSFinder.__init__')
+    parser.add_argument('--repeat', type = int, default = 5)
+    parser.add_argument('--output', default = None, help = 'a file to write the JSON results to rather than stdout')
+    parser.add_argument('--baseline', default = None, help = 'the JSON results of an earlier run to compare against')
+    parser.add_argument('--tolerance', type = float, default = 1.25, help = 'how many times slower than the baseline counts as a regression')
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.inputs, args.repeat, args.stages)
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as handle:
+            regressions = apply_thresholds(results, json.load(handle)['results'], args.tolerance)
+
+    report = json.dumps({'repeat' : args.repeat, 'tolerance' : args.tolerance, 'regressions' : regressions, 'results' : results}, indent = 2)
+    if args.output:
+        with open(args.output, 'w') as handle:
+            handle.write(report)
+    else:
+        print(report)
+    return 1 if regressions else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
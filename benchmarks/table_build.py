@@ -0,0 +1,62 @@
+"""
+Time building the restriction enzyme table on pUC19 and a synthetic 100 kb BAC,
+comparing the row by row DataFrame._append table with the columnar make_enzyme_table
+
+    python3 benchmarks/table_build.py
+"""
+import random
+import sys
+from os import path
+from timeit import repeat
+
+import pandas
+from Bio.Seq import Seq
+
+REPO = path.dirname(path.dirname(path.abspath(__file__)))
+sys.path.insert(0, REPO)
+
+from plasmidin.plasmidin import RSFinder, make_enzyme_table
+
+def append_enzyme_table(enzyme_dict, rb):
+    """The previous RSFinder._make_table, kept here as the baseline"""
+    data = []
+    for enzyme_name, values in enzyme_dict.items():
+        enzyme = rb.get(enzyme_name)
+        data.append({
+            'Name' : enzyme_name,
+            'N_sites' : len(values),
+            'Cut_Locations' : '; '.join(map(str, values)),
+            'Cut_type' : enzyme.overhang(),
+            'CommerciallyAvailable' : enzyme.is_comm(),
+            'Suppliers' : '; '.join(enzyme.supplier_list()),
+        })
+
+    enzyme_df = pandas.DataFrame(columns = data[0].keys())
+    for row in data:
+        enzyme_df = enzyme_df._append(row, ignore_index = True)
+    return enzyme_df
+
+def random_seq(length, seed = 0):
+    rng = random.Random(seed)
+    return Seq(''.join(rng.choices('ACGT', k = length)))
+
+def best_time(func, number = 5, repeats = 3):
+    return min(repeat(func, number = number, repeat = repeats)) / number
+
+def main():
+    inputs = {
+        'pUC19' : path.join(REPO, 'data', 'pUC19_plasmid.fa'),
+        'BAC_100kb' : random_seq(100_000),
+    }
+    print(f'{"sequence":<12}{"enzymes":>8}{"_append (ms)":>14}{"columnar (ms)":>15}{"speed up":>10}')
+    for seq_name, seq in inputs.items():
+        rsfinder = RSFinder(seq, False)
+        cut_enzymes = rsfinder.all_cut_enzymes
+        rb = rsfinder.rb
+
+        append_time = best_time(lambda: append_enzyme_table(cut_enzymes, rb))
+        columnar_time = best_time(lambda: make_enzyme_table(cut_enzymes, rb))
+        print(f'{seq_name:<12}{len(cut_enzymes):>8}{append_time * 1000:>14.1f}{columnar_time * 1000:>15.1f}{append_time / columnar_time:>9.1f}x')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,5 @@
+import sys
+
+from plasmidin.cli import main
+
+sys.exit(main())
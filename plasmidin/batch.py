@@ -0,0 +1,124 @@
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from itertools import islice
+from os import cpu_count
+
+from Bio.Restriction import RestrictionBatch
+from Bio.Seq import Seq
+
+from plasmidin.plasmidin import RSFinder, default_batch, remove_ambiguous_enzymes
+from plasmidin.profiling import Profiler, active_profiler
+
+RecordScan = namedtuple('RecordScan', ['record_id', 'single_cut_enzymes', 'all_cut_enzymes', 'enzyme_table_rows'])
+
+#Set once in each worker process by _init_worker, from the settings given to map_chunks
+_worker_settings = None
+
+def iter_records(records):
+    """
+    Yield (record_id, sequence string) from a (multi-)fasta path or an iterable of
+    SeqRecord or Seq objects. Seq objects are given their position as the record_id
+    """
+    if isinstance(records, str):
+        from Bio import SeqIO
+        records = SeqIO.parse(records, 'fasta')
+    for i, record in enumerate(records):
+        if isinstance(record, Seq):
+            yield str(i), str(record)
+        else:
+            yield record.id, str(record.seq)
+
+def _chunks(iterable, chunk_size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+def _init_worker(setup, settings):
+    global _worker_settings
+    _worker_settings = setup(settings)
+
+def _run_chunk(work, chunk, profile = False):
+    """Run work on a chunk in a worker. Returns (results, None or the (Profiler.origin_time, Stage records) of the chunk)"""
+    if not profile:
+        return work(_worker_settings, chunk), None
+    with Profiler() as profiler:
+        results = work(_worker_settings, chunk)
+    return results, (profiler.origin_time, profiler.stages)
+
+def map_chunks(work, items, workers, chunk_size, setup, settings):
+    """
+    Run work(worker_settings, chunk) on chunks of chunk_size items across workers processes, yielding every result
+    of each chunk's list as the chunks finish. Each worker makes its worker_settings once with setup(settings),
+    so settings (e.g. enzyme names rather than a RestrictionBatch) are only sent once.
+    work and setup must be module level functions. Items are read lazily, at most workers * 2 chunks are in flight.
+    While a Profiler is started the workers' stages are added to it, with the worker pid and thread
+    """
+    profiler = active_profiler()
+    profile = profiler is not None
+    chunks = _chunks(items, chunk_size)
+    with ProcessPoolExecutor(workers, initializer = _init_worker, initargs = (setup, settings)) as executor:
+        running = set()
+        for chunk in islice(chunks, workers * 2):
+            running.add(executor.submit(_run_chunk, work, chunk, profile))
+        while running:
+            finished, running = wait(running, return_when = FIRST_COMPLETED)
+            for future in finished:
+                for chunk in islice(chunks, 1):
+                    running.add(executor.submit(_run_chunk, work, chunk, profile))
+                results, stages = future.result()
+                if stages is not None:
+                    origin_time, stages = stages
+                    profiler.add_stages(stages, origin_time)
+                yield from results
+
+def _scan_settings(settings):
+    enzyme_names, linear, remove_ambiguous, scanner, table, cache = settings
+    return RestrictionBatch(enzyme_names), linear, remove_ambiguous, scanner, table, cache
+
+def scan_record(record_id, seq, rb, linear, remove_ambiguous = True, scanner = None, table = True, cache = None):
+    """Scan a single sequence string and return a RecordScan of plain python objects"""
+    rsfinder = RSFinder(Seq(seq), linear, rb, remove_ambiguous, scanner, lazy = True, cache = cache)
+    if table:
+        enzyme_table_rows = rsfinder.enzyme_table.to_dict('records')
+    else:
+        enzyme_table_rows = None
+    return RecordScan(record_id, rsfinder.single_cut_enzymes, rsfinder.all_cut_enzymes, enzyme_table_rows)
+
+def _scan_chunk(worker_settings, chunk):
+    """Scan a chunk of (record_id, seq) in a worker. Only RecordScan tuples are sent back"""
+    rb, linear, remove_ambiguous, scanner, table, cache = worker_settings
+    return [scan_record(record_id, seq, rb, linear, remove_ambiguous, scanner, table, cache) for record_id, seq in chunk]
+
+def scan_many(records, linear: bool, rb = None, remove_ambiguous = True, scanner = None, table = True, workers = None, chunk_size = 16, cache = None):
+    """
+    Scan every record in records for restriction sites, yielding a RecordScan per record as they finish.
+
+    records - a (multi-)fasta path or an iterable of SeqRecord or Seq objects
+    linear - whether every record is treated as linear or circular
+    rb, remove_ambiguous, scanner - as for RSFinder
+    table - whether to include the enzyme table as a list of row dicts
+    workers - the number of worker processes. Defaults to the number of cpus, 1 scans in this process
+    chunk_size - the number of records sent to a worker at once
+    cache - a ResultCache, or cache file or directory, shared by every worker (see plasmidin.cache)
+
+    Records are read lazily and sent as (id, sequence string) so memory is bounded by the
+    chunks in flight. Results are yielded in the order they finish, not the input order
+    """
+    if workers is None:
+        workers = cpu_count() or 1
+    if rb is None:
+        rb = default_batch()
+    if remove_ambiguous: #once here rather than for every record
+        rb = remove_ambiguous_enzymes(rb)
+
+    records = iter_records(records)
+    if workers == 1:
+        for record_id, seq in records:
+            yield scan_record(record_id, seq, rb, linear, False, scanner, table, cache)
+        return
+
+    settings = [str(enzyme) for enzyme in rb], linear, False, scanner, table, cache
+    yield from map_chunks(_scan_chunk, records, workers, chunk_size, _scan_settings, settings)
@@ -0,0 +1,309 @@
+import hashlib
+import json
+import sqlite3
+import time
+import zlib
+from collections import OrderedDict, namedtuple
+from os import makedirs, path
+
+import Bio
+import numpy
+
+from plasmidin.composite import CompositeSeq
+from plasmidin.packed import PackedSeq
+
+DEFAULT_CACHE_FILE = 'plasmidin_cache.sqlite'
+DEFAULT_MAX_BYTES = 256 * 1024 ** 2
+DEFAULT_MAX_ENTRIES = 100_000
+DEFAULT_SITE_CACHE_BYTES = 32 * 1024 ** 2
+#About what the key and array object of an entry cost on top of the cut sites
+ENTRY_OVERHEAD_BYTES = 256
+
+SiteCacheInfo = namedtuple('SiteCacheInfo', ['hits', 'misses', 'entries', 'max_entries', 'bytes', 'max_bytes'])
+
+def sequence_digest(input_seq):
+    """Return the sha256 hex digest of a sequence, ignoring case"""
+    if isinstance(input_seq, (CompositeSeq, PackedSeq)):
+        return input_seq.digest()
+    return hashlib.sha256(str(input_seq).upper().encode('ascii')).hexdigest()
+
+def result_key(input_seq, linear: bool, rb):
+    """
+    Return the cache key of a restriction site search: the sequence digest, linear flag, sorted enzyme names
+    and the Biopython version, which fixes the REBASE data behind Bio.Restriction
+    """
+    enzyme_names = ','.join(sorted(str(enzyme) for enzyme in rb))
+    key = '|'.join([sequence_digest(input_seq), str(bool(linear)), enzyme_names, Bio.__version__])
+    return hashlib.sha256(key.encode('ascii')).hexdigest()
+
+class ResultCache():
+    """
+    A content addressed SQLite cache of restriction site searches, shared between processes and runs.
+    Each entry holds the {enzyme_name : [cut sites]} of one sequence and RestrictionBatch.
+    The least recently used entries are removed once the stored results pass max_bytes
+    """
+    def __init__(self, cache_path, max_bytes = DEFAULT_MAX_BYTES):
+        """
+        cache_path - an SQLite file or a directory to hold plasmidin_cache.sqlite
+        max_bytes - the total size of the stored (compressed) results to keep
+        """
+        if path.isdir(cache_path) or not path.splitext(str(cache_path))[1]:
+            makedirs(cache_path, exist_ok = True)
+            cache_path = path.join(cache_path, DEFAULT_CACHE_FILE)
+        self._cache_path = str(cache_path)
+        self._max_bytes = max_bytes
+        self._hits = 0
+        self._misses = 0
+        self._connection = None
+
+    def __getstate__(self):
+        #The connection is reopened in the process the cache is sent to
+        state = self.__dict__.copy()
+        state['_connection'] = None
+        return state
+
+    @property
+    def cache_path(self):
+        return self._cache_path
+
+    @property
+    def max_bytes(self):
+        return self._max_bytes
+
+    @property
+    def hits(self):
+        """Returns the number of searches answered from the cache by this object"""
+        return self._hits
+
+    @property
+    def misses(self):
+        """Returns the number of searches that were not in the cache"""
+        return self._misses
+
+    @property
+    def connection(self):
+        if self._connection is None:
+            connection = sqlite3.connect(self._cache_path, timeout = 30)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, value BLOB, size INTEGER, last_used REAL)')
+            connection.execute('CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)')
+            connection.commit()
+            self._connection = connection
+        return self._connection
+
+    def __len__(self):
+        return self.connection.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+
+    def __contains__(self, key):
+        return self.connection.execute('SELECT 1 FROM results WHERE key = ?', (key,)).fetchone() is not None
+
+    def size(self):
+        """Return the total bytes of the stored results"""
+        return self.connection.execute('SELECT COALESCE(SUM(size), 0) FROM results').fetchone()[0]
+
+    def stats(self):
+        """Return a dict of the hits, misses, entries and bytes stored"""
+        return {'hits' : self.hits, 'misses' : self.misses, 'entries' : len(self), 'bytes' : self.size()}
+
+    def get(self, key):
+        """Return the stored {enzyme_name : [cut sites]} for key, or None if it is not cached"""
+        connection = self.connection
+        row = connection.execute('SELECT value FROM results WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            self._misses += 1
+            return None
+        self._hits += 1
+        with connection:
+            connection.execute('UPDATE results SET last_used = ? WHERE key = ?', (time.time(), key))
+        return json.loads(zlib.decompress(row[0]))
+
+    def put(self, key, cut_sites: dict):
+        """Store {enzyme_name : [cut sites]} for key, removing the least recently used results if over max_bytes"""
+        value = zlib.compress(json.dumps(cut_sites, separators = (',', ':')).encode('ascii'))
+        connection = self.connection
+        with connection:
+            connection.execute(
+                'INSERT OR REPLACE INTO results (key, value, size, last_used) VALUES (?, ?, ?, ?)',
+                (key, value, len(value), time.time())
+                )
+        self.evict()
+
+    def evict(self):
+        """Remove the least recently used results until the stored results fit in max_bytes"""
+        connection = self.connection
+        excess = self.size() - self.max_bytes
+        if excess <= 0:
+            return
+        evicted = []
+        for key, size in connection.execute('SELECT key, size FROM results ORDER BY last_used'):
+            evicted.append((key,))
+            excess -= size
+            if excess <= 0:
+                break
+        with connection:
+            connection.executemany('DELETE FROM results WHERE key = ?', evicted)
+
+    def clear(self):
+        """Remove every stored result and reset the hit and miss counters"""
+        with self.connection as connection:
+            connection.execute('DELETE FROM results')
+        self._hits = 0
+        self._misses = 0
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def search(self, scanner, rb, input_seq, linear: bool, known = None):
+        """
+        Return {enzyme : [cut sites]} for every enzyme in rb from the cache,
+        searching input_seq with scanner and storing the result if it is not cached.
+        known - {enzyme : [cut sites]} already found, only the other enzymes are searched on a miss
+        """
+        key = result_key(input_seq, linear, rb)
+        cut_sites = self.get(key)
+        if cut_sites is not None:
+            return {enzyme : cut_sites.get(str(enzyme), []) for enzyme in rb}
+
+        mapping = dict(known or {})
+        missing = [enzyme for enzyme in rb if enzyme not in mapping]
+        if missing:
+            mapping.update(scanner.search(missing, input_seq, linear))
+        self.put(key, {str(enzyme) : cuts for enzyme, cuts in mapping.items() if cuts})
+        return {enzyme : mapping[enzyme] for enzyme in rb}
+
+_open_caches = {}
+
+def get_cache(cache = None):
+    """
+    Return a ResultCache from None (no cache), a ResultCache or a cache file/directory path.
+    Paths are opened once per process so their hit and miss counts accumulate
+    """
+    if cache is None or isinstance(cache, ResultCache):
+        return cache
+    cache_path = path.abspath(str(cache))
+    if cache_path not in _open_caches:
+        _open_caches[cache_path] = ResultCache(cache_path)
+    return _open_caches[cache_path]
+
+class SiteCache():
+    """
+    A bounded least recently used cache of the cut sites of single enzymes, keyed by
+    (sequence digest, linear, enzyme name). One is shared by every RSFinder in the process so
+    a sequence is only searched for the enzymes that have not been seen with it before, whichever scanner found them
+    (every scanner finds the same cut sites).
+    The cut sites are held as read only int32 arrays
+    """
+    def __init__(self, max_entries = DEFAULT_MAX_ENTRIES, max_bytes = DEFAULT_SITE_CACHE_BYTES):
+        """
+        max_entries - the number of (sequence, linear, enzyme) cut site arrays to keep
+        max_bytes - the total size to keep, the cut sites plus ENTRY_OVERHEAD_BYTES an entry
+        """
+        self._entries = OrderedDict()
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        self._n_bytes = 0
+        self._hits = 0
+        self._misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def keys(self):
+        """Return the (sequence digest, linear, enzyme name) keys from least to most recently used"""
+        return list(self._entries)
+
+    def info(self):
+        """Return a SiteCacheInfo of the hits, misses, size and limits"""
+        return SiteCacheInfo(self._hits, self._misses, len(self._entries), self._max_entries, self._n_bytes, self._max_bytes)
+
+    def configure(self, max_entries = None, max_bytes = None):
+        """Change the limits, removing the least recently used entries to fit"""
+        if max_entries is not None:
+            self._max_entries = max_entries
+        if max_bytes is not None:
+            self._max_bytes = max_bytes
+        self._evict()
+
+    def clear(self):
+        """Remove every entry and reset the hit and miss counters"""
+        self._entries.clear()
+        self._n_bytes = 0
+        self._hits = 0
+        self._misses = 0
+
+    def _evict(self):
+        entries = self._entries
+        while entries and (len(entries) > self._max_entries or self._n_bytes > self._max_bytes):
+            _, cut_sites = entries.popitem(last = False)
+            self._n_bytes -= cut_sites.nbytes + ENTRY_OVERHEAD_BYTES
+
+    def get_many(self, digest, linear: bool, enzymes):
+        """Return ({enzyme : [cut sites]} for the cached enzymes, [enzymes not cached])"""
+        entries = self._entries
+        found, missing = {}, []
+        for enzyme in enzymes:
+            key = (digest, linear, str(enzyme))
+            cut_sites = entries.get(key)
+            if cut_sites is None:
+                missing.append(enzyme)
+            else:
+                entries.move_to_end(key)
+                found[enzyme] = cut_sites.tolist()
+        self._hits += len(found)
+        self._misses += len(missing)
+        return found, missing
+
+    def put_many(self, digest, linear: bool, mapping: dict):
+        """Store the cut sites of every enzyme in {enzyme : [cut sites]}"""
+        entries = self._entries
+        for enzyme, cut_sites in mapping.items():
+            key = (digest, linear, str(enzyme))
+            previous = entries.pop(key, None)
+            if previous is not None:
+                self._n_bytes -= previous.nbytes + ENTRY_OVERHEAD_BYTES
+            cut_sites = numpy.array(cut_sites, dtype = numpy.int64)
+            if not len(cut_sites) or cut_sites.max() < 2 ** 31:
+                cut_sites = cut_sites.astype(numpy.int32)
+            cut_sites.setflags(write = False)
+            entries[key] = cut_sites
+            self._n_bytes += cut_sites.nbytes + ENTRY_OVERHEAD_BYTES
+        self._evict()
+
+_site_cache = SiteCache()
+
+def site_cache_info():
+    """Return a SiteCacheInfo of the process wide per enzyme cut site cache"""
+    return _site_cache.info()
+
+def configure_site_cache(max_entries = None, max_bytes = None):
+    """Change the limits of the process wide per enzyme cut site cache. A limit of 0 turns it off"""
+    _site_cache.configure(max_entries, max_bytes)
+
+def clear_site_cache():
+    """Empty the process wide per enzyme cut site cache"""
+    _site_cache.clear()
+
+def cached_search(scanner, rb, input_seq, linear: bool, cache = None):
+    """
+    Return {enzyme : [cut sites]} for every enzyme in rb. Enzymes are taken from the process wide
+    site cache where possible, then the whole batch from the ResultCache cache if given,
+    and only the remaining enzymes are searched in input_seq with scanner
+    """
+    digest = sequence_digest(input_seq)
+    linear = bool(linear)
+    found, missing = _site_cache.get_many(digest, linear, rb)
+    if not missing:
+        return found
+
+    if cache is not None:
+        mapping = cache.search(scanner, rb, input_seq, linear, found)
+    else:
+        mapping = found
+        mapping.update(scanner.search(missing, input_seq, linear))
+    _site_cache.put_many(digest, linear, {enzyme : mapping[enzyme] for enzyme in missing})
+    return {enzyme : mapping[enzyme] for enzyme in rb}
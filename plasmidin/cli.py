@@ -0,0 +1,274 @@
+import argparse
+import sys
+from functools import lru_cache
+from itertools import product
+from os import cpu_count, makedirs, path
+
+from Bio.Restriction import RestrictionBatch
+
+from plasmidin.batch import map_chunks, scan_many
+from plasmidin.plasmidin import ENZYME_TABLE_COLUMNS, RSInserter, default_batch, parse_input_seq, remove_ambiguous_enzymes
+from plasmidin.profiling import Profiler, profiled
+from plasmidin.suppliers import supplier_index
+
+DIAGRAM_SETTINGS = {'pagesize' : 'A4', 'circle_core' : 0.5, 'track_size' : 0.1}
+
+_load_seq = lru_cache(maxsize = 32)(parse_input_seq)
+
+def select_enzymes(enzymes = None, suppliers = None, remove_ambiguous = True):
+    """
+    Return the RestrictionBatch to screen with: the commercially available enzymes, or the enzyme names given,
+    limited to those sold by any of the supplier codes given
+    """
+    rb = RestrictionBatch(enzymes) if enzymes else default_batch()
+    if suppliers:
+        rb = RestrictionBatch(supplier_index(rb).enzymes(suppliers))
+    if remove_ambiguous:
+        rb = remove_ambiguous_enzymes(rb)
+    return rb
+
+def _join_sequences(table):
+    """Turn the tuple and list columns of a table into '; ' separated strings so every chunk has the same columns"""
+    for column in table.columns:
+        if table[column].dtype == object and len(table) and isinstance(table[column].iloc[0], (tuple, list)):
+            table[column] = ['; '.join(map(str, values)) for values in table[column]]
+    return table
+
+class TableWriter():
+    """
+    Append tables to a CSV, TSV or Parquet file (chosen by the extension) as they arrive,
+    so results are streamed out rather than held until the end. '-' writes CSV to stdout
+    """
+    def __init__(self, output):
+        self._output = output
+        if output.endswith('.parquet'):
+            self._format = 'parquet'
+        elif output.endswith(('.tsv', '.txt')):
+            self._format = 'tsv'
+        else:
+            self._format = 'csv'
+        self._parquet_writer = None
+        self._started = False
+        self._n_rows = 0
+
+    @property
+    def n_rows(self):
+        return self._n_rows
+
+    @profiled()
+    def write(self, table):
+        table = _join_sequences(table)
+        if self._format == 'parquet':
+            self._write_parquet(table)
+        else:
+            output = sys.stdout if self._output == '-' else self._output
+            table.to_csv(output, sep = '\t' if self._format == 'tsv' else ',', mode = 'a' if self._started else 'w', header = not self._started, index = False)
+        self._started = True
+        self._n_rows += len(table)
+
+    def _write_parquet(self, table):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError('Writing Parquet needs pyarrow. Install it with pip install plasmidin[parquet]')
+        batch = pyarrow.Table.from_pandas(table, preserve_index = False)
+        if self._parquet_writer is None:
+            self._parquet_writer = pyarrow.parquet.ParquetWriter(self._output, batch.schema)
+        self._parquet_writer.write_table(batch.cast(self._parquet_writer.schema))
+
+    def close(self):
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+            self._parquet_writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+TRUE_VALUES = {'true', 't', 'yes', 'y', '1', 'linear'}
+FALSE_VALUES = {'false', 'f', 'no', 'n', '0', 'circular'}
+
+def parse_linear(value):
+    """
+    Return a manifest cell as True, False or None (blank, so the command line default is used).
+    Raises a ValueError for anything not in TRUE_VALUES or FALSE_VALUES
+    """
+    import pandas
+    if pandas.isna(value):
+        return None
+    text = str(value).strip().lower()
+    if text in TRUE_VALUES:
+        return True
+    if text in FALSE_VALUES:
+        return False
+    if text == '':
+        return None
+    raise ValueError(f'{value!r} is not a true or false value')
+
+def read_manifest(manifest):
+    """
+    Return the (backbone, insert, backbone_linear, insert_linear) of every row of a CSV or TSV manifest
+    with backbone and insert sequence file columns and optional backbone_linear and insert_linear columns.
+    The linear columns are True, False or None where the cell is blank (see parse_linear)
+    """
+    import pandas
+    table = pandas.read_csv(manifest, sep = None, engine = 'python', dtype = {'backbone_linear' : str, 'insert_linear' : str})
+    missing = {'backbone', 'insert'} - set(table.columns)
+    if missing:
+        raise ValueError(f'The manifest {manifest} has no {", ".join(sorted(missing))} column')
+    linear_columns = []
+    for column in ('backbone_linear', 'insert_linear'):
+        if column not in table:
+            linear_columns.append([None] * len(table))
+            continue
+        values = []
+        for row, value in enumerate(table[column], start = 2):
+            try:
+                values.append(parse_linear(value))
+            except ValueError as error:
+                raise ValueError(f'The manifest {manifest} line {row} {column}: {error}')
+        linear_columns.append(values)
+    return list(zip(table['backbone'], table['insert'], *linear_columns))
+
+def _draw_map(rsfinder, seq_id, diagram_file):
+    from plasmidin.plasmid_diagrams import PlasmidDrawer #reportlab is only needed when diagrams are asked for
+    rsfinder.create_enzyme_records(max_n_cut_sites = 2)
+    plasmid_drawer = PlasmidDrawer(rsfinder.input_seq, seq_id, rsfinder.feature_info)
+    plasmid_drawer.draw_gd_diagram(diagram_file, 'linear' if rsfinder.linear else 'circular', DIAGRAM_SETTINGS)
+
+def screen_pair(backbone, insert, rb, backbone_linear = False, insert_linear = True, single_enzyme = True, top = None, cache = None, diagrams = None):
+    """
+    Return the ranked cloning strategies (see RSInserter.enumerate_strategies) for one backbone and insert file.
+    diagrams - a directory to draw the map of the integrated sequence made by the best strategy in
+    """
+    rsinserter = RSInserter(_load_seq(backbone), _load_seq(insert), backbone_linear, insert_linear, rb, remove_ambiguous = False, lazy = True, cache = cache)
+    strategies = rsinserter.enumerate_strategies(single_enzyme)
+    if top:
+        strategies = strategies.head(top)
+    if diagrams is not None and len(strategies):
+        best = strategies.iloc[0]
+        rsinserter.integrate_seq(best['Backbone_enzymes'], best['Insert_enzymes'], best['Backbone_n_cut_sites'], best['Insert_n_cut_sites'])
+        name = f'{path.splitext(path.basename(backbone))[0]}_{path.splitext(path.basename(insert))[0]}'
+        _draw_map(rsinserter.integrated_rsfinder, name, path.join(diagrams, f'{name}_restriction_map.pdf'))
+
+    strategies.insert(0, 'Insert', insert)
+    strategies.insert(0, 'Backbone', backbone)
+    return strategies
+
+def _screen_settings(settings):
+    enzyme_names, options = settings
+    return RestrictionBatch(enzyme_names), options
+
+def _screen_chunk(worker_settings, chunk):
+    """Screen a chunk of (backbone, insert, backbone_linear, insert_linear) in a worker"""
+    rb, options = worker_settings
+    return [screen_pair(backbone, insert, rb, backbone_linear, insert_linear, **options) for backbone, insert, backbone_linear, insert_linear in chunk]
+
+def screen_many(pairs, rb, jobs = None, chunk_size = 4, **options):
+    """
+    Screen every (backbone, insert, backbone_linear, insert_linear) across jobs worker processes,
+    yielding the strategy table of each pair as they finish. options are passed to screen_pair
+    """
+    if jobs is None:
+        jobs = cpu_count() or 1
+    pairs = iter(pairs)
+    if jobs == 1:
+        for backbone, insert, backbone_linear, insert_linear in pairs:
+            yield screen_pair(backbone, insert, rb, backbone_linear, insert_linear, **options)
+        return
+
+    #Pairs are sent in order so each worker sees runs of the same backbone and reuses its cut sites
+    settings = [str(enzyme) for enzyme in rb], options
+    yield from map_chunks(_screen_chunk, pairs, jobs, chunk_size, _screen_settings, settings)
+
+def _split(value):
+    return [item for item in value.replace(',', ' ').split() if item] if value else None
+
+def _add_common_arguments(parser):
+    parser.add_argument('-o', '--output', required = True, help = 'the .csv, .tsv or .parquet file to stream the results to, - for stdout')
+    parser.add_argument('-j', '--jobs', type = int, default = None, help = 'the number of worker processes. Defaults to the number of cpus')
+    parser.add_argument('--cache-dir', default = None, help = 'a directory to keep the cut sites of every sequence searched in, shared between runs')
+    parser.add_argument('--enzymes', default = None, help = 'comma separated enzyme names to use rather than every commercially available enzyme')
+    parser.add_argument('--suppliers', default = None, help = 'comma separated supplier codes, only enzymes sold by any of them are used')
+    parser.add_argument('--keep-ambiguous', action = 'store_true', help = 'keep the enzymes with ambiguous cut sites')
+    parser.add_argument('--profile', default = None, help = 'a file to write a Chrome trace of the time spent in each stage to, the stages run in worker processes included')
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog = 'plasmidin', description = 'Screen DNA sequences for restriction sites and cloning strategies')
+    subparsers = parser.add_subparsers(dest = 'command', required = True)
+
+    screen = subparsers.add_parser('screen', help = 'rank the cloning strategies of every backbone and insert pair')
+    screen.add_argument('--manifest', default = None, help = 'a CSV/TSV with backbone and insert (and optional backbone_linear, insert_linear) columns')
+    screen.add_argument('--backbones', nargs = '+', default = [], help = 'backbone sequence files, screened against every insert')
+    screen.add_argument('--inserts', nargs = '+', default = [], help = 'insert sequence files')
+    screen.add_argument('--backbone-linear', action = 'store_true', help = 'treat the backbones as linear rather than circular')
+    screen.add_argument('--insert-circular', action = 'store_true', help = 'treat the inserts as circular rather than linear')
+    screen.add_argument('--no-single-enzyme', action = 'store_true', help = 'leave out single enzyme (ambiguous orientation) strategies')
+    screen.add_argument('--top', type = int, default = None, help = 'keep only the best N strategies of each pair')
+    screen.add_argument('--diagrams', default = None, help = 'a directory to draw the integrated map of the best strategy of each pair in')
+    _add_common_arguments(screen)
+
+    scan = subparsers.add_parser('scan', help = 'tabulate the restriction sites of every record of (multi-)fasta files')
+    scan.add_argument('fasta', nargs = '+', help = '(multi-)fasta files to scan')
+    scan.add_argument('--linear', action = 'store_true', help = 'treat the records as linear rather than circular')
+    _add_common_arguments(scan)
+    return parser
+
+def _screen_pairs(args):
+    """Return the (backbone, insert, backbone_linear, insert_linear) to screen, blank manifest cells taking the command line default"""
+    if args.manifest:
+        pairs = read_manifest(args.manifest)
+    else:
+        pairs = [(backbone, insert, None, None) for backbone, insert in product(args.backbones, args.inserts)]
+    return [
+        (backbone, insert, args.backbone_linear if backbone_linear is None else backbone_linear, not args.insert_circular if insert_linear is None else insert_linear)
+        for backbone, insert, backbone_linear, insert_linear in pairs
+        ]
+
+def _screen(args, pairs, rb, writer):
+    if args.diagrams:
+        makedirs(args.diagrams, exist_ok = True)
+    options = {'single_enzyme' : not args.no_single_enzyme, 'top' : args.top, 'cache' : args.cache_dir, 'diagrams' : args.diagrams}
+    for strategies in screen_many(pairs, rb, args.jobs, **options):
+        writer.write(strategies)
+
+def _scan(args, rb, writer):
+    import pandas
+    for fasta in args.fasta:
+        for record_scan in scan_many(fasta, args.linear, rb, remove_ambiguous = False, workers = args.jobs, cache = args.cache_dir):
+            #The columns are fixed so a record without cut sites still writes the full header
+            table = pandas.DataFrame(record_scan.enzyme_table_rows, columns = ENZYME_TABLE_COLUMNS)
+            table.insert(0, 'Record', record_scan.record_id)
+            writer.write(table)
+
+def main(argv = None):
+    """The plasmidin console entry point"""
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.command == 'screen' and not args.manifest and not (args.backbones and args.inserts):
+        parser.error('screen needs a --manifest or both --backbones and --inserts')
+    try:
+        rb = select_enzymes(_split(args.enzymes), _split(args.suppliers), not args.keep_ambiguous)
+        pairs = _screen_pairs(args) if args.command == 'screen' else None
+    except ValueError as error:
+        parser.error(str(error))
+
+    profiler = Profiler().start() if args.profile else None
+    try:
+        with TableWriter(args.output) as writer:
+            if args.command == 'screen':
+                _screen(args, pairs, rb, writer)
+            else:
+                _scan(args, rb, writer)
+    finally:
+        if profiler is not None:
+            profiler.stop()
+            profiler.save_chrome_trace(args.profile)
+            print(profiler.report(), file = sys.stderr)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,126 @@
+import Bio
+import numpy
+from Bio.Restriction import AllEnzymes
+
+from plasmidin.enzyme_snapshot import enzyme_snapshot
+
+def compatible_pair(enzyme1, enzyme2):
+    """
+    Return whether enzyme2 is in enzyme1.compatible_end() without building the list
+    over every enzyme in AllEnzymes
+    """
+    if enzyme1.is_blunt():
+        return enzyme2.is_blunt()
+    elif enzyme1.is_5overhang():
+        return enzyme2.is_5overhang() and enzyme2 % enzyme1
+    elif enzyme1.is_3overhang():
+        return enzyme2.is_3overhang() and enzyme2 % enzyme1
+    else:
+        return False
+
+class CompatibilityIndex():
+    """
+    A boolean matrix of which enzymes in a RestrictionBatch produce compatible ends,
+    keyed by the enzyme names. matrix[i][j] is True if enzyme j is in enzyme i.compatible_end()
+    """
+    def __init__(self, enzyme_names, matrix, biopython_version = Bio.__version__):
+        self._enzyme_names = tuple(enzyme_names)
+        self._enzyme_index = {enzyme_name : i for i, enzyme_name in enumerate(self._enzyme_names)}
+        self._matrix = matrix
+        self._biopython_version = biopython_version
+
+    @classmethod
+    def from_batch(cls, rb):
+        """Build the index for every enzyme in rb"""
+        enzymes = sorted(rb)
+        enzyme_names = [str(enzyme) for enzyme in enzymes]
+        snapshot = enzyme_snapshot(rb)
+
+        #Enzymes in the same end group of the snapshot (blunt, or defined with the same overhang) are compatible
+        overhangs = snapshot.overhang_codes(enzyme_names)
+        codes = snapshot.end_groups(enzyme_names)
+        grouped = codes >= 0
+        matrix = (codes[:, None] == codes[None, :]) & grouped[:, None] & grouped[None, :]
+
+        #Overhangs involving an ambiguous enzyme are checked with Bio.Restriction directly
+        for i in numpy.flatnonzero(~grouped):
+            for j in numpy.flatnonzero(overhangs == overhangs[i]):
+                matrix[i][j] = compatible_pair(enzymes[i], enzymes[j])
+                matrix[j][i] = compatible_pair(enzymes[j], enzymes[i])
+
+        return cls(enzyme_names, matrix)
+
+    @property
+    def enzyme_names(self):
+        return self._enzyme_names
+
+    @property
+    def matrix(self):
+        return self._matrix
+
+    @property
+    def biopython_version(self):
+        return self._biopython_version
+
+    def __contains__(self, enzyme_name):
+        return str(enzyme_name) in self._enzyme_index
+
+    def __len__(self):
+        return len(self._enzyme_names)
+
+    def compatible(self, enzyme1, enzyme2):
+        """Return whether enzyme1 and enzyme2 have compatible ends"""
+        enzyme_index = self._enzyme_index
+        try:
+            return bool(self._matrix[enzyme_index[str(enzyme1)], enzyme_index[str(enzyme2)]])
+        except KeyError:
+            return compatible_pair(AllEnzymes.get(str(enzyme1)), AllEnzymes.get(str(enzyme2)))
+
+    def submatrix(self, enzymes1, enzymes2):
+        """Return the boolean matrix of compatible ends between two lists of enzyme names"""
+        enzyme_index = self._enzyme_index
+        if all(str(enzyme) in enzyme_index for enzyme in list(enzymes1) + list(enzymes2)):
+            rows = [enzyme_index[str(enzyme)] for enzyme in enzymes1]
+            columns = [enzyme_index[str(enzyme)] for enzyme in enzymes2]
+            return self._matrix[numpy.ix_(rows, columns)]
+        return numpy.array([[self.compatible(enzyme1, enzyme2) for enzyme2 in enzymes2] for enzyme1 in enzymes1], dtype = bool).reshape(len(enzymes1), len(enzymes2))
+
+    def compatible_enzymes(self, enzyme):
+        """Return the names of the enzymes in the index with ends compatible with enzyme"""
+        row = self._matrix[self._enzyme_index[str(enzyme)]]
+        return [self._enzyme_names[j] for j in numpy.flatnonzero(row)]
+
+    def save(self, index_file):
+        """Save the index as a compressed numpy .npz file with the Biopython version it was built from"""
+        numpy.savez_compressed(
+            index_file,
+            enzyme_names = numpy.array(self._enzyme_names),
+            matrix = numpy.packbits(self._matrix, axis = 1),
+            biopython_version = numpy.array(self._biopython_version),
+            )
+
+    @classmethod
+    def load(cls, index_file, check_version = True):
+        """
+        Load an index saved with CompatibilityIndex.save. Raises a ValueError if it was built with a
+        different Biopython (and so REBASE) version unless check_version is False
+        """
+        with numpy.load(index_file) as data:
+            enzyme_names = [str(enzyme_name) for enzyme_name in data['enzyme_names']]
+            matrix = numpy.unpackbits(data['matrix'], axis = 1, count = len(enzyme_names)).astype(bool)
+            biopython_version = str(data['biopython_version'])
+
+        if check_version and biopython_version != Bio.__version__:
+            raise ValueError(f'{index_file} was built with Biopython {biopython_version} not {Bio.__version__}')
+        return cls(enzyme_names, matrix, biopython_version)
+
+_index_cache = {}
+
+def compatibility_index(rb = AllEnzymes):
+    """Return the CompatibilityIndex for rb, building it only the first time a batch is seen"""
+    key = frozenset(str(enzyme) for enzyme in rb)
+    index = _index_cache.get(key)
+    if index is None:
+        index = CompatibilityIndex.from_batch(rb)
+        _index_cache[key] = index
+    return index
@@ -0,0 +1,118 @@
+import hashlib
+
+from Bio.Seq import Seq
+
+from plasmidin.packed import PackedSeq
+
+CHUNK_SIZE = 1024 ** 2
+
+class CompositeSeq():
+    """
+    A read only DNA sequence made of segments of shared byte buffers (or PackedSeqs), so slicing, reversing and
+    joining sequences copies no bases. Each segment is (buffer, start, stop, reverse).
+    The bases are only copied out by str(), bytes() or CompositeSeq.to_seq()
+    """
+    def __init__(self, segments):
+        self._segments = tuple(segment for segment in segments if segment[2] > segment[1])
+        self._length = sum(stop - start for _, start, stop, _ in self._segments)
+
+    @classmethod
+    def from_seq(cls, seq):
+        """Make a CompositeSeq of a Seq, str or PackedSeq, sharing the bytes of the Seq where possible"""
+        if isinstance(seq, CompositeSeq):
+            return seq
+        if isinstance(seq, PackedSeq):
+            return cls([(seq, 0, len(seq), False)])
+        data = seq.encode('ascii') if isinstance(seq, str) else bytes(seq)
+        return cls([(data, 0, len(data), False)])
+
+    @property
+    def segments(self):
+        return self._segments
+
+    def __len__(self):
+        return self._length
+
+    def __repr__(self):
+        return f'CompositeSeq({len(self._segments)} segments, {self._length} bases)'
+
+    def chunks(self):
+        """Yield the bases in order as memoryviews of at most CHUNK_SIZE bases, reversed segments as bytes"""
+        for data, start, stop, reverse in self._segments:
+            if isinstance(data, PackedSeq):
+                for first in range(start, stop, CHUNK_SIZE):
+                    last = min(stop, first + CHUNK_SIZE)
+                    yield data.decode(stop - (last - start), stop - (first - start))[::-1] if reverse else data.decode(first, last)
+                continue
+            view = memoryview(data)
+            if reverse:
+                for end in range(stop, start, -CHUNK_SIZE):
+                    yield bytes(view[max(start, end - CHUNK_SIZE):end])[::-1]
+            else:
+                for first in range(start, stop, CHUNK_SIZE):
+                    yield view[first:min(stop, first + CHUNK_SIZE)]
+
+    def __bytes__(self):
+        return b''.join(self.chunks())
+
+    def __str__(self):
+        return bytes(self).decode('ascii')
+
+    def to_seq(self):
+        """Return the sequence as a Bio.Seq.Seq, copying the bases out once"""
+        return Seq(bytes(self))
+
+    def digest(self):
+        """Return the sha256 hex digest of the uppercase sequence, the same as plasmidin.cache.sequence_digest"""
+        sha256 = hashlib.sha256()
+        for chunk in self.chunks():
+            sha256.update(bytes(chunk).upper())
+        return sha256.hexdigest()
+
+    def _view(self, start, stop):
+        """Return bases start to stop (0-based, stop exclusive) as a CompositeSeq sharing the same buffers"""
+        segments = []
+        position = 0
+        for data, segment_start, segment_stop, reverse in self._segments:
+            length = segment_stop - segment_start
+            first, last = max(start - position, 0), min(stop - position, length)
+            if first < last:
+                if reverse:
+                    segments.append((data, segment_stop - last, segment_stop - first, True))
+                else:
+                    segments.append((data, segment_start + first, segment_start + last, False))
+            position += length
+            if position >= stop:
+                break
+        return CompositeSeq(segments)
+
+    def reverse(self):
+        """Return the bases in reverse order (not the reverse complement), the same as seq[::-1]"""
+        return CompositeSeq([(data, start, stop, not reverse) for data, start, stop, reverse in reversed(self._segments)])
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(self._length)
+            if step == 1:
+                return self._view(start, max(start, stop))
+            if step == -1:
+                return self._view(stop + 1, max(stop + 1, start + 1)).reverse()
+            return CompositeSeq.from_seq(str(self)[key])
+        if key < 0:
+            key += self._length
+        if not 0 <= key < self._length:
+            raise IndexError('CompositeSeq index out of range')
+        return str(self._view(key, key + 1))
+
+    def __add__(self, other):
+        return CompositeSeq(self._segments + CompositeSeq.from_seq(other).segments)
+
+    def __radd__(self, other):
+        return CompositeSeq(CompositeSeq.from_seq(other).segments + self._segments)
+
+    def __eq__(self, other):
+        if isinstance(other, (CompositeSeq, Seq, str)):
+            return len(self) == len(other) and str(self) == str(other)
+        return NotImplemented
+
+    __hash__ = None
@@ -0,0 +1,201 @@
+from itertools import chain
+
+import numpy
+
+class CutSiteStore():
+    """
+    The cut sites of every enzyme searched in a sequence, held as two integer arrays rather than a dict of lists.
+    positions holds every cut site, enzyme by enzyme, and the sites of enzyme_names[i] are
+    positions[offsets[i]:offsets[i + 1]] (a compressed sparse row layout)
+    """
+    def __init__(self, enzyme_names, offsets, positions):
+        self._enzyme_names = tuple(enzyme_names)
+        self._enzyme_index = {enzyme_name : i for i, enzyme_name in enumerate(self._enzyme_names)}
+        self._offsets = offsets
+        self._positions = positions
+        self._counts = numpy.diff(offsets)
+        self._order = None
+
+    @classmethod
+    def from_mapping(cls, mapping: dict):
+        """Build the store from {enzyme : [cut sites]}, keeping the enzymes in the same order"""
+        cut_sites = list(mapping.values())
+        counts = [len(sites) for sites in cut_sites]
+        n_sites = sum(counts)
+        dtype = numpy.int32 if n_sites < 2 ** 31 else numpy.int64
+        offsets = numpy.zeros(len(counts) + 1, dtype = dtype)
+        numpy.cumsum(counts, out = offsets[1:])
+        positions = numpy.fromiter(chain.from_iterable(cut_sites), dtype = dtype, count = n_sites)
+        return cls([str(enzyme) for enzyme in mapping], offsets, positions)
+
+    @property
+    def enzyme_names(self):
+        return self._enzyme_names
+
+    @property
+    def offsets(self):
+        return self._offsets
+
+    @property
+    def positions(self):
+        return self._positions
+
+    @property
+    def counts(self):
+        """Returns the number of cut sites of each enzyme in enzyme_names"""
+        return self._counts
+
+    @property
+    def nbytes(self):
+        return self._offsets.nbytes + self._positions.nbytes
+
+    def __len__(self):
+        return len(self._enzyme_names)
+
+    def __contains__(self, enzyme_name):
+        return str(enzyme_name) in self._enzyme_index
+
+    def rows(self, enzyme_names):
+        """Return the row of each of enzyme_names, -1 for enzymes that were not searched"""
+        enzyme_index = self._enzyme_index
+        return numpy.array([enzyme_index.get(str(enzyme_name), -1) for enzyme_name in enzyme_names], dtype = numpy.int64)
+
+    def _rows(self, n_cut_sites = None):
+        """Return the rows of the enzymes with n_cut_sites cut sites, or any if None"""
+        if n_cut_sites is None:
+            return numpy.flatnonzero(self._counts > 0)
+        return numpy.flatnonzero(self._counts == n_cut_sites)
+
+    def _to_dict(self, rows):
+        offsets = self._offsets.tolist()
+        positions = self._positions
+        return {self._enzyme_names[i] : positions[offsets[i]:offsets[i + 1]].tolist() for i in rows.tolist()}
+
+    def cut_sites(self, enzyme_name):
+        """Return the cut sites of enzyme_name as a list. Raises a KeyError if it was not searched"""
+        i = self._enzyme_index[str(enzyme_name)]
+        return self._positions[self._offsets[i]:self._offsets[i + 1]].tolist()
+
+    def enzymes(self, n_cut_sites = None):
+        """Return the names of the enzymes with n_cut_sites cut sites, or any number if None"""
+        return [self._enzyme_names[i] for i in self._rows(n_cut_sites).tolist()]
+
+    def to_dict(self, n_cut_sites = None):
+        """Return {enzyme_name : [cut sites]} for the enzymes with n_cut_sites cut sites, or any number if None"""
+        return self._to_dict(self._rows(n_cut_sites))
+
+    def select(self, enzyme_names, n_cut_sites = None):
+        """
+        Return {enzyme_name : [cut sites]} for the enzymes in enzyme_names that cut (n_cut_sites times if given).
+        Names that were not searched or do not cut are left out
+        """
+        rows = self.rows(enzyme_names)
+        rows = rows[rows >= 0]
+        counts = self._counts[rows]
+        rows = rows[counts > 0] if n_cut_sites is None else rows[counts == n_cut_sites]
+        return self._to_dict(rows)
+
+    def group_by_position(self, max_n_cut_sites = None):
+        """
+        Group the cut sites of the enzymes cutting 1 to max_n_cut_sites times (any number if None) by position with one sort.
+        Returns (positions, group_offsets, rows): the sorted distinct cut sites, and the enzyme rows cutting at positions[i]
+        as rows[group_offsets[i]:group_offsets[i + 1]], fewest cut sites first then in store order
+        """
+        counts = self._counts
+        selected = counts > 0 if max_n_cut_sites is None else (counts > 0) & (counts <= max_n_cut_sites)
+        cut_rows = numpy.repeat(numpy.arange(len(self._enzyme_names)), counts)
+        keep = selected[cut_rows]
+        positions = self._positions[keep]
+        cut_rows = cut_rows[keep]
+        order = numpy.lexsort((cut_rows, counts[cut_rows], positions))
+        positions = positions[order]
+        rows = cut_rows[order]
+        starts = numpy.flatnonzero(numpy.diff(positions, prepend = positions[:1] - 1)) if len(positions) else numpy.zeros(0, dtype = numpy.int64)
+        return positions[starts], numpy.append(starts, len(positions)), rows
+
+    def _sort(self):
+        """Sort every cut site by position once, keeping the enzyme row of each"""
+        if self._order is None:
+            self._order = numpy.argsort(self._positions, kind = 'stable')
+            self._sorted_positions = self._positions[self._order]
+            self._cut_rows = numpy.repeat(numpy.arange(len(self._enzyme_names)), self._counts)
+
+    def _region_ranges(self, start, end, length, linear):
+        """
+        Return the [first, last) ranges of the sorted cut sites within [start, end).
+        On a circular sequence the region wraps past the origin when end is before start
+        """
+        if linear:
+            intervals = [(start, end)] if start < end else []
+        elif start == end:
+            intervals = []
+        elif abs(end - start) >= length:
+            intervals = [(1, length + 1)]
+        else:
+            start = (start - 1) % length + 1
+            end = (end - 1) % length + 1
+            intervals = [(start, end)] if start < end else [(start, length + 1), (1, end)]
+
+        self._sort()
+        sorted_positions = self._sorted_positions
+        return [tuple(numpy.searchsorted(sorted_positions, interval).tolist()) for interval in intervals]
+
+    def _region_cuts(self, start, end, length, linear):
+        """Return the indices into positions of the cut sites within [start, end), in store order"""
+        ranges = self._region_ranges(start, end, length, linear)
+        cuts = [self._order[first:last] for first, last in ranges]
+        return numpy.sort(numpy.concatenate(cuts)) if cuts else numpy.zeros(0, dtype = numpy.int64)
+
+    def cutting_in(self, start, end, length, linear = True):
+        """
+        Return {enzyme_name : [cut sites within [start, end)]} for the enzymes cutting the region.
+        length - the length of the sequence, used to wrap the region when linear is False
+        """
+        cuts = self._region_cuts(start, end, length, linear)
+        enzyme_names = self._enzyme_names
+        cutting = {}
+        for row, cut_site in zip(self._cut_rows[cuts].tolist(), self._positions[cuts].tolist()):
+            cutting.setdefault(enzyme_names[row], []).append(cut_site)
+        return cutting
+
+    def not_cutting_in(self, start, end, length, linear = True, n_cut_sites = None):
+        """
+        Return {enzyme_name : [cut sites]} for the enzymes that cut the sequence (n_cut_sites times if given)
+        but not within [start, end)
+        """
+        cuts = self._region_cuts(start, end, length, linear)
+        keep = numpy.ones(len(self._enzyme_names), dtype = bool)
+        keep[self._cut_rows[cuts]] = False
+        keep &= self._counts > 0 if n_cut_sites is None else self._counts == n_cut_sites
+        return self._to_dict(numpy.flatnonzero(keep))
+
+    def nearest(self, position, length, linear = True, k = 1):
+        """
+        Return the k cut sites nearest position as [(enzyme_name, cut site, distance)], nearest first.
+        Distances on a circular sequence are measured either way round the origin
+        """
+        self._sort()
+        sorted_positions = self._sorted_positions
+        n_sites = len(sorted_positions)
+        if not n_sites or k < 1:
+            return []
+        i = int(numpy.searchsorted(sorted_positions, position))
+        candidates = numpy.arange(i - k, i + k)
+        if linear:
+            candidates = candidates[(candidates >= 0) & (candidates < n_sites)]
+        else:
+            candidates = numpy.unique(candidates % n_sites)
+
+        cut_sites = sorted_positions[candidates].astype(numpy.int64)
+        distances = numpy.abs(cut_sites - position)
+        if not linear:
+            distances = numpy.minimum(distances % length, length - distances % length)
+        rows = self._cut_rows[self._order[candidates]]
+        nearest = numpy.lexsort((rows, cut_sites, distances))[:k]
+        enzyme_names = self._enzyme_names
+        return [(enzyme_names[row], cut_site, distance) for row, cut_site, distance in
+                zip(rows[nearest].tolist(), cut_sites[nearest].tolist(), distances[nearest].tolist())]
+
+    def mapping(self, rb):
+        """Return {enzyme : [cut sites]} for every enzyme in rb, as held in Bio.Restriction.Analysis.mapping"""
+        return {enzyme : self.cut_sites(enzyme) for enzyme in rb}
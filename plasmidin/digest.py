@@ -0,0 +1,105 @@
+from collections import namedtuple
+
+import numpy
+import pandas
+
+#A digest fragment from base start to base end (1-based, inclusive). The fragment of a circular
+#sequence crossing the origin has end < start
+Fragment = namedtuple('Fragment', ['start', 'end', 'length'])
+
+DIGEST_COLUMNS = ['Enzymes', 'N_enzymes', 'N_fragments', 'Fragment_sizes']
+
+def digest_fragments(cut_sites, length, linear: bool):
+    """
+    Return the Fragments left by cutting a sequence of length at every cut site, in sequence order.
+    A cut site is the first base of the 3' fragment, as Bio.Restriction reports it
+    """
+    cuts = sorted(set(cut_sites))
+    if not cuts:
+        return [Fragment(1, length, length)]
+    if linear:
+        boundaries = [1] + cuts + [length + 1]
+        return [Fragment(start, end - 1, end - start) for start, end in zip(boundaries, boundaries[1:]) if end > start]
+    fragments = [Fragment(start, end - 1, end - start) for start, end in zip(cuts, cuts[1:])]
+    wrap_end = cuts[0] - 1 if cuts[0] > 1 else length
+    fragments.append(Fragment(cuts[-1], wrap_end, length - cuts[-1] + cuts[0]))
+    return fragments
+
+def fragment_sizes(cuts, length, linear: bool):
+    """
+    Return the fragment sizes of many digests at once, largest first and padded with zeros.
+    cuts - a (digests, cut sites) array. Rows with fewer cuts are padded by repeating one of their own cuts
+    """
+    cuts = numpy.sort(numpy.asarray(cuts, dtype = numpy.int64), axis = 1)
+    n_digests = len(cuts)
+    if linear:
+        boundaries = numpy.hstack([numpy.ones((n_digests, 1), dtype = numpy.int64), cuts, numpy.full((n_digests, 1), length + 1)])
+        sizes = numpy.diff(boundaries, axis = 1)
+    else:
+        sizes = numpy.hstack([numpy.diff(cuts, axis = 1), (cuts[:, :1] + length - cuts[:, -1:])])
+    return -numpy.sort(-sizes, axis = 1)
+
+def cut_matrix(cut_store, enzyme_names):
+    """
+    Return the cut sites of enzyme_names as an (enzymes, most cut sites) array padded with -1.
+    Enzymes that were not searched or do not cut have no cut sites
+    """
+    rows = cut_store.rows(enzyme_names)
+    counts = numpy.where(rows >= 0, cut_store.counts[rows], 0)
+    width = max(int(counts.max(initial = 0)), 1)
+    columns = numpy.arange(width)
+    present = columns < counts[:, None]
+    cut_indices = cut_store.offsets[rows].astype(numpy.int64)[:, None] + columns
+    matrix = numpy.full((len(rows), width), -1, dtype = numpy.int64)
+    matrix[present] = cut_store.positions[cut_indices[present]]
+    return matrix
+
+def digest_matrix_sizes(cuts, digests, length, linear: bool):
+    """
+    Return the fragment_sizes of many digests.
+    cuts - a cut_matrix, digests - a (digests, enzymes) array of rows of cuts, the same row twice for a single digest
+    """
+    digest_cuts = cuts[digests].reshape(len(digests), digests.shape[1] * cuts.shape[1])
+    #Missing cuts repeat a cut of the same digest. A digest with no cuts at all is left uncut
+    last_cut = digest_cuts.max(axis = 1, initial = -1)
+    digest_cuts = numpy.where(digest_cuts < 0, numpy.where(last_cut < 0, 1, last_cut)[:, None], digest_cuts)
+    return fragment_sizes(digest_cuts, length, linear)
+
+def candidate_digests(cut_store, max_cut_sites = 2, double_digests = True):
+    """
+    Return (enzyme_names, digests) of every single digest, and every double digest if double_digests,
+    of the enzymes in a CutSiteStore with 1 to max_cut_sites cut sites. digests index enzyme_names as in digest_matrix_sizes
+    """
+    counts = cut_store.counts
+    enzyme_names = [cut_store.enzyme_names[row] for row in numpy.flatnonzero((counts > 0) & (counts <= max_cut_sites)).tolist()]
+    singles = numpy.arange(len(enzyme_names))
+    digests = numpy.stack([singles, singles], axis = 1)
+    if double_digests:
+        pairs = numpy.stack(numpy.triu_indices(len(enzyme_names), k = 1), axis = 1)
+        digests = numpy.vstack([digests, pairs])
+    return enzyme_names, digests
+
+def digest_names(enzyme_names, digests):
+    """Return the enzyme name tuple of each digest, listing a single digest's enzyme once"""
+    return [(enzyme_names[i],) if i == j else (enzyme_names[i], enzyme_names[j]) for i, j in digests.tolist()]
+
+def digest_sizes(cut_store, length, linear: bool, max_cut_sites = 2, double_digests = True):
+    """
+    Return (digests, sizes) for every single digest, and every double digest if double_digests,
+    of the enzymes in a CutSiteStore with 1 to max_cut_sites cut sites.
+    digests - a list of enzyme name tuples, sizes - the fragment_sizes array of each digest
+    """
+    enzyme_names, digests = candidate_digests(cut_store, max_cut_sites, double_digests)
+    sizes = digest_matrix_sizes(cut_matrix(cut_store, enzyme_names), digests, length, linear)
+    return digest_names(enzyme_names, digests), sizes
+
+def digest_table(cut_store, length, linear: bool, max_cut_sites = 2, double_digests = True):
+    """Return a table of the fragment sizes (largest first) of every digest from digest_sizes"""
+    digests, sizes = digest_sizes(cut_store, length, linear, max_cut_sites, double_digests)
+    n_fragments = (sizes > 0).sum(axis = 1)
+    return pandas.DataFrame({
+        'Enzymes' : digests,
+        'N_enzymes' : [len(enzymes) for enzymes in digests],
+        'N_fragments' : n_fragments,
+        'Fragment_sizes' : [tuple(row[:n]) for row, n in zip(sizes.tolist(), n_fragments.tolist())],
+        }, columns = DIGEST_COLUMNS)
@@ -0,0 +1,301 @@
+import json
+import os
+import struct
+import tempfile
+from os import path
+
+import Bio
+import numpy
+
+MAGIC = b'PLSMENZS'
+HEADER = struct.Struct('<8sQ')
+SNAPSHOT_NAME = 'enzymes.snapshot'
+OVERHANGS = ('blunt', "5' overhang", "3' overhang", 'unknown')
+#Cut offsets of enzymes that Bio.Restriction has as None
+NO_CUT = numpy.iinfo(numpy.int32).min
+
+def default_snapshot_file():
+    """Return where the snapshot is kept: plasmidin/enzymes.snapshot in $XDG_CACHE_HOME, ~/.cache if that is not set"""
+    cache_home = os.environ.get('XDG_CACHE_HOME') or path.join(path.expanduser('~'), '.cache')
+    return path.join(cache_home, 'plasmidin', SNAPSHOT_NAME)
+
+def _pack_strings(strings):
+    """Return (int32 offsets, uint8 bytes) of ascii strings laid end to end"""
+    data = [string.encode('ascii') for string in strings]
+    offsets = numpy.zeros(len(data) + 1, dtype = numpy.int32)
+    offsets[1:] = numpy.cumsum([len(item) for item in data])
+    return offsets, numpy.frombuffer(b''.join(data), dtype = numpy.uint8)
+
+def _unpack_strings(offsets, data):
+    data = bytes(data)
+    offsets = offsets.tolist()
+    return tuple(data[start:end].decode('ascii') for start, end in zip(offsets[:-1], offsets[1:]))
+
+def _cut_offset(offset):
+    return NO_CUT if offset is None else offset
+
+class EnzymeSnapshot():
+    """
+    The REBASE data of Bio.Restriction enzymes compiled to arrays with one row per enzyme, sorted by name:
+    recognition site, cut offsets, overhang type, ambiguity, supplier bitmask and compatible end group.
+    Saved once to a file and memory mapped by EnzymeSnapshot.open so that enzyme metadata is read
+    from the arrays rather than from the Bio.Restriction enzyme classes.
+    Bit i of a supplier mask is supplier_codes[i]. Enzymes share an end group (>= 0) when their ends are
+    always compatible, ambiguous enzymes with an overhang have end group -1
+    """
+    ARRAYS = (
+        'name_offsets', 'names', 'site_offsets', 'sites', 'sizes', 'fst5', 'fst3', 'scd5', 'scd3',
+        'overhangs', 'ambiguous', 'supplier_masks', 'end_groups',
+        )
+
+    def __init__(self, arrays, supplier_codes, supplier_names, biopython_version = Bio.__version__, path = None):
+        self._arrays = arrays
+        self._enzyme_names = _unpack_strings(arrays['name_offsets'], arrays['names'])
+        self._enzyme_index = {enzyme_name : i for i, enzyme_name in enumerate(self._enzyme_names)}
+        self._supplier_codes = tuple(supplier_codes)
+        self._supplier_names = tuple(supplier_names)
+        self._biopython_version = biopython_version
+        self._path = path
+        self._sites = None
+
+    @classmethod
+    def from_enzymes(cls, enzymes = None):
+        """Compile the snapshot of enzymes (a RestrictionBatch or list of enzymes), every enzyme in Bio.Restriction by default"""
+        from Bio.Restriction import AllEnzymes
+        from Bio.Restriction.Restriction import suppliers_dict
+        enzymes = sorted(AllEnzymes if enzymes is None else enzymes)
+        supplier_codes = sorted(suppliers_dict)
+        if len(supplier_codes) > 63:
+            raise ValueError(f'{len(supplier_codes)} suppliers do not fit in an int64 bitmask')
+        bits = {code : 1 << i for i, code in enumerate(supplier_codes)}
+
+        overhangs = [OVERHANGS.index(enzyme.overhang()) for enzyme in enzymes]
+        #Defined enzymes always make the same ends, so share a group when they share an overhang sequence
+        groups = {}
+        end_groups = []
+        for enzyme, overhang in zip(enzymes, overhangs):
+            if OVERHANGS[overhang] == 'blunt':
+                end_groups.append(groups.setdefault('blunt', len(groups)))
+            elif enzyme.is_defined():
+                end_groups.append(groups.setdefault((overhang, enzyme.ovhgseq), len(groups)))
+            else:
+                end_groups.append(-1)
+
+        name_offsets, names = _pack_strings([str(enzyme) for enzyme in enzymes])
+        site_offsets, sites = _pack_strings([enzyme.site for enzyme in enzymes])
+        arrays = {
+            'name_offsets' : name_offsets,
+            'names' : names,
+            'site_offsets' : site_offsets,
+            'sites' : sites,
+            'sizes' : numpy.array([enzyme.size for enzyme in enzymes], dtype = numpy.int32),
+            'fst5' : numpy.array([_cut_offset(enzyme.fst5) for enzyme in enzymes], dtype = numpy.int32),
+            'fst3' : numpy.array([_cut_offset(enzyme.fst3) for enzyme in enzymes], dtype = numpy.int32),
+            'scd5' : numpy.array([_cut_offset(enzyme.scd5) for enzyme in enzymes], dtype = numpy.int32),
+            'scd3' : numpy.array([_cut_offset(enzyme.scd3) for enzyme in enzymes], dtype = numpy.int32),
+            'overhangs' : numpy.array(overhangs, dtype = numpy.int8),
+            'ambiguous' : numpy.array([enzyme.is_ambiguous() for enzyme in enzymes], dtype = bool),
+            'supplier_masks' : numpy.array([sum(bits[code] for code in set(enzyme.suppl)) for enzyme in enzymes], dtype = numpy.int64),
+            'end_groups' : numpy.array(end_groups, dtype = numpy.int32),
+        }
+        return cls(arrays, supplier_codes, [suppliers_dict[code][0] for code in supplier_codes])
+
+    def save(self, snapshot_file):
+        """
+        Write the snapshot to snapshot_file: a header, a json description of the arrays then the arrays,
+        each 8 byte aligned. The file is written aside and moved into place so readers never see part of it
+        """
+        layout = {}
+        offset = 0
+        for name in self.ARRAYS:
+            array = numpy.ascontiguousarray(self._arrays[name])
+            layout[name] = [array.dtype.str, offset, len(array)]
+            offset += array.nbytes + (-array.nbytes % 8)
+        description = json.dumps({
+            'biopython_version' : self._biopython_version,
+            'supplier_codes' : self._supplier_codes,
+            'supplier_names' : self._supplier_names,
+            'arrays' : layout,
+            }).encode('utf-8')
+        description += b' ' * (-(HEADER.size + len(description)) % 8)
+
+        directory = path.dirname(path.abspath(snapshot_file))
+        handle, temp_file = tempfile.mkstemp(dir = directory, suffix = '.tmp')
+        try:
+            with os.fdopen(handle, 'wb') as output:
+                output.write(HEADER.pack(MAGIC, len(description)))
+                output.write(description)
+                for name in self.ARRAYS:
+                    data = numpy.ascontiguousarray(self._arrays[name]).tobytes()
+                    output.write(data + b'\0' * (-len(data) % 8))
+            os.chmod(temp_file, 0o644)
+            os.replace(temp_file, snapshot_file)
+        except BaseException:
+            if path.exists(temp_file):
+                os.remove(temp_file)
+            raise
+
+    @classmethod
+    def open(cls, snapshot_file):
+        """Memory map a snapshot written by EnzymeSnapshot.save"""
+        with open(snapshot_file, 'rb') as handle:
+            magic, description_size = HEADER.unpack(handle.read(HEADER.size))
+            if magic != MAGIC:
+                raise ValueError(f'{snapshot_file} is not an enzyme snapshot file')
+            description = json.loads(handle.read(description_size))
+        data_offset = HEADER.size + description_size
+        arrays = {}
+        for name, (dtype, offset, size) in description['arrays'].items():
+            if size:
+                arrays[name] = numpy.memmap(snapshot_file, dtype = dtype, mode = 'r', offset = data_offset + offset, shape = (size,))
+            else:
+                arrays[name] = numpy.zeros(0, dtype = dtype)
+        return cls(arrays, description['supplier_codes'], description['supplier_names'], description['biopython_version'], str(snapshot_file))
+
+    @property
+    def enzyme_names(self):
+        return self._enzyme_names
+
+    @property
+    def supplier_codes(self):
+        return self._supplier_codes
+
+    @property
+    def supplier_names(self):
+        return self._supplier_names
+
+    @property
+    def biopython_version(self):
+        return self._biopython_version
+
+    @property
+    def path(self):
+        return self._path
+
+    @property
+    def nbytes(self):
+        """Returns the bytes held by the arrays"""
+        return sum(array.nbytes for array in self._arrays.values())
+
+    def __contains__(self, enzyme_name):
+        return str(enzyme_name) in self._enzyme_index
+
+    def __len__(self):
+        return len(self._enzyme_names)
+
+    def __repr__(self):
+        return f'EnzymeSnapshot({len(self)} enzymes, Biopython {self._biopython_version})'
+
+    def rows(self, enzyme_names):
+        """Return the row of each of enzyme_names, -1 for enzymes not in the snapshot"""
+        enzyme_index = self._enzyme_index
+        return numpy.array([enzyme_index.get(str(enzyme_name), -1) for enzyme_name in enzyme_names], dtype = numpy.int64)
+
+    def _known_rows(self, enzyme_names):
+        rows = self.rows(enzyme_names)
+        if len(rows) and rows.min() < 0:
+            missing = [str(enzyme_name) for enzyme_name, row in zip(enzyme_names, rows.tolist()) if row < 0]
+            raise ValueError(f'{", ".join(missing)} not in the enzyme snapshot')
+        return rows
+
+    def _column(self, name, enzyme_names):
+        return numpy.asarray(self._arrays[name])[self._known_rows(enzyme_names)]
+
+    def is_ambiguous(self, enzyme_names):
+        """Return a boolean array of whether each enzyme has an ambiguous recognition site or cut"""
+        return self._column('ambiguous', enzyme_names)
+
+    def is_commercial(self, enzyme_names):
+        """Return a boolean array of whether each enzyme has a supplier"""
+        return self._column('supplier_masks', enzyme_names) != 0
+
+    def supplier_masks(self, enzyme_names):
+        return self._column('supplier_masks', enzyme_names)
+
+    def end_groups(self, enzyme_names):
+        return self._column('end_groups', enzyme_names)
+
+    def overhang_codes(self, enzyme_names):
+        """Return the index into OVERHANGS of the overhang each enzyme leaves"""
+        return self._column('overhangs', enzyme_names)
+
+    def overhangs(self, enzyme_names):
+        """Return the overhang each enzyme leaves, the same as the enzymes' overhang()"""
+        return [OVERHANGS[code] for code in self.overhang_codes(enzyme_names).tolist()]
+
+    def supplier_lists(self, enzyme_names):
+        """Return the supplier names of each enzyme, the same as the enzymes' supplier_list()"""
+        lists = {}
+        names = []
+        for mask in self.supplier_masks(enzyme_names).tolist():
+            if mask not in lists:
+                lists[mask] = [name for i, name in enumerate(self._supplier_names) if mask >> i & 1]
+            names.append(lists[mask])
+        return names
+
+    def unambiguous(self, enzyme_names):
+        """Return the enzyme_names without the ambiguous enzymes"""
+        return [enzyme_name for enzyme_name, ambiguous in zip(enzyme_names, self.is_ambiguous(enzyme_names).tolist()) if not ambiguous]
+
+    def site(self, enzyme_name):
+        """Return the recognition site of an enzyme"""
+        if self._sites is None:
+            self._sites = _unpack_strings(self._arrays['site_offsets'], self._arrays['sites'])
+        return self._sites[self._known_rows([enzyme_name])[0]]
+
+    def cut_offsets(self, enzyme_name):
+        """Return the (fst5, fst3, scd5, scd3) cut offsets of an enzyme, None where it has no such cut"""
+        row = self._known_rows([enzyme_name])[0]
+        return tuple(None if offset == NO_CUT else offset for offset in (int(self._arrays[name][row]) for name in ('fst5', 'fst3', 'scd5', 'scd3')))
+
+    def size(self, enzyme_name):
+        """Return the recognition site length of an enzyme"""
+        return int(self._arrays['sizes'][self._known_rows([enzyme_name])[0]])
+
+def load_snapshot(snapshot_file = None):
+    """
+    Memory map the snapshot in snapshot_file, the user cache (default_snapshot_file()) by default. It is compiled from
+    Bio.Restriction and written first if the file is missing or was made from another Biopython (and so REBASE) version.
+    If the file cannot be written the compiled snapshot is kept in memory
+    """
+    snapshot_file = default_snapshot_file() if snapshot_file is None else snapshot_file
+    try:
+        snapshot = EnzymeSnapshot.open(snapshot_file)
+        if snapshot.biopython_version == Bio.__version__:
+            return snapshot
+    except (OSError, ValueError):
+        pass
+    snapshot = EnzymeSnapshot.from_enzymes()
+    try:
+        os.makedirs(path.dirname(path.abspath(snapshot_file)), exist_ok = True)
+        snapshot.save(snapshot_file)
+    except OSError:
+        return snapshot
+    return EnzymeSnapshot.open(snapshot_file)
+
+_snapshot = None
+_batch_snapshots = {}
+
+def enzyme_snapshot(rb = None):
+    """
+    Return the snapshot of every Bio.Restriction enzyme, loaded the first time it is used.
+    Given an rb holding enzymes missing from it (user defined enzymes), return a snapshot compiled for rb
+    """
+    global _snapshot
+    if _snapshot is None:
+        _snapshot = load_snapshot()
+    if rb is None or all(str(enzyme) in _snapshot for enzyme in rb):
+        return _snapshot
+    key = frozenset(str(enzyme) for enzyme in rb)
+    snapshot = _batch_snapshots.get(key)
+    if snapshot is None:
+        snapshot = EnzymeSnapshot.from_enzymes(rb)
+        _batch_snapshots[key] = snapshot
+    return snapshot
+
+if __name__ == '__main__':
+    #Rewrite the cached snapshot, e.g. after upgrading Biopython
+    snapshot_file = default_snapshot_file()
+    os.makedirs(path.dirname(snapshot_file), exist_ok = True)
+    EnzymeSnapshot.from_enzymes().save(snapshot_file)
+    print(EnzymeSnapshot.open(snapshot_file))
@@ -0,0 +1,168 @@
+import numpy
+from Bio.SeqFeature import SeqFeature, SimpleLocation
+
+#A style is (sigil, color as a hex string with alpha, label, label_size, label_angle)
+DEFAULT_STYLE = ('BOX', '0x000000ff', True, 11, 0)
+ENZYME_STYLE = ('BOX', '0x000000ff', True, 8, 45)
+
+def _read_only(values, dtype):
+    array = numpy.array(values, dtype = dtype)
+    array.setflags(write = False)
+    return array
+
+def _style(info):
+    color = info.get('color')
+    return (
+        info.get('sigil', DEFAULT_STYLE[0]), DEFAULT_STYLE[1] if color is None else color.hexvala(),
+        bool(info.get('label', DEFAULT_STYLE[2])), info.get('label_size', DEFAULT_STYLE[3]), info.get('label_angle', DEFAULT_STYLE[4]),
+        )
+
+class FeatureRecords():
+    """
+    An immutable set of plasmid map features held as read only arrays rather than SeqFeatures and info dicts:
+    the start and end of each feature, its name and an index into a few distinct styles.
+    It reads as the {cut site : (SeqFeature, info)} dict RSFinder.create_enzyme_records used to make, keyed by
+    the feature starts: keys, values, items, get, in and [cut site] work the same, and to_dict makes the dict.
+    The info dicts hold feature_name, sigil, color, label, label_size and label_angle.
+    head gives the first features in order
+    """
+    __slots__ = ('_starts', '_ends', '_names', '_style_index', '_styles', '_lookup')
+
+    def __init__(self, starts, ends, names, style_index, styles):
+        self._starts = _read_only(starts, numpy.int64)
+        self._ends = _read_only(ends, numpy.int64)
+        self._names = tuple(names)
+        self._style_index = _read_only(style_index, numpy.int32)
+        self._styles = tuple(tuple(style) for style in styles)
+        self._lookup = None
+
+    @classmethod
+    def from_features(cls, features):
+        """Make the records of (SeqFeature, info) pairs, or of a {key : (SeqFeature, info)} dict"""
+        if isinstance(features, FeatureRecords):
+            return features
+        if isinstance(features, dict):
+            features = features.values()
+        starts, ends, names, style_index = [], [], [], []
+        styles = {}
+        for feature, info in features:
+            starts.append(int(feature.location.start))
+            ends.append(int(feature.location.end))
+            names.append(info.get('feature_name', ''))
+            style_index.append(styles.setdefault(_style(info), len(styles)))
+        return cls(starts, ends, names, style_index, list(styles))
+
+    @classmethod
+    def from_cut_store(cls, cut_store, max_n_cut_sites = 2, style = ENZYME_STYLE):
+        """
+        Make one record per cut site of the enzymes cutting 1 to max_n_cut_sites times, named by every enzyme cutting there
+        (fewest cut sites first). The sites are grouped with one sort (CutSiteStore.group_by_position) and each name joined once
+        """
+        positions, group_offsets, rows = cut_store.group_by_position(max_n_cut_sites)
+        enzyme_names = cut_store.enzyme_names
+        rows = rows.tolist()
+        group_offsets = group_offsets.tolist()
+        names = [', '.join([enzyme_names[row] for row in rows[first:last]]) for first, last in zip(group_offsets[:-1], group_offsets[1:])]
+        return cls(positions, positions + 1, names, numpy.zeros(len(positions), dtype = numpy.int32), [style])
+
+    @property
+    def starts(self):
+        return self._starts
+
+    @property
+    def ends(self):
+        return self._ends
+
+    @property
+    def names(self):
+        return self._names
+
+    @property
+    def style_index(self):
+        return self._style_index
+
+    @property
+    def styles(self):
+        return self._styles
+
+    @property
+    def nbytes(self):
+        return self._starts.nbytes + self._ends.nbytes + self._style_index.nbytes + sum(len(name) for name in self._names)
+
+    def __len__(self):
+        return len(self._names)
+
+    def __repr__(self):
+        return f'FeatureRecords({len(self)} features, {len(self._styles)} styles)'
+
+    def __eq__(self, other):
+        if not isinstance(other, FeatureRecords):
+            return NotImplemented
+        return (
+            self._names == other._names and numpy.array_equal(self._starts, other._starts) and numpy.array_equal(self._ends, other._ends)
+            and [self._styles[i] for i in self._style_index.tolist()] == [other._styles[i] for i in other._style_index.tolist()]
+            )
+
+    __hash__ = None
+
+    def __reduce__(self):
+        return FeatureRecords, (self._starts, self._ends, self._names, self._style_index, self._styles)
+
+    def _infos(self):
+        """Return an info dict (without feature_name) for every style"""
+        from reportlab.lib import colors #only needed to draw
+        return [
+            {'sigil' : sigil, 'color' : colors.HexColor(color, hasAlpha = True), 'label' : label, 'label_size' : label_size, 'label_angle' : label_angle}
+            for sigil, color, label, label_size, label_angle in self._styles
+            ]
+
+    def _feature(self, i, infos):
+        start, end, style = int(self._starts[i]), int(self._ends[i]), int(self._style_index[i])
+        return SeqFeature(SimpleLocation(start, end)), dict(infos[style], feature_name = self._names[i])
+
+    def _position(self, cut_site):
+        """Return the index of the feature starting at cut_site, the first if several do. Raises a KeyError if none do"""
+        if self._lookup is None:
+            lookup = {}
+            for i, start in enumerate(self._starts.tolist()):
+                lookup.setdefault(start, i)
+            self._lookup = lookup
+        return self._lookup[cut_site]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __contains__(self, cut_site):
+        try:
+            self._position(cut_site)
+        except (KeyError, TypeError):
+            return False
+        return True
+
+    def __getitem__(self, cut_site):
+        return self._feature(self._position(cut_site), self._infos())
+
+    def head(self, n = 5):
+        """Return the (SeqFeature, info) of the first n features as a list"""
+        infos = self._infos()
+        return [self._feature(i, infos) for i in range(min(n, len(self)))]
+
+    def get(self, cut_site, default = None):
+        return self[cut_site] if cut_site in self else default
+
+    def keys(self):
+        """Return the cut site (start) of every feature"""
+        return self._starts.tolist()
+
+    def values(self):
+        """Return the (SeqFeature, info) of every feature as a list"""
+        infos = self._infos()
+        return [self._feature(i, infos) for i in range(len(self))]
+
+    def items(self):
+        """Return (cut site, (SeqFeature, info)) for every feature as a list"""
+        return list(zip(self.keys(), self.values()))
+
+    def to_dict(self):
+        """Return {cut site : (SeqFeature, info)}, the dict RSFinder.create_enzyme_records used to make"""
+        return dict(self.items())
@@ -0,0 +1,84 @@
+import numpy
+import pandas
+
+from plasmidin.digest import candidate_digests, cut_matrix, digest_matrix_sizes, digest_names
+
+#Two bands are told apart when their log10 sizes differ by at least this much (about 6% in size)
+DEFAULT_RESOLUTION = 0.025
+DEFAULT_MIN_BAND = 100
+DEFAULT_MAX_BAND = 20000
+CHUNK_ELEMENTS = 2 ** 22
+
+def band_mobility(sizes, min_size = DEFAULT_MIN_BAND, max_size = DEFAULT_MAX_BAND):
+    """
+    Return the relative mobility of each fragment size with the log-linear model, mobility = -log10(size).
+    Fragments shorter than min_size (and zero padding) run off the gel and are nan,
+    fragments longer than max_size run together at the top of the gel
+    """
+    sizes = numpy.asarray(sizes, dtype = numpy.float64)
+    mobility = -numpy.log10(numpy.clip(sizes, min_size, max_size))
+    return numpy.where(sizes >= min_size, mobility, numpy.nan)
+
+def lane_distance(lhs, rhs):
+    """
+    Return the distance between the bands of lanes lhs and rhs (row by row): the furthest any band
+    in one lane is from the nearest band in the other. Bands missing from one lane give inf
+    """
+    differences = numpy.abs(lhs[:, :, None] - rhs[:, None, :])
+    differences = numpy.where(numpy.isnan(differences), numpy.inf, differences)
+    lhs_nearest = numpy.where(numpy.isnan(lhs), 0, differences.min(axis = 2, initial = numpy.inf))
+    rhs_nearest = numpy.where(numpy.isnan(rhs), 0, differences.min(axis = 1, initial = numpy.inf))
+    return numpy.maximum(lhs_nearest.max(axis = 1, initial = 0), rhs_nearest.max(axis = 1, initial = 0))
+
+def score_digests(products, enzyme_names, digests, resolution = DEFAULT_RESOLUTION, min_size = DEFAULT_MIN_BAND, max_size = DEFAULT_MAX_BAND):
+    """
+    Score how well every digest tells the products apart on a gel.
+    products - a list of (product name, CutSiteStore, length, linear)
+    enzyme_names, digests - the enzymes and digests from plasmidin.digest.candidate_digests
+    The score of a digest is the smallest lane_distance between any two products
+    """
+    sizes = {}
+    mobilities = []
+    for name, cut_store, length, linear in products:
+        sizes[name] = digest_matrix_sizes(cut_matrix(cut_store, enzyme_names), digests, length, linear)
+        mobilities.append(band_mobility(sizes[name], min_size, max_size))
+
+    scores = numpy.full(len(digests), numpy.inf)
+    for i in range(len(mobilities)):
+        for j in range(i + 1, len(mobilities)):
+            lhs, rhs = mobilities[i], mobilities[j]
+            #Chunked so the band by band differences stay small for products cut many times
+            chunk = max(1, CHUNK_ELEMENTS // max(1, lhs.shape[1] * rhs.shape[1]))
+            for start in range(0, len(digests), chunk):
+                end = start + chunk
+                scores[start:end] = numpy.minimum(scores[start:end], lane_distance(lhs[start:end], rhs[start:end]))
+
+    #A lane with no visible bands is as far as the gel allows from any other
+    scores = numpy.minimum(scores, numpy.log10(max_size / min_size))
+    names = digest_names(enzyme_names, digests)
+    table = pandas.DataFrame({
+        'Enzymes' : names,
+        'N_enzymes' : [len(enzymes) for enzymes in names],
+        'Score' : scores,
+        'Resolved' : scores >= resolution,
+        })
+    for name, product_sizes in sizes.items():
+        table[f'{name}_sizes'] = [tuple(size for size in row if size) for row in product_sizes.tolist()]
+    return table
+
+def diagnostic_digests(integrated_rsfinder, backbone_rsfinder, additional_integrated_rsfinder = None, k = 10, max_cut_sites = 2, double_digests = True, resolution = DEFAULT_RESOLUTION, min_size = DEFAULT_MIN_BAND, max_size = DEFAULT_MAX_BAND):
+    """
+    Return the top k digests for telling the integrated sequence from the reverse integrated sequence (if given)
+    and the empty backbone on a gel, best first, each given as its RSFinder. Digests use the enzymes cutting the
+    integrated sequence 1 to max_cut_sites times. Ties are broken by fewer enzymes
+    """
+    rsfinders = [('Forward', integrated_rsfinder)]
+    if additional_integrated_rsfinder is not None:
+        rsfinders.append(('Reverse', additional_integrated_rsfinder))
+    rsfinders.append(('Backbone', backbone_rsfinder))
+    products = [(name, rsfinder.cut_store, len(rsfinder.seq_view), rsfinder.linear) for name, rsfinder in rsfinders]
+
+    enzyme_names, digests = candidate_digests(integrated_rsfinder.cut_store, max_cut_sites, double_digests)
+    table = score_digests(products, enzyme_names, digests, resolution, min_size, max_size)
+    table = table.sort_values(['Score', 'N_enzymes'], ascending = [False, True], kind = 'stable')
+    return table.head(k).reset_index(drop = True)
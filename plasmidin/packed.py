@@ -0,0 +1,228 @@
+import hashlib
+import struct
+
+import numpy
+from Bio.Seq import Seq
+
+MAGIC = b'PLSMPACK'
+HEADER = struct.Struct('<8sQQQ')
+CHUNK_SIZE = 4 * 1024 ** 2
+
+_BASES = b'ACGT'
+_COMPLEMENT = bytes.maketrans(b'ACGTRYKMBVDHSWN', b'TGCAYRMKVBHDSWN')
+
+_ENCODE = numpy.full(256, 4, dtype = numpy.uint8)
+for _code, _base in enumerate(_BASES):
+    _ENCODE[_base] = _code
+    _ENCODE[ord(chr(_base).lower())] = _code
+#The 2-bit codes and bases of the 4 bases held in every byte value, first base in the high bits
+_CODES = ((numpy.arange(256)[:, None] >> numpy.array([6, 4, 2, 0])) & 3).astype(numpy.uint8)
+_LETTERS = numpy.frombuffer(_BASES, dtype = numpy.uint8)
+_UNPACK = _LETTERS[_CODES]
+_COMPLEMENT_LETTERS = numpy.frombuffer(bytes(range(256)).translate(_COMPLEMENT), dtype = numpy.uint8)
+
+def _pack_codes(data: bytes):
+    """Return (packed bytes, exception offsets, exception bases) for a chunk of bases, a multiple of 4 long unless last"""
+    codes = _ENCODE[numpy.frombuffer(data, dtype = numpy.uint8)]
+    exceptions = numpy.flatnonzero(codes > 3)
+    letters = numpy.frombuffer(data.upper(), dtype = numpy.uint8)[exceptions]
+    codes = numpy.where(codes > 3, 0, codes)
+    codes = numpy.concatenate([codes, numpy.zeros(-len(codes) % 4, dtype = numpy.uint8)]).reshape(-1, 4)
+    packed = (codes[:, 0] << 6) | (codes[:, 1] << 4) | (codes[:, 2] << 2) | codes[:, 3]
+    return packed.astype(numpy.uint8), exceptions, letters
+
+def _layout(length, n_exceptions):
+    """Return the file offsets of the packed bases, exception positions and exception bases"""
+    packed_offset = HEADER.size
+    positions_offset = packed_offset + (length + 3) // 4
+    positions_offset += -positions_offset % 8
+    letters_offset = positions_offset + 8 * n_exceptions
+    return packed_offset, positions_offset, letters_offset
+
+class PackedSeq():
+    """
+    A DNA sequence held 2 bits per base, with the positions and letters of any other base (N, IUPAC codes) kept
+    aside, usually memory mapped from a file written by pack_seq so worker processes share one copy of the pages.
+    Bases are uppercase. Ranges are decoded on demand and the reverse complement is a view of the same data
+    """
+    def __init__(self, packed, exception_positions, exception_letters, length, path = None, reverse_complement = False):
+        self._packed = packed
+        self._exception_positions = exception_positions
+        self._exception_letters = exception_letters
+        self._length = length
+        self._path = path
+        self._reverse_complement = reverse_complement
+
+    @classmethod
+    def open(cls, path):
+        """Memory map a file written by pack_seq"""
+        with open(path, 'rb') as handle:
+            magic, length, n_exceptions, _ = HEADER.unpack(handle.read(HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(f'{path} is not a packed sequence file')
+        packed_offset, positions_offset, letters_offset = _layout(length, n_exceptions)
+        def memmap(dtype, offset, size):
+            if not size:
+                return numpy.zeros(0, dtype = dtype)
+            return numpy.memmap(path, dtype = dtype, mode = 'r', offset = offset, shape = (size,))
+        return cls(
+            memmap(numpy.uint8, packed_offset, (length + 3) // 4), memmap(numpy.int64, positions_offset, n_exceptions),
+            memmap(numpy.uint8, letters_offset, n_exceptions), length, path = str(path)
+            )
+
+    @classmethod
+    def from_seq(cls, seq):
+        """Pack a Seq or str in memory"""
+        data = str(seq).encode('ascii')
+        packed, positions, letters = _pack_codes(data)
+        return cls(packed, positions.astype(numpy.int64), letters, len(data))
+
+    def __getstate__(self):
+        #A file backed sequence is reopened, not copied, in the process it is sent to
+        state = self.__dict__.copy()
+        if self._path is not None:
+            state['_packed'] = state['_exception_positions'] = state['_exception_letters'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self._packed is None:
+            opened = PackedSeq.open(self._path)
+            self._packed = opened._packed
+            self._exception_positions = opened._exception_positions
+            self._exception_letters = opened._exception_letters
+
+    @property
+    def path(self):
+        return self._path
+
+    @property
+    def nbytes(self):
+        """Returns the bytes held by the packed bases and exceptions"""
+        return self._packed.nbytes + self._exception_positions.nbytes + self._exception_letters.nbytes
+
+    def __len__(self):
+        return self._length
+
+    def __repr__(self):
+        return f'PackedSeq({self._length} bases{", reverse complement" if self._reverse_complement else ""})'
+
+    def reverse_complement(self):
+        """Return the reverse complement as a view of the same packed bases"""
+        return PackedSeq(self._packed, self._exception_positions, self._exception_letters, self._length, self._path, not self._reverse_complement)
+
+    def _decode_forward(self, start, stop):
+        first_byte = start // 4
+        bases = _UNPACK[numpy.asarray(self._packed[first_byte:(stop + 3) // 4])].ravel()
+        bases = bases[start - 4 * first_byte:stop - 4 * first_byte]
+        lo, hi = numpy.searchsorted(self._exception_positions, [start, stop]).tolist()
+        if hi > lo:
+            bases = bases.copy()
+            bases[numpy.asarray(self._exception_positions[lo:hi]) - start] = self._exception_letters[lo:hi]
+        return bases.tobytes()
+
+    def _codes_forward(self, start, stop):
+        first_byte = start // 4
+        codes = _CODES[numpy.asarray(self._packed[first_byte:(stop + 3) // 4])].ravel()
+        codes = codes[start - 4 * first_byte:stop - 4 * first_byte]
+        lo, hi = numpy.searchsorted(self._exception_positions, [start, stop]).tolist()
+        if hi > lo:
+            codes[numpy.asarray(self._exception_positions[lo:hi]) - start] = 4
+        return codes
+
+    def codes(self, start = 0, stop = None):
+        """
+        Return the 2-bit codes (A 0, C 1, G 2, T 3) of bases start to stop as a uint8 array, 4 for any other base,
+        without decoding the bases
+        """
+        stop = self._length if stop is None else stop
+        start, stop = max(start, 0), min(stop, self._length)
+        if start >= stop:
+            return numpy.zeros(0, dtype = numpy.uint8)
+        if not self._reverse_complement:
+            return self._codes_forward(start, stop)
+        codes = self._codes_forward(self._length - stop, self._length - start)[::-1]
+        return numpy.where(codes < 4, 3 - codes, codes).astype(numpy.uint8)
+
+    def bases_at(self, positions):
+        """Return the bases at an array of positions as a uint8 array of ascii codes"""
+        positions = numpy.asarray(positions, dtype = numpy.int64)
+        forward = self._length - 1 - positions if self._reverse_complement else positions
+        codes = (numpy.asarray(self._packed)[forward >> 2] >> (6 - 2 * (forward & 3))) & 3
+        bases = _LETTERS[codes]
+        exception_positions = self._exception_positions
+        if len(exception_positions):
+            found = numpy.minimum(numpy.searchsorted(exception_positions, forward), len(exception_positions) - 1)
+            exception = numpy.asarray(exception_positions)[found] == forward
+            bases[exception] = numpy.asarray(self._exception_letters)[found[exception]]
+        if self._reverse_complement:
+            bases = _COMPLEMENT_LETTERS[bases]
+        return bases
+
+    def decode(self, start = 0, stop = None):
+        """Return bases start to stop (0-based, stop exclusive) as bytes"""
+        stop = self._length if stop is None else stop
+        start, stop = max(start, 0), min(stop, self._length)
+        if start >= stop:
+            return b''
+        if not self._reverse_complement:
+            return self._decode_forward(start, stop)
+        return self._decode_forward(self._length - stop, self._length - start)[::-1].translate(_COMPLEMENT)
+
+    def chunks(self):
+        """Yield the decoded bases in order, CHUNK_SIZE at a time"""
+        for start in range(0, self._length, CHUNK_SIZE):
+            yield self.decode(start, start + CHUNK_SIZE)
+
+    def __bytes__(self):
+        return self.decode()
+
+    def __str__(self):
+        return self.decode().decode('ascii')
+
+    def to_seq(self):
+        """Return the sequence as a Bio.Seq.Seq, decoding every base"""
+        return Seq(self.decode())
+
+    def digest(self):
+        """Return the sha256 hex digest of the sequence, the same as plasmidin.cache.sequence_digest"""
+        sha256 = hashlib.sha256()
+        for chunk in self.chunks():
+            sha256.update(chunk)
+        return sha256.hexdigest()
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return Seq(str(self)[key]) if key.step not in (None, 1) else Seq(self.decode(*key.indices(self._length)[:2]))
+        if key < 0:
+            key += self._length
+        if not 0 <= key < self._length:
+            raise IndexError('PackedSeq index out of range')
+        return self.decode(key, key + 1).decode('ascii')
+
+def pack_seq(seq, path = None):
+    """
+    Pack a Seq or str 2 bits per base and return the PackedSeq.
+    With a path the packed sequence is written there and memory mapped back
+    """
+    if path is None:
+        return PackedSeq.from_seq(seq)
+    data = str(seq).encode('ascii')
+    chunks = [_pack_codes(data[start:start + CHUNK_SIZE]) + (start,) for start in range(0, len(data), CHUNK_SIZE)]
+    n_exceptions = sum(len(positions) for _, positions, _, _ in chunks)
+    packed_offset, positions_offset, letters_offset = _layout(len(data), n_exceptions)
+    with open(path, 'wb') as handle:
+        handle.write(HEADER.pack(MAGIC, len(data), n_exceptions, 0))
+        for packed, _, _, _ in chunks:
+            handle.write(packed.tobytes())
+        handle.write(b'\0' * (positions_offset - handle.tell()))
+        for _, positions, _, start in chunks:
+            handle.write((positions + start).astype('<i8').tobytes())
+        for _, _, letters, _ in chunks:
+            handle.write(letters.tobytes())
+    return PackedSeq.open(path)
+
+def is_packed_file(path):
+    """Return whether path is a file written by pack_seq"""
+    with open(path, 'rb') as handle:
+        return handle.read(len(MAGIC)) == MAGIC
@@ -1,3 +1,4 @@
+import numpy
 from Bio.Graphics import GenomeDiagram
 from Bio.SeqFeature import SeqFeature, SimpleLocation
 from Bio.Seq import Seq
@@ -5,14 +6,103 @@ from Bio.Seq import Seq
 from reportlab.lib import colors
 from reportlab.lib.units import cm
 
+from plasmidin.features import FeatureRecords
+from plasmidin.profiling import profiled
+
+#The map is split into this many buckets and the features in each bucket are drawn as one
+DEFAULT_RESOLUTION = 720
+DEFAULT_MAX_LABELS = 60
+#Maps with at most this many features are drawn as given, only denser maps are clustered
+CLUSTER_THRESHOLD = 250
+MAX_COORDINATES = 12
+#Linear maps are drawn in rows of at least this many bases
+MIN_FRAGMENT_LENGTH = 500
+#A clustered label names at most this many enzymes then gives the number left out
+MAX_LABEL_NAMES = 4
+
+def coordinate_step(seq_length, max_coordinates = MAX_COORDINATES):
+    """Return the smallest 1, 2 or 5 x 10^n step giving at most max_coordinates coordinates along seq_length"""
+    step = 1
+    while True:
+        for multiple in (1, 2, 5):
+            if seq_length / (step * multiple) <= max_coordinates:
+                return step * multiple
+        step *= 10
+
+def _split_names(feature_name):
+    return [name for name in feature_name.split(', ') if name]
+
+def _cluster_name(feature_names):
+    names = [name for feature_name in feature_names for name in _split_names(feature_name)]
+    if len(names) > MAX_LABEL_NAMES:
+        return f'{", ".join(names[:MAX_LABEL_NAMES])} +{len(names) - MAX_LABEL_NAMES}'
+    return ', '.join(names)
+
+def cluster_features(features, seq_length, resolution = DEFAULT_RESOLUTION, max_labels = DEFAULT_MAX_LABELS):
+    """
+    Merge the features in the same 1/resolution of the sequence into one feature spanning them, named by all of
+    their feature_names, so the number of features drawn depends on the resolution not the number of sites.
+    Only the max_labels clusters of the fewest enzymes keep a label, the rest are drawn unlabelled.
+    features - FeatureRecords or (SeqFeature, info), returns FeatureRecords
+    """
+    records = FeatureRecords.from_features(features)
+    if not len(records):
+        return records
+    buckets = records.starts * resolution // max(seq_length, 1)
+    order = numpy.argsort(buckets, kind = 'stable')
+    firsts = numpy.flatnonzero(numpy.diff(buckets[order], prepend = -1))
+    starts = numpy.minimum.reduceat(records.starts[order], firsts)
+    ends = numpy.maximum.reduceat(records.ends[order], firsts)
+    style_index = records.style_index[order[firsts]]
+
+    names = records.names
+    order = order.tolist()
+    bounds = numpy.append(firsts, len(order)).tolist()
+    cluster_names = [
+        names[order[first]] if last - first == 1 else _cluster_name(names[i] for i in order[first:last])
+        for first, last in zip(bounds[:-1], bounds[1:])
+        ]
+
+    styles = list(records.styles)
+    if max_labels is not None and len(cluster_names) > max_labels:
+        #Ranked by every enzyme in the cluster, not the few a shortened name shows
+        n_names = numpy.add.reduceat(numpy.array([len(_split_names(names[i])) for i in order]), firsts)
+        unlabelled = numpy.argsort(n_names, kind = 'stable')[max_labels:]
+        #Each style drawn unlabelled gets an unlabelled copy
+        unlabelled_styles = {}
+        for i in unlabelled.tolist():
+            style = int(style_index[i])
+            if style not in unlabelled_styles:
+                unlabelled_styles[style] = len(styles)
+                styles.append(styles[style][:2] + (False,) + styles[style][3:])
+            style_index[i] = unlabelled_styles[style]
+    return FeatureRecords(starts, ends, cluster_names, style_index, styles)
+
+def needs_clustering(features, resolution, cluster_threshold = CLUSTER_THRESHOLD):
+    """Return whether features are clustered before drawing: a resolution is given and there are more than cluster_threshold"""
+    return resolution is not None and (cluster_threshold is None or len(features) > cluster_threshold)
+
 class PlasmidDrawer():
-    def __init__(self, seq: Seq, seq_id: str, feature_info, coodinate_step = 500):
+    """
+    Draw a plasmid map of seq with GenomeDiagram.
+    feature_info - FeatureRecords from RSFinder.create_enzyme_records, a {key : (SeqFeature, info)} dict or an iterable of (SeqFeature, info)
+    coodinate_step - the spacing of the coordinates, by default chosen from the sequence length (see coordinate_step)
+    resolution - the number of buckets features are clustered into (see cluster_features), None draws every feature
+    max_labels - the most clusters labelled, None labels them all
+    cluster_threshold - features are only clustered when there are more than this many, None always clusters
+    seq_length - the length to draw when seq is None, so a map can be drawn without the sequence
+    """
+    @profiled()
+    def __init__(self, seq: Seq, seq_id: str, feature_info, coodinate_step = None, resolution = DEFAULT_RESOLUTION, max_labels = DEFAULT_MAX_LABELS, seq_length = None, cluster_threshold = CLUSTER_THRESHOLD):
         self._seq = seq
         self._seq_id = seq_id
-        self._seq_length = len(seq)
-        self._coordinate_step = coodinate_step
+        self._seq_length = len(seq) if seq is not None else seq_length
+        self._coordinate_step = coodinate_step or coordinate_step(self._seq_length)
         self._coordinate_track = 3
         self._feature_info = feature_info
+        self._resolution = resolution
+        self._max_labels = max_labels
+        self._cluster_threshold = cluster_threshold
 
         self._init_gd_diagram()
         self._init_features()
@@ -70,11 +160,11 @@ class PlasmidDrawer():
         self._gd_feature_set = self._gd_track_for_features.new_set()            
 
     def _init_features(self):
-        feature_info = self._feature_info
+        features = FeatureRecords.from_features(self._feature_info)
+        if needs_clustering(features, self._resolution, self._cluster_threshold):
+            features = cluster_features(features, self.seq_length, self._resolution, self._max_labels)
 
-        for feature, info in feature_info.values():
-            # print(feature)
-            # print(info)
+        for feature, info in features.values():
             self.add_gd_feature(feature, info)
 
     def add_gd_feature(self, feature, info):
@@ -98,7 +188,9 @@ class PlasmidDrawer():
     def remove_gd_feature(self, cut_site):
         raise NotImplementedError
     
-    def draw_gd_diagram(self, diagram_file, diagram_format, draw_settings, filetype = 'PDF'):
+    @profiled()
+    def layout_gd_diagram(self, diagram_format, draw_settings):
+        """Lay the diagram out as linear or circular and return the reportlab Drawing, without writing a file"""
         pagesize = draw_settings.get('pagesize', 'A4')
         start = 0
         end = self.seq_length
@@ -109,7 +201,7 @@ class PlasmidDrawer():
                 format = diagram_format, 
                 circular = False, 
                 pagesize = pagesize,
-                fragments = (self.seq_length // self._coordinate_step) + 1,
+                fragments = (self.seq_length // max(self._coordinate_step, MIN_FRAGMENT_LENGTH)) + 1,
                 start = start,
                 end = end
                 )
@@ -127,7 +219,11 @@ class PlasmidDrawer():
                 )
         else:
             raise NotImplementedError('Please choose from linear or circular')
-        
+        return self.gd_diagram.drawing
+
+    @profiled()
+    def draw_gd_diagram(self, diagram_file, diagram_format, draw_settings, filetype = 'PDF'):
+        self.layout_gd_diagram(diagram_format, draw_settings)
         self.gd_diagram.write(diagram_file, filetype)
 
 def main():
@@ -1,14 +1,23 @@
 from os import path
 
-import pandas
-from Bio.Restriction import Analysis, RestrictionBatch, CommOnly, AllEnzymes
 from Bio.Seq import Seq
-from Bio.SeqFeature import SeqFeature, SimpleLocation
-from Bio import SeqIO
-import numpy
-from reportlab.lib import colors
 
 from plasmidin.plasmidin_exceptions import AmbiguousCutError, CompatibleEndsError
+from plasmidin.profiling import profiled, stage
+
+#Bio.Restriction, numpy, pandas, reportlab and the scanning, cache and table building modules are imported
+#where they are first used so that importing plasmidin does not pay for them
+_default_rb = None
+#The columns of the table made by make_enzyme_table, in order
+ENZYME_TABLE_COLUMNS = ['Name', 'N_sites', 'Cut_Locations', 'Cut_type', 'CommerciallyAvailable', 'Suppliers']
+
+def default_batch():
+    """Return the default RestrictionBatch of commercially available enzymes, made the first time it is used"""
+    global _default_rb
+    if _default_rb is None:
+        from Bio.Restriction import CommOnly, RestrictionBatch
+        _default_rb = RestrictionBatch(CommOnly)
+    return _default_rb
 
 def enzyme_dict_to_string(n_cut_enzymes: dict):
     """Convert an analysis dictionary enzyme objects to the string name"""
@@ -22,33 +31,40 @@ def return_shared_dict(cut_enzymes: dict, shared_enzymes):
     """Return a dictionary of {enzyme : [cut sites]} for every enzyme in shared_enzymes"""
     return {enzyme_name: cut_sites for enzyme_name, cut_sites in cut_enzymes.items() if enzyme_name in shared_enzymes}
 
-def compatible_enzymes(enzyme1, enzyme2):
-    """Return whether enzyme1 and enzyme2 have compatible ends"""
-    return AllEnzymes.get(enzyme2) in AllEnzymes.get(enzyme1).compatible_end()
+def compatible_enzymes(enzyme1, enzyme2, index = None):
+    """Return whether enzyme1 and enzyme2 have compatible ends, using a CompatibilityIndex if given"""
+    if index is not None:
+        return index.compatible(enzyme1, enzyme2)
+    from Bio.Restriction import AllEnzymes
+    from plasmidin.compatibility import compatible_pair
+    return compatible_pair(AllEnzymes.get(enzyme1), AllEnzymes.get(enzyme2))
 
 def ambiguous_cut(enzymes):
-    ambiguous_list = []
-    for enzyme_name in enzymes:
-        enzyme = AllEnzymes.get(enzyme_name)
-        if enzyme.is_ambiguous():
-            return True, enzyme
-    else:
-        return False, None
-
-def compatible_enzymes_matrix(backbone_enzymes, insert_enzymes):
+    """Return (True, the first enzyme with an ambiguous cut) or (False, None), looked up in the enzyme snapshot"""
+    from Bio.Restriction import AllEnzymes
+    from plasmidin.enzyme_snapshot import enzyme_snapshot
+    enzymes = [str(enzyme) for enzyme in enzymes]
+    for enzyme_name, ambiguous in zip(enzymes, enzyme_snapshot().is_ambiguous(enzymes).tolist()):
+        if ambiguous:
+            return True, AllEnzymes.get(enzyme_name)
+    return False, None
+
+def compatible_enzymes_matrix(backbone_enzymes, insert_enzymes, index = None):
     """
     Search two lists of enzymes and determine if they have compatible ends 
-    (through the Bio.Restriction.ENZYNME objects) and the direction of the insert
+    (through the Bio.Restriction.ENZYNME objects) and the direction of the insert.
+    index - a plasmidin.compatibility.CompatibilityIndex to look the ends up in. 
+    Defaults to the index of all enzymes
     """
+    import numpy
     compatible_ends = True
     reverse_seq = False
     ambiguous_insert = False
 
-    matrix = numpy.empty((len(backbone_enzymes), len(insert_enzymes)))
-
-    for i, backbone_enzyme in enumerate(backbone_enzymes):
-        for j, insert_enzyme in enumerate(insert_enzymes):
-            matrix[i][j] = compatible_enzymes(backbone_enzyme, insert_enzyme)
+    if index is None:
+        from plasmidin.compatibility import compatibility_index
+        index = compatibility_index()
+    matrix = index.submatrix(backbone_enzymes, insert_enzymes)
     
     diagonal = all(matrix[i][i] == True for i in range(min(len(backbone_enzymes), len(insert_enzymes))))
     anti_diagonal = all(matrix[i][len(insert_enzymes)-i-1] == True for i in range(min(len(backbone_enzymes), len(insert_enzymes))))
@@ -64,12 +80,87 @@ def compatible_enzymes_matrix(backbone_enzymes, insert_enzymes):
 
     return compatible_ends, reverse_seq, ambiguous_insert
 
+def cut_locations_to_string(cut_locations):
+    """Convert an iterable of cut site lists to '; ' separated strings"""
+    return ['; '.join(map(str, cut_sites)) for cut_sites in cut_locations]
+
+def make_enzyme_table(enzyme_dict, rb, join_locations = False):
+    """
+    Build the restriction enzyme dataframe for {enzyme_name : [cut sites]} column by column.
+    Cut_Locations is kept as a list of cut sites unless join_locations is True, 
+    when it is the '; ' separated string
+    """
+    import numpy
+    import pandas
+    from plasmidin.enzyme_snapshot import enzyme_snapshot
+    enzyme_names = list(enzyme_dict.keys())
+    cut_locations = [list(cut_sites) for cut_sites in enzyme_dict.values()]
+    snapshot = enzyme_snapshot(rb)
+    n_enzymes = len(enzyme_names)
+
+    if join_locations:
+        cut_locations = cut_locations_to_string(cut_locations)
+    #Can add to the columns if something would be useful
+    columns = {
+        'Name' : enzyme_names,
+        'N_sites' : numpy.fromiter((len(cut_sites) for cut_sites in enzyme_dict.values()), dtype = numpy.int64, count = n_enzymes),
+        'Cut_Locations' : pandas.Series(cut_locations, dtype = object),
+        'Cut_type' : pandas.Categorical(snapshot.overhangs(enzyme_names)),
+        'CommerciallyAvailable' : snapshot.is_commercial(enzyme_names),
+        'Suppliers' : pandas.Categorical(['; '.join(suppliers) for suppliers in snapshot.supplier_lists(enzyme_names)]),
+    }
+
+    return pandas.DataFrame(columns, columns = ENZYME_TABLE_COLUMNS)
+
+def remove_ambiguous_enzymes(rb):
+    """Return a new RestrictionBatch without the ambiguous cut enzymes in rb"""
+    from Bio.Restriction import RestrictionBatch
+    from plasmidin.enzyme_snapshot import enzyme_snapshot
+    enzymes = list(rb)
+    ambiguous = enzyme_snapshot(rb).is_ambiguous(enzymes).tolist()
+    new_rb = RestrictionBatch([enzyme for enzyme, is_ambiguous in zip(enzymes, ambiguous) if not is_ambiguous])
+    
+    return new_rb
+
+def enzyme_cut_locs(cut_sites: dict, enzymes):
+    """
+    Return the (lhs, rhs) cut locations of a pair of enzymes from {enzyme : [cut sites]}.
+    The same enzyme twice uses its first two cut sites if it has more than one
+    """
+    lhs_sites = cut_sites[enzymes[0]]
+    if enzymes[0] == enzymes[1] and len(lhs_sites) > 1:
+        return lhs_sites[0], lhs_sites[1]
+    return lhs_sites[0], cut_sites[enzymes[1]][0]
+
+def read_fasta_seq(fasta_file):
+    """
+    Return the sequence of a single record fasta file as a Seq, the same as Bio.SeqIO.read(fasta_file, 'fasta').seq
+    (text before the first record is skipped, whitespace is removed) without importing Bio.SeqIO and its file formats
+    """
+    seq_lines = []
+    n_records = 0
+    with open(fasta_file) as fasta:
+        for line in fasta:
+            if line.startswith('>'):
+                n_records += 1
+                if n_records > 1:
+                    raise ValueError('More than one record found in handle')
+            elif n_records:
+                seq_lines.append(line.rstrip())
+    if not n_records:
+        raise ValueError('No records found in handle')
+    return Seq(''.join(seq_lines).replace(' ', '').replace('\r', ''))
+
 def parse_input_seq(input_seq):
-    """Determine whether an input seq is a fasta file or Seq object"""
-    if isinstance(input_seq, Seq):
+    """Determine whether an input seq is a fasta file, a packed sequence file (see plasmidin.packed.pack_seq), Seq, CompositeSeq or PackedSeq object"""
+    from plasmidin.composite import CompositeSeq
+    from plasmidin.packed import PackedSeq, is_packed_file
+    if isinstance(input_seq, (Seq, CompositeSeq, PackedSeq)):
         return input_seq
     elif path.isfile(input_seq):
-        return SeqIO.read(input_seq, 'fasta').seq
+        if is_packed_file(input_seq):
+            return PackedSeq.open(input_seq)
+        return read_fasta_seq(input_seq)
     else:
         raise TypeError(f'input_seq is not a Seq or valid fasta file')
 
@@ -77,24 +168,39 @@ class RSFinder():
     """
     A class to find restriction enzyme sites within an input sequence
     """
-    def __init__(self, input_seq, linear: bool, rb = RestrictionBatch(CommOnly), remove_ambiguous = True):
+    @profiled()
+    def __init__(self, input_seq, linear: bool, rb = None, remove_ambiguous = True, scanner = None, join_cut_locations = False, lazy = False, cache = None):
         """
-        input_seq - a Bio.Seq.Seq object
+        input_seq - a Bio.Seq.Seq object, a plasmidin.composite.CompositeSeq, a plasmidin.packed.PackedSeq
+        or a fasta or packed sequence file
         linear_seq - boolean for whether the sequence is treated as linear or circular
-        rb - the Bio.Restriction.RestrictionBatch to use. Defaults to commercially availably restriction enzymes
+        rb - the Bio.Restriction.RestrictionBatch to use. Defaults to commercially availably restriction enzymes (see default_batch)
         remove_ambiguous - whether to remove the restriction enzymes with ambiguous cut sites from self.rb
+        scanner - the site scanning engine, a name from plasmidin.site_scanner.SCANNERS ('kmer' or 'biopython') 
+        or a scanner object. Defaults to the k-mer index scanner
+        join_cut_locations - whether the enzyme tables hold Cut_Locations as '; ' separated strings rather than lists
+        lazy - if True the analysis, cut site dicts and enzyme table are only made (and then kept) when first used.
+        If False they are all made here
+        cache - a plasmidin.cache.ResultCache, or a cache file or directory, to load the cut sites from
+        (and store them in) so the same sequence and RestrictionBatch is only searched once
         """
+        from plasmidin.cache import get_cache
+        from plasmidin.site_scanner import get_scanner
         self._input_seq = parse_input_seq(input_seq)
+        self._seq = None
         self._linear = linear 
-        self._rb = rb
+        self._rb = default_batch() if rb is None else rb
         self._remove_ambiguous = remove_ambiguous
+        self._scanner = get_scanner(scanner)
+        self._join_cut_locations = join_cut_locations
+        self._lazy = lazy
+        self._cache = get_cache(cache)
         if remove_ambiguous:
             self._remove_ambiguous_enzymes()
         
-        self._analysis = self.restriction_site_analysis()
-        self._single_cut_enzymes = self.single_cut_site()
-        self._all_cut_enzymes = self.any_cut_sites()
-        self._enzyme_table = self.create_restriction_enzyme_table()
+        self._clear_results()
+        if not lazy:
+            self._make_results()
 
         self._supplier_names = set()
         self._supplier_codes = set()
@@ -124,7 +230,20 @@ class RSFinder():
 
     @property
     def input_seq(self):
-        """Returns the DNA sequence of RSFinder"""
+        """
+        Returns the DNA sequence of RSFinder as a Bio.Seq.Seq, or the PackedSeq given.
+        A CompositeSeq (as RSInserter.integrate_seq makes) is copied into a Seq the first time it is asked for
+        """
+        from plasmidin.composite import CompositeSeq
+        if isinstance(self._input_seq, CompositeSeq):
+            if self._seq is None:
+                self._seq = self._input_seq.to_seq()
+            return self._seq
+        return self._input_seq
+
+    @property
+    def seq_view(self):
+        """Returns the sequence as given, which for an integrated sequence is a CompositeSeq sharing the backbone and insert bases"""
         return self._input_seq
     
     @property
@@ -144,8 +263,10 @@ class RSFinder():
     
     @rb.setter
     def rb(self, rb):
+        from Bio.Restriction import RestrictionBatch
         if isinstance(rb, RestrictionBatch):
             self._rb = rb
+            self.invalidate()
         else:
             raise ValueError(f'rb is not a Bio.Restriction.RestrictionBatch object so not updating')
     
@@ -154,23 +275,65 @@ class RSFinder():
         """Returns a boolean to whether ambiguous cut sites have been removed from the RestrictionBatch"""
         return self._remove_ambiguous
     
+    @property
+    def scanner(self):
+        """Returns the scanning engine used to find the restriction sites"""
+        return self._scanner
+
+    @property
+    def join_cut_locations(self):
+        """Returns a boolean to whether enzyme tables hold Cut_Locations as '; ' separated strings"""
+        return self._join_cut_locations
+
+    @property
+    def lazy(self):
+        """Returns a boolean to whether the results are only made when first used"""
+        return self._lazy
+
+    @property
+    def cache(self):
+        """Returns the ResultCache the cut sites are loaded from, or None"""
+        return self._cache
+
+    @property
+    def cut_store(self):
+        """Returns the CutSiteStore holding the cut sites of every enzyme in RSFinder.rb"""
+        if self._cut_store is None:
+            from plasmidin.cut_sites import CutSiteStore
+            self._cut_store = CutSiteStore.from_mapping(self.search_cut_sites())
+        return self._cut_store
+
     @property
     def analysis(self):
         """Returns the analysis object that contains the restirction cut enzymes and sites for the DNA sequence"""
+        if self._analysis is None:
+            self._analysis = self.restriction_site_analysis()
         return self._analysis
     
     @property
     def single_cut_enzymes(self):
+        if self._single_cut_enzymes is None:
+            self._single_cut_enzymes = self.single_cut_site()
         return self._single_cut_enzymes
     
     @property
     def all_cut_enzymes(self):
+        if self._all_cut_enzymes is None:
+            self._all_cut_enzymes = self.any_cut_sites()
         return self._all_cut_enzymes
     
     @property
     def enzyme_table(self):
+        if self._enzyme_table is None:
+            self._enzyme_table = self.create_restriction_enzyme_table()
         return self._enzyme_table
     
+    @property
+    def supplier_index(self):
+        """Returns the SupplierIndex of RSFinder.rb, shared by every RSFinder with the same batch"""
+        from plasmidin.suppliers import supplier_index
+        return supplier_index(self.rb)
+
     @property
     def supplier_filtered(self):
         if self._supplier_filtered is None:
@@ -191,55 +354,83 @@ class RSFinder():
     
     @property
     def feature_info(self):
-        if self._feature_info is list():
+        if self._feature_info is None:
             print('feature_info has not been created yet. Use RSFinder.create_enzyme_records() to create')
         return self._feature_info
 
+    @profiled()
     def _remove_ambiguous_enzymes(self):
         """Removes the ambiguous cut enzymes from the RestritionBatch"""
-        old_rb = self.rb
-        new_rb = RestrictionBatch()
-        for element in old_rb.elements():
-            enzyme = AllEnzymes.get(element)
-            if not enzyme.is_ambiguous():
-                new_rb.add(enzyme)
-        
-        self._rb = new_rb
+        self._rb = remove_ambiguous_enzymes(self.rb)
     
+    @classmethod
+    def batch(cls, records, linear: bool, **kwargs):
+        """
+        Scan every record of a multi-fasta path or iterable of records across worker processes.
+        Yields plasmidin.batch.RecordScan results as they finish, see plasmidin.batch.scan_many
+        """
+        from plasmidin.batch import scan_many #avoids a circular import
+        return scan_many(records, linear, **kwargs)
+
+    def _clear_results(self):
+        """Set every memoized result to None so it is remade when next used"""
+        self._cut_store = None
+        self._analysis = None
+        self._single_cut_enzymes = None
+        self._all_cut_enzymes = None
+        self._enzyme_table = None
+
+    def _make_results(self):
+        """Make the cut site store, cut site dicts and enzyme table now. RSFinder.analysis is made from the store when used"""
+        self.cut_store
+        self.single_cut_enzymes
+        self.all_cut_enzymes
+        self.enzyme_table
+
+    def invalidate(self):
+        """
+        Drop the cut site store, analysis, cut site dicts and enzyme table so they are remade from the current RSFinder.rb.
+        Called whenever RSFinder.rb is changed
+        """
+        self._clear_results()
+
     def change_rb(self, rb, update = True):
         """
         Change the RestrictionBatch held within RSFinder and update RSFinder._analysis,
-        RSFinder._single_cut_enzymes and RSFinder.all_cut_enzymes
+        RSFinder._single_cut_enzymes and RSFinder.all_cut_enzymes.
+        With update = False (or a lazy RSFinder) these are remade when next used
         """
         self.rb = rb
         if update:
-            input_seq = self.input_seq
+            input_seq = self.seq_view
             linear = self.linear
             rb = self.rb
-            self.__init__(input_seq, linear, rb)
+            self.__init__(input_seq, linear, rb, scanner = self.scanner, join_cut_locations = self.join_cut_locations, lazy = self.lazy, cache = self.cache)
+
+    @profiled()
+    def search_cut_sites(self):
+        """
+        Return {enzyme : [cut sites]} for every enzyme in self.rb, searching self.input_seq with self.scanner. Enzymes already 
+        searched in this sequence are taken from the process wide site cache and then self.cache (see plasmidin.cache)
+        """
+        from plasmidin.cache import cached_search
+        return cached_search(self.scanner, self.rb, self.seq_view, self.linear, self.cache)
 
+    @profiled()
     def restriction_site_analysis(self):
-        """Run the Bio.Restriction.Analysis on self.input_seq"""
+        """Return the Bio.Restriction.Analysis of self.input_seq, made from RSFinder.cut_store"""
+        from plasmidin.site_scanner import analysis_from_mapping
         rb = self.rb
-        input_seq = self.input_seq
-        linear = self.linear
-
-        return Analysis(rb, input_seq, linear)
+        mapping = self.cut_store.mapping(rb)
+        return analysis_from_mapping(rb, self.seq_view, self.linear, mapping)
     
     def any_cut_sites(self):
         """Return the enzymes with any number of cuts in the input_seq"""
-        any_cut_enzymes = self._analysis.with_sites()
-        new_all_cut_enzymes = enzyme_dict_to_string(any_cut_enzymes)
-
-        return new_all_cut_enzymes
+        return self.cut_store.to_dict()
     
     def n_cut_sites(self, n_sites):
         """Return the ezymes with n_sites number of cuts in the input_seq"""
-        analysis = self._analysis
-        n_cut_enzymes = analysis.with_N_sites(n_sites)
-        new_n_cut_enzymes = enzyme_dict_to_string(n_cut_enzymes)
-        
-        return new_n_cut_enzymes
+        return self.cut_store.to_dict(n_sites)
 
     def single_cut_site(self):
         """Return enzymes with a single cut site"""
@@ -247,7 +438,7 @@ class RSFinder():
     
     def enzyme_cut_sites(self, restriction_enzyme):
         """Return the cut sites for the enzyme specified"""
-        all_cut_enzymes = self._all_cut_enzymes
+        all_cut_enzymes = self.all_cut_enzymes
         try:
             return all_cut_enzymes[restriction_enzyme]
         except KeyError:
@@ -273,12 +464,12 @@ class RSFinder():
 
         restriction_enzymes can be any iterable
         """
-        cut_enzymes = self._select_enzymes(n_cut_sites)
+        restriction_enzymes = list(restriction_enzymes)
+        selected = self.cut_store.select(restriction_enzymes, n_cut_sites)
         filtered_enzymes = {}
         for restriction_enzyme in restriction_enzymes:
             try:
-                cut_sites = cut_enzymes[restriction_enzyme]
-                filtered_enzymes[restriction_enzyme] = cut_sites
+                filtered_enzymes[restriction_enzyme] = selected[restriction_enzyme]
             except KeyError:
                 print(f'Could not find {restriction_enzyme} in dictionary. Skipping {restriction_enzyme}')
 
@@ -292,47 +483,75 @@ class RSFinder():
         if not isinstance(rsfinder, RSFinder):
             raise TypeError(f'rsfinder is not an RSFinder class')
         
-        internal_enzymes = self._select_enzymes(internal_n_cut_sites)
-        external_enzymes = rsfinder._select_enzymes(external_n_cut_sites)
+        internal_enzymes = self.cut_store.enzymes(internal_n_cut_sites)
+        external_enzymes = rsfinder.cut_store.enzymes(external_n_cut_sites)
 
-        shared_enzymes = set(internal_enzymes.keys()) & set(external_enzymes.keys())
+        shared_enzymes = set(internal_enzymes) & set(external_enzymes)
 
         return shared_enzymes
-    
-    def _make_table(self, enzyme_dict):
-        """Extract useful information from the restriction enzymes in enzyme_dict and turn into a dataframe"""
-        data = []
-        for enzyme_name, values in enzyme_dict.items():
-            enzyme = self.rb.get(enzyme_name)
-            n_sites = len(values)
-            cut_locations = values
-            #Can add to the dictionary if something would be useful
-            data.append({
-                'Name' : enzyme_name,
-                'N_sites' : n_sites,
-                'Cut_Locations' : '; '.join(map(str,cut_locations)),
-                'Cut_type' : enzyme.overhang(),
-                'CommerciallyAvailable' : enzyme.is_comm(),
-                'Suppliers' : '; '.join(enzyme.supplier_list()),
-            }
-            )
 
-        enzyme_df = pandas.DataFrame(columns = data[0].keys())
-        for row in data:
-            enzyme_df = enzyme_df._append(row, ignore_index = True)
-        
-        return enzyme_df
+    def enzymes_cutting_in(self, start, end):
+        """
+        Return {restriction_enzyme : cut_sites} for the enzymes that cut between start and end, [start, end).
+        On a circular sequence a region with end before start wraps past the origin
+        """
+        return self.cut_store.cutting_in(start, end, len(self.seq_view), self.linear)
 
+    def enzymes_not_cutting_in(self, start, end, n_cut_sites = None):
+        """
+        Return {restriction_enzyme : cut_sites} for the enzymes that cut the sequence but not in [start, end),
+        e.g. to keep an ORF intact. Use n_cut_sites to limit to specified number of cut sites
+        """
+        return self.cut_store.not_cutting_in(start, end, len(self.seq_view), self.linear, n_cut_sites)
+
+    def nearest_cut_sites(self, position, k = 1):
+        """
+        Return the k cut sites nearest position as a list of (restriction_enzyme, cut_site, distance).
+        Distances on a circular sequence are measured either way round the origin
+        """
+        return self.cut_store.nearest(position, len(self.seq_view), self.linear, k)
 
-    def create_restriction_enzyme_table(self, n_cut_sites = None):
+    def digest(self, restriction_enzymes):
+        """
+        Return the fragments of a digest with every enzyme in restriction_enzymes as a list of
+        plasmidin.digest.Fragment(start, end, length), found from the cut sites without slicing the sequence
+        """
+        cut_store = self.cut_store
+        cut_sites = []
+        for restriction_enzyme in restriction_enzymes:
+            if restriction_enzyme in cut_store:
+                cut_sites.extend(cut_store.cut_sites(restriction_enzyme))
+            else:
+                print(f'Could not find {restriction_enzyme} in dictionary. Skipping {restriction_enzyme}')
+        from plasmidin.digest import digest_fragments
+        return digest_fragments(cut_sites, len(self.seq_view), self.linear)
+
+    def digest_table(self, max_cut_sites = 2, double_digests = True):
+        """
+        Return a table of the fragment sizes of every single digest, and every double digest if double_digests,
+        with the enzymes cutting 1 to max_cut_sites times. See plasmidin.digest.digest_table
+        """
+        from plasmidin.digest import digest_table
+        return digest_table(self.cut_store, len(self.seq_view), self.linear, max_cut_sites, double_digests)
+    
+    @profiled()
+    def _make_table(self, enzyme_dict, join_cut_locations = None):
+        """Extract useful information from the restriction enzymes in enzyme_dict and turn into a dataframe"""
+        if join_cut_locations is None:
+            join_cut_locations = self.join_cut_locations
+        return make_enzyme_table(enzyme_dict, self.rb, join_cut_locations)
+
+    def create_restriction_enzyme_table(self, n_cut_sites = None, join_cut_locations = None):
         """Take an Analysis object and create a table containing information on the Restriction Sites"""
         cut_enzymes = self._select_enzymes(n_cut_sites)
-        enzyme_df = self._make_table(cut_enzymes)
+        enzyme_df = self._make_table(cut_enzymes, join_cut_locations)
         
         return enzyme_df
     
     def _save_table(self, df, table_out, delimiter = '\t'):
-        """Saves a dataframe (df) to a file"""
+        """Saves a dataframe (df) to a file. List Cut_Locations are written '; ' separated"""
+        if not df.empty and not isinstance(df['Cut_Locations'].iloc[0], str):
+            df = df.assign(Cut_Locations = cut_locations_to_string(df['Cut_Locations']))
         df.to_csv(table_out, sep = delimiter, index = False)
     
     def save_enzyme_table(self, table_out, delimiter = '\t'):
@@ -348,7 +567,8 @@ class RSFinder():
         else:
             raise TypeError(f'There is no RSFinder.supplier_table present. Make one with RSFinder.filter_supplier')
 
-    def filter_supplier(self, supplier_codes, n_cut_sites = None):
+    @profiled()
+    def filter_supplier(self, supplier_codes, n_cut_sites = None, require_all = False):
         """
         Select from a supplier code from below to filter(s) out enzyme that are present:
 
@@ -369,79 +589,88 @@ class RSFinder():
         'Y': 'SinaClon BioScience Co.'
 
         n_cut_sites can be None or an integer to select enzymes with specific number of cut sites
+        require_all - keep the enzymes sold by every supplier in supplier_codes rather than by any of them
+
+        The supplier table is selected from RSFinder.enzyme_table with RSFinder.supplier_index rather than rebuilt
         """
-        cut_enzymes = self._select_enzymes(n_cut_sites)
-        supplier_filtered = {}
+        enzyme_table = self.enzyme_table
+        keep = self.supplier_index.match(supplier_codes, require_all, enzyme_table['Name'])
+        if n_cut_sites is not None:
+            keep &= (enzyme_table['N_sites'] == n_cut_sites).to_numpy()
+        supplier_table = enzyme_table[keep].reset_index(drop = True)
+        supplier_table = supplier_table.assign(**{
+            column : supplier_table[column].cat.remove_unused_categories() for column in ('Cut_type', 'Suppliers')
+            })
+
+        all_cut_enzymes = self.all_cut_enzymes
+        supplier_filtered = {enzyme_name : all_cut_enzymes[enzyme_name] for enzyme_name in supplier_table['Name']}
         
-        for enzyme_name, values in cut_enzymes.items():
-            enzyme_suppliers = set(self.rb.get(enzyme_name).suppl)
-            retain_codes = set(supplier_codes)
-            intersection = enzyme_suppliers.intersection(retain_codes)
-            if len(intersection) > 0:
-                supplier_filtered[enzyme_name] = values
-        
-        self._supplier_table = self._make_table(supplier_filtered)
+        self._supplier_table = supplier_table
         self._supplier_filtered = supplier_filtered
         self._supplier_names = {self._supplier_codes_dict[code] for code in supplier_codes}
         self._supplier_codes = set(supplier_codes)
 
         return supplier_filtered
     
+    @profiled()
     def create_enzyme_records(self, max_n_cut_sites = 2):
         """
-        Creates enzymes records for up to max_n_cut_sites to be used to plot as a GenomeDiagram
-        """
-        feature_dict = {}
-        for n_cuts in range(1, max_n_cut_sites + 1):
-            enzyme_cuts = self.n_cut_sites(n_cuts)
-            for enzyme_name, cut_sites in enzyme_cuts.items():
-                # print(enzyme_name)
-                info = {
-                    'feature_name' : enzyme_name,
-                    'sigil' : 'BOX',
-                    'color' : colors.black,
-                    'label' : True,
-                    'label_size' : 8,
-                    'label_angle' : 45
-                }
-                for cut_site in cut_sites:
-                    feature_dict = search_update_feature_info(feature_dict, cut_site, info)
-
-        self._feature_info = feature_dict
-                
-def search_update_feature_info(feature_dict, cut_site, info):
-    feature_info = feature_dict.get(cut_site)
-    if feature_info is not None:
-        seq_feature, old_info = feature_info
-        old_feature_name = old_info.get('feature_name')
-        feature_name = info.get('feature_name')
-        new_feature_name = f'{old_feature_name}, {feature_name}'
-        info['feature_name'] = new_feature_name
-    else:
-        seq_feature = SeqFeature(SimpleLocation(cut_site, cut_site+1))
-    
-    feature_dict[cut_site] = seq_feature, info
-
-    return feature_dict
-
+        Creates enzymes records for up to max_n_cut_sites to be used to plot as a GenomeDiagram.
+        feature_info is set to FeatureRecords with one feature per cut site, named by every enzyme cutting there
+        """
+        from plasmidin.features import FeatureRecords
+        self._feature_info = FeatureRecords.from_cut_store(self.cut_store, max_n_cut_sites)
 
 class RSInserter():
     """A class to insert a sequence into another with restriction sites"""
 
-    def __init__(self, backbone_seq, insert_seq, backbone_linear = False, insert_linear = True, rb = RestrictionBatch(CommOnly), remove_ambiguous = True):
+    @profiled()
+    def __init__(self, backbone_seq, insert_seq, backbone_linear = False, insert_linear = True, rb = None, remove_ambiguous = True, scanner = None, lazy = False, cache = None):
+        """
+        lazy - if True the RSFinders and the shared enzyme dicts are only made when first used
+        cache - a ResultCache, or cache file or directory, used by the backbone and insert RSFinders
+        """
+        from plasmidin.cache import get_cache
+        from plasmidin.site_scanner import get_scanner
+        if rb is None:
+            rb = default_batch()
         self._rb = rb
-        self._backbone_rsfinder = RSFinder(backbone_seq, backbone_linear, rb, remove_ambiguous)
-        self._insert_rsfinder = RSFinder(insert_seq, insert_linear, rb, remove_ambiguous)
+        self._scanner = get_scanner(scanner)
+        self._lazy = lazy
+        self._cache = get_cache(cache)
+        self._backbone_rsfinder = RSFinder(backbone_seq, backbone_linear, rb, remove_ambiguous, self._scanner, lazy = lazy, cache = self._cache)
+        self._insert_rsfinder = RSFinder(insert_seq, insert_linear, rb, remove_ambiguous, self._scanner, lazy = lazy, cache = self._cache)
         self._integrated_rsfinder = None
         self._additional_integrated_rsfinder = None
 
-        self._shared_single_enzymes, self._backbone_single_cut_sites, self._insert_single_cut_sites = self._shared_enzymes(backbone_n_cut_sites=1, insert_n_cut_sites=1)
-        self._shared_any_enzymes, self._backbone_any_cut_sites, self._insert_any_cut_sites = self._shared_enzymes(backbone_n_cut_sites=None, insert_n_cut_sites=None)
+        self._shared_single = None
+        self._shared_any = None
+        if not lazy:
+            self._shared_single = self._shared_enzymes(backbone_n_cut_sites=1, insert_n_cut_sites=1)
+            self._shared_any = self._shared_enzymes(backbone_n_cut_sites=None, insert_n_cut_sites=None)
 
     @property
     def rb(self):
         return self._rb
     
+    @property
+    def scanner(self):
+        return self._scanner
+
+    @property
+    def lazy(self):
+        return self._lazy
+
+    @property
+    def cache(self):
+        return self._cache
+
+    @property
+    def compatibility_index(self):
+        """Returns the CompatibilityIndex for RSInserter.rb, shared by every RSInserter with the same batch"""
+        from plasmidin.compatibility import compatibility_index
+        return compatibility_index(self.rb)
+
     @property
     def backbone_rsfinder(self):
         return self._backbone_rsfinder
@@ -450,29 +679,43 @@ class RSInserter():
     def insert_rsfinder(self):
         return self._insert_rsfinder
     
+    @property
+    def shared_single(self):
+        """Returns (shared_single_enzymes, backbone_single_cut_sites, insert_single_cut_sites)"""
+        if self._shared_single is None:
+            self._shared_single = self._shared_enzymes(backbone_n_cut_sites=1, insert_n_cut_sites=1)
+        return self._shared_single
+
+    @property
+    def shared_any(self):
+        """Returns (shared_any_enzymes, backbone_any_cut_sites, insert_any_cut_sites)"""
+        if self._shared_any is None:
+            self._shared_any = self._shared_enzymes(backbone_n_cut_sites=None, insert_n_cut_sites=None)
+        return self._shared_any
+
     @property
     def shared_single_enzymes(self):
-        return self._shared_single_enzymes
+        return self.shared_single[0]
     
     @property
     def backbone_single_cut_sites(self):
-        return self._backbone_single_cut_sites
+        return self.shared_single[1]
     
     @property
     def insert_single_cut_sites(self):
-        return self._insert_single_cut_sites
+        return self.shared_single[2]
     
     @property
     def shared_any_enzymes(self):
-        return self._shared_any_enzymes
+        return self.shared_any[0]
 
     @property
     def backbone_any_cut_sites(self):
-        return self._backbone_any_cut_sites
+        return self.shared_any[1]
     
     @property
     def insert_any_cut_sites(self):
-        return self._insert_any_cut_sites
+        return self.shared_any[2]
     
     @property
     def integrated_rsfinder(self):
@@ -493,6 +736,7 @@ class RSInserter():
         shared_cut_sites = return_shared_dict(cut_enzymes, shared_enzymes)
         return shared_cut_sites
 
+    @profiled()
     def _shared_enzymes(self, backbone_n_cut_sites = 1, insert_n_cut_sites = 1):
         """
         Return infomation on the shared enzymes with specified cut sites. Default is a single cut site
@@ -513,8 +757,69 @@ class RSInserter():
             reverse_seq = True
         return (seq[:lhs_loc-1], seq[lhs_loc-1:rhs_loc-1], seq[rhs_loc-1:]), reverse_seq #because python
         
-    def integrate_seq(self, backbone_enzymes, insert_enzymes, backbone_n_cut_sites = 1, insert_n_cut_sites = 1):
-        shared_enzymes, backbone_shared_cut_sites, insert_shared_cut_sites = self._shared_enzymes(backbone_n_cut_sites, insert_n_cut_sites)
+    @profiled()
+    def enumerate_strategies(self, single_enzyme = True):
+        """
+        Return a table of every valid (backbone_enzymes, insert_enzymes) pair that RSInserter.integrate_seq 
+        accepts, ranked directional first, then by the number of suppliers selling every enzyme, then by fragment size.
+        single_enzyme - include a backbone single cutter with a compatible insert double cutter (ambiguous orientation).
+        See plasmidin.strategies.enumerate_strategies
+        """
+        from plasmidin.strategies import enumerate_strategies
+        return enumerate_strategies(self, single_enzyme)
+
+    @profiled()
+    def diagnostic_digests(self, k = 10, max_cut_sites = 2, double_digests = True, resolution = None):
+        """
+        Return the top k single and double digests whose gel bands tell RSInserter.integrated_rsfinder
+        from RSInserter.additional_integrated_rsfinder (if made) and the empty backbone.
+        resolution - the smallest log10 size difference of two bands told apart, defaults to plasmidin.gel.DEFAULT_RESOLUTION.
+        See plasmidin.gel.diagnostic_digests
+        """
+        from plasmidin.gel import DEFAULT_RESOLUTION, diagnostic_digests
+        if self._integrated_rsfinder is None:
+            raise ValueError('RSInserter.integrated_rsfinder has not been set yet. Use RSInserter.integrate_seq() first')
+        if resolution is None:
+            resolution = DEFAULT_RESOLUTION
+        return diagnostic_digests(
+            self._integrated_rsfinder, self.backbone_rsfinder, self._additional_integrated_rsfinder, k, max_cut_sites, double_digests, resolution
+            )
+
+    @profiled()
+    def _splice_rsfinder(self, lhs_backbone_seq, middle_insert_seq, rhs_backbone_seq, backbone_locs, insert_locs, reverse_insert):
+        """
+        Make the RSFinder of the integrated sequence, copying the cut sites away from the ligation points 
+        from the backbone and insert RSFinders so only the junctions are rescanned (see plasmidin.splicing)
+        """
+        from plasmidin.splicing import SplicePiece, SpliceScanner
+        integrated_seq = lhs_backbone_seq + middle_insert_seq + rhs_backbone_seq
+        backbone_rsfinder = self.backbone_rsfinder
+        insert_rsfinder = self.insert_rsfinder
+        backbone_searched = {str(enzyme) for enzyme in backbone_rsfinder.rb}
+        insert_searched = {str(enzyme) for enzyme in insert_rsfinder.rb}
+
+        lhs_length = len(lhs_backbone_seq)
+        middle_length = len(middle_insert_seq)
+        pieces = [SplicePiece(backbone_rsfinder.cut_store, backbone_searched, 1, 1, lhs_length)]
+        if not reverse_insert: #a reversed insert shares no sites with the insert so is rescanned
+            pieces.append(SplicePiece(insert_rsfinder.cut_store, insert_searched, min(insert_locs), lhs_length + 1, middle_length))
+        pieces.append(SplicePiece(backbone_rsfinder.cut_store, backbone_searched, max(backbone_locs), lhs_length + middle_length + 1, len(rhs_backbone_seq)))
+
+        scanner = SpliceScanner(integrated_seq, pieces, self.scanner)
+        return RSFinder(integrated_seq, backbone_rsfinder.linear, self.rb, scanner = scanner, lazy = self.lazy)
+
+    @profiled()
+    def integrate_seq(self, backbone_enzymes, insert_enzymes, backbone_n_cut_sites = 1, insert_n_cut_sites = 1, incremental = True):
+        """
+        Integrate the insert into the backbone, cutting each with the enzymes given in (5' cut, 3' cut) order.
+        The enzymes must cut backbone_n_cut_sites/insert_n_cut_sites times and the backbone and insert 
+        enzymes must have compatible ends. The same enzyme given twice cuts at its first two sites.
+        incremental - reuse the backbone and insert cut sites and only rescan around the ligation points.
+        If False the integrated sequences are searched in full
+        """
+        from plasmidin.composite import CompositeSeq
+        backbone_cut_sites = self.backbone_rsfinder._select_enzymes(backbone_n_cut_sites)
+        insert_cut_sites = self.insert_rsfinder._select_enzymes(insert_n_cut_sites)
 
         backbone_ambiguous, enzyme = ambiguous_cut(backbone_enzymes)
         if backbone_ambiguous:
@@ -523,13 +828,14 @@ class RSInserter():
         if insert_ambiguous:
             raise AmbiguousCutError(enzyme)
         
-        backbone_seq = self.backbone_rsfinder.input_seq
+        #Views of the backbone and insert bases, so cutting and joining copies no sequence
+        backbone_seq = CompositeSeq.from_seq(self.backbone_rsfinder.seq_view)
         try:
-            backbone_locs = backbone_shared_cut_sites[backbone_enzymes[0]][0], backbone_shared_cut_sites[backbone_enzymes[1]][0]
+            backbone_locs = enzyme_cut_locs(backbone_cut_sites, backbone_enzymes)
         except KeyError:
             raise KeyError('The enzymes(s) selected are not found with a single cut site. Review the self.shared_single_enzymes and select again')
         
-        insert_seq = self.insert_rsfinder.input_seq
+        insert_seq = CompositeSeq.from_seq(self.insert_rsfinder.seq_view)
         try:
             if insert_enzymes[0] == insert_enzymes[1]: #Allow cutting of the same enzyme twice
                 ambiguous_insert = True
@@ -538,7 +844,7 @@ class RSInserter():
                 print('Warning: Cutting the insert with a single restriction enzyme so oritentation will be ambiguous!')
             else: #double cut within both
                 ambiguous_insert = False
-            insert_locs = insert_shared_cut_sites[insert_enzymes[0]][0], insert_shared_cut_sites[insert_enzymes[1]][0]
+            insert_locs = enzyme_cut_locs(insert_cut_sites, insert_enzymes)
         except KeyError:
             raise KeyError('The enzymes(s) selected are not compatible, incorrect cut sites to know integration unambiguously. Review the enzymes and select again')
 
@@ -550,7 +856,7 @@ class RSInserter():
         if insert_reverse_enzymes:
             insert_enzymes = [i for i in reversed(insert_enzymes)]
 
-        compatible_ends, reverse_seq, ambiguous_insert = compatible_enzymes_matrix(backbone_enzymes, insert_enzymes)
+        compatible_ends, reverse_seq, ambiguous_insert = compatible_enzymes_matrix(backbone_enzymes, insert_enzymes, self.compatibility_index)
         # print(f'Compatible ends: {compatible_ends}')
         # print(f'Reverse Seq: {reverse_seq}')
         # print(f'Ambiguous insert: {ambiguous_insert}')
@@ -560,13 +866,21 @@ class RSInserter():
         if reverse_seq:
             middle_insert_seq = middle_insert_seq[::-1]
         #Need to include a second seq if the insert has been cut with a single enzyme!!!!
-        integrated_seq = lhs_backbone_seq + middle_insert_seq + rhs_backbone_seq
-        self._integrated_rsfinder = RSFinder(integrated_seq, self.backbone_rsfinder.linear, self.rb)
+        with stage('RSInserter.integrated_rsfinder'):
+            if incremental:
+                self._integrated_rsfinder = self._splice_rsfinder(lhs_backbone_seq, middle_insert_seq, rhs_backbone_seq, backbone_locs, insert_locs, reverse_seq)
+            else:
+                integrated_seq = lhs_backbone_seq + middle_insert_seq + rhs_backbone_seq
+                self._integrated_rsfinder = RSFinder(integrated_seq, self.backbone_rsfinder.linear, self.rb, scanner = self.scanner, lazy = self.lazy)
 
         # print(f'{ambiguous_insert} is ambiguous_insert')
         if ambiguous_insert:
-            integrated_seq_b = lhs_backbone_seq + middle_insert_seq[::-1] + rhs_backbone_seq
-            self._additional_integrated_rsfinder = RSFinder(integrated_seq_b, self.backbone_rsfinder.linear, self.rb)
+            with stage('RSInserter.additional_integrated_rsfinder'):
+                if incremental:
+                    self._additional_integrated_rsfinder = self._splice_rsfinder(lhs_backbone_seq, middle_insert_seq[::-1], rhs_backbone_seq, backbone_locs, insert_locs, not reverse_seq)
+                else:
+                    integrated_seq_b = lhs_backbone_seq + middle_insert_seq[::-1] + rhs_backbone_seq
+                    self._additional_integrated_rsfinder = RSFinder(integrated_seq_b, self.backbone_rsfinder.linear, self.rb, scanner = self.scanner, lazy = self.lazy)
 
 def cut_enzymes(seq: Seq, restriction_sites: dict, enzymes: tuple):
     """
@@ -0,0 +1,168 @@
+import json
+import os
+import sys
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+
+#A stage run: start is seconds from when the Profiler was started, self_duration excludes the stages run within it
+#and allocated_blocks is the change in the number of memory blocks Python holds (about the objects made and kept).
+#process is the pid of the process it ran in, None for stages recorded before it was kept
+Stage = namedtuple('Stage', ['name', 'start', 'duration', 'self_duration', 'allocated_blocks', 'depth', 'thread', 'process'], defaults = [None])
+
+#The Profiler recording stages, None when profiling is off
+_active = None
+_NULL_STAGE = nullcontext()
+
+class Profiler():
+    """
+    Record the wall time, calls and allocated blocks of every instrumented stage (see profiled and stage) run in this
+    process while it is started, either as a context manager or with Profiler.start() and Profiler.stop().
+    callback - called with each Stage as it finishes.
+    The stages can be summarised (Profiler.summary), exported as a dict or written as a Chrome trace
+    (chrome://tracing or https://ui.perfetto.dev)
+    """
+    def __init__(self, callback = None):
+        self._callback = callback
+        self._stages = []
+        self._origin = None
+        self._origin_time = None
+        self._previous = None
+        self._local = threading.local()
+
+    @property
+    def stages(self):
+        return list(self._stages)
+
+    @property
+    def origin_time(self):
+        """Returns the time.time() the Profiler was started at, which Stage.start is measured from"""
+        return self._origin_time
+
+    def start(self):
+        global _active
+        self._previous = _active
+        self._origin_time = time.time()
+        self._origin = time.perf_counter()
+        _active = self
+        return self
+
+    def stop(self):
+        global _active
+        _active = self._previous
+        self._previous = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    @contextmanager
+    def stage(self, name):
+        """Record the code run in the with block as the stage name"""
+        #The time spent in the stages run within each open stage of this thread
+        nested = getattr(self._local, 'nested', None)
+        if nested is None:
+            nested = self._local.nested = []
+        nested.append(0.0)
+        blocks = sys.getallocatedblocks()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            nested_duration = nested.pop()
+            if nested:
+                nested[-1] += duration
+            record = Stage(
+                name, start - self._origin, duration, duration - nested_duration,
+                sys.getallocatedblocks() - blocks, len(nested), threading.get_ident(), os.getpid()
+                )
+            self._add(record)
+
+    def _add(self, record):
+        self._stages.append(record)
+        if self._callback is not None:
+            self._callback(record)
+
+    def add_stages(self, stages, origin_time):
+        """
+        Add the stages another Profiler recorded, e.g. in a worker process, started at origin_time (its Profiler.origin_time).
+        Their starts are moved to be measured from when this Profiler was started and they keep their process and thread
+        """
+        offset = origin_time - self._origin_time
+        for record in stages:
+            self._add(record._replace(start = record.start + offset))
+
+    def summary(self):
+        """
+        Return {stage name : {calls, total_s, self_s, mean_s, max_s, allocated_blocks}}, slowest total first.
+        total_s includes the stages run within the stage, self_s does not
+        """
+        summary = {}
+        for record in self._stages:
+            totals = summary.setdefault(record.name, {'calls' : 0, 'total_s' : 0.0, 'self_s' : 0.0, 'max_s' : 0.0, 'allocated_blocks' : 0})
+            totals['calls'] += 1
+            totals['total_s'] += record.duration
+            totals['self_s'] += record.self_duration
+            totals['max_s'] = max(totals['max_s'], record.duration)
+            totals['allocated_blocks'] += record.allocated_blocks
+        for totals in summary.values():
+            totals['mean_s'] = totals['total_s'] / totals['calls']
+        return dict(sorted(summary.items(), key = lambda item: item[1]['total_s'], reverse = True))
+
+    def to_dict(self):
+        """Return the summary and every stage run as a dict that can be saved as json"""
+        return {'summary' : self.summary(), 'stages' : [record._asdict() for record in self._stages]}
+
+    def to_chrome_trace(self):
+        """Return the stages as a Chrome trace event dict, one complete event per stage run"""
+        pid = os.getpid()
+        events = [
+            {
+                'name' : record.name, 'cat' : record.name.split('.')[0], 'ph' : 'X', 'pid' : pid if record.process is None else record.process, 'tid' : record.thread,
+                'ts' : record.start * 1e6, 'dur' : record.duration * 1e6, 'args' : {'allocated_blocks' : record.allocated_blocks},
+            }
+            for record in self._stages
+            ]
+        return {'traceEvents' : events, 'displayTimeUnit' : 'ms'}
+
+    def save_chrome_trace(self, trace_file):
+        with open(trace_file, 'w') as handle:
+            json.dump(self.to_chrome_trace(), handle)
+
+    def report(self):
+        """Return the summary as a text table"""
+        lines = [f'{"Stage":<44} {"Calls":>6} {"Total s":>10} {"Self s":>10} {"Mean s":>10} {"Blocks":>10}']
+        for name, totals in self.summary().items():
+            lines.append(
+                f'{name:<44} {totals["calls"]:>6} {totals["total_s"]:>10.4f} {totals["self_s"]:>10.4f} {totals["mean_s"]:>10.4f} {totals["allocated_blocks"]:>10}'
+                )
+        return '\n'.join(lines)
+
+def active_profiler():
+    """Return the started Profiler recording stages in this process, or None"""
+    return _active
+
+def stage(name):
+    """Return a context manager recording its block as the stage name, doing nothing when no Profiler is started"""
+    if _active is None:
+        return _NULL_STAGE
+    return _active.stage(name)
+
+def profiled(name = None):
+    """Decorate a function so each call is recorded as a stage, named by its qualified name unless name is given"""
+    def decorate(func):
+        stage_name = name or func.__qualname__
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            profiler = _active
+            if profiler is None:
+                return func(*args, **kwargs)
+            with profiler.stage(stage_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
@@ -0,0 +1,89 @@
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from os import cpu_count, path
+
+from plasmidin.features import FeatureRecords
+from plasmidin.plasmid_diagrams import CLUSTER_THRESHOLD, DEFAULT_MAX_LABELS, DEFAULT_RESOLUTION, PlasmidDrawer, cluster_features, needs_clustering
+from plasmidin.profiling import Profiler, active_profiler
+
+#A map to draw. diagram_file defaults to {seq_id}_restriction_map.{filetype} in the output directory given to render_many
+RenderJob = namedtuple('RenderJob', ['seq', 'seq_id', 'feature_info', 'diagram_format', 'draw_settings', 'diagram_file'], defaults = [None])
+
+FILE_EXTENSIONS = {'PDF' : 'pdf', 'SVG' : 'svg', 'PNG' : 'png', 'JPG' : 'jpg', 'PS' : 'ps', 'EPS' : 'eps'}
+
+def _task(job, output_dir, filetype, resolution, max_labels, cluster_threshold):
+    """Turn a RenderJob into the plain data a worker draws it from, clustering the features here"""
+    features = FeatureRecords.from_features(job.feature_info)
+    seq_length = len(job.seq)
+    if needs_clustering(features, resolution, cluster_threshold):
+        features = cluster_features(features, seq_length, resolution, max_labels)
+    diagram_file = job.diagram_file
+    if diagram_file is None and output_dir is not None:
+        diagram_file = path.join(output_dir, f'{job.seq_id}_restriction_map.{FILE_EXTENSIONS.get(filetype.upper(), filetype.lower())}')
+    return seq_length, job.seq_id, features, job.diagram_format, dict(job.draw_settings), diagram_file, filetype
+
+def render_task(task, keep_drawing = False, profile = False):
+    """
+    Draw one map from _task data, writing it to its diagram_file if it has one.
+    Returns (diagram_file, Drawing or None, profile) where profile is None, or with profile = True the
+    (Profiler.origin_time, Stage records) of the drawing for Profiler.add_stages, as workers cannot record to the parent Profiler
+    """
+    seq_length, seq_id, features, diagram_format, draw_settings, diagram_file, filetype = task
+    profiler = Profiler().start() if profile else None
+    try:
+        plasmid_drawer = PlasmidDrawer(None, seq_id, features, resolution = None, max_labels = None, seq_length = seq_length)
+        drawing = plasmid_drawer.layout_gd_diagram(diagram_format, draw_settings)
+        if diagram_file is not None:
+            plasmid_drawer.gd_diagram.write(diagram_file, filetype)
+    finally:
+        if profiler is not None:
+            profiler.stop()
+    stages = None if profiler is None else (profiler.origin_time, profiler.stages)
+    return diagram_file, drawing if keep_drawing else None, stages
+
+def write_combined_pdf(drawings, pdf_file):
+    """Write reportlab Drawings to one PDF, a page per drawing sized to fit it"""
+    from reportlab.graphics import renderPDF
+    from reportlab.pdfgen import canvas
+    pdf = canvas.Canvas(pdf_file)
+    for drawing in drawings:
+        pdf.setPageSize((drawing.width, drawing.height))
+        renderPDF.draw(drawing, pdf, 0, 0)
+        pdf.showPage()
+    pdf.save()
+
+def render_many(jobs, output_dir = None, filetype = 'PDF', combined_pdf = None, workers = None, chunk_size = 4, resolution = DEFAULT_RESOLUTION, max_labels = DEFAULT_MAX_LABELS, cluster_threshold = CLUSTER_THRESHOLD):
+    """
+    Draw the map of every RenderJob (or (seq, seq_id, feature_info, diagram_format, draw_settings) tuple)
+    across worker processes and return the file each was written to, in the order of jobs.
+
+    output_dir - where the maps of jobs without a diagram_file are written. If None they are only drawn into combined_pdf
+    filetype - PDF, SVG or a bitmap format such as PNG (which needs the reportlab renderPM backend)
+    combined_pdf - a file to also write every map to as one multi-page PDF
+    workers - the number of worker processes. Defaults to the number of cpus, 1 draws in this process
+    resolution, max_labels, cluster_threshold - how and when the features are clustered before drawing (see plasmid_diagrams.PlasmidDrawer)
+
+    Features are clustered here and workers are sent only the sequence length and FeatureRecords.
+    While a Profiler is started the workers' drawing stages are added to it, with the worker pid and thread
+    """
+    if workers is None:
+        workers = cpu_count() or 1
+    tasks = [_task(RenderJob(*job), output_dir, filetype, resolution, max_labels, cluster_threshold) for job in jobs]
+    keep_drawing = combined_pdf is not None
+    profiler = active_profiler()
+
+    if workers == 1 or len(tasks) <= 1:
+        #Drawn in this process, so recorded by the started Profiler itself
+        results = [render_task(task, keep_drawing) for task in tasks]
+    else:
+        render = partial(render_task, keep_drawing = keep_drawing, profile = profiler is not None)
+        with ProcessPoolExecutor(min(workers, len(tasks))) as executor:
+            results = list(executor.map(render, tasks, chunksize = chunk_size))
+        if profiler is not None:
+            for _, _, (origin_time, stages) in results:
+                profiler.add_stages(stages, origin_time)
+
+    if combined_pdf is not None:
+        write_combined_pdf([drawing for _, drawing, _ in results], combined_pdf)
+    return [diagram_file for diagram_file, _, _ in results]
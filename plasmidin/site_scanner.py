@@ -0,0 +1,423 @@
+import re
+from functools import lru_cache
+
+import numpy
+from Bio.Restriction import Analysis
+from Bio.Restriction.Restriction import FormattedSeq
+from Bio.Seq import Seq
+
+from plasmidin.composite import CompositeSeq
+from plasmidin.packed import PackedSeq
+
+_COMPSITE_RE = re.compile(r'\(\?=\(\?P<\w+>([^)]*)\)\)(?:\|\(\?=\(\?P<\w+>([^)]*)\)\))?')
+_TOKEN_RE = re.compile(r'\[[^\]]*\]|.')
+_BASES = 'ACGT'
+
+def _token_table(token):
+    """Return a 256 long boolean lookup of the bytes matched by a single regex token"""
+    table = numpy.zeros(256, dtype = bool)
+    if token == '.':
+        table[:] = True
+        table[ord('\n')] = False #same as the re module
+    else:
+        for base in token.strip('[]'):
+            table[ord(base)] = True
+    return table
+
+@lru_cache(maxsize = None)
+def compile_site(site):
+    """
+    Compile a recognition site from a Bio.Restriction compsite into a tuple of
+    (lookup tables, allowed 2-bit base codes) with one entry per site position
+    """
+    tokens = _TOKEN_RE.findall(site)
+    tables = tuple(_token_table(token) for token in tokens)
+    allowed = tuple(
+        tuple(code for code, base in enumerate(_BASES) if table[ord(base)]) for table in tables
+        )
+    return tables, allowed
+
+@lru_cache(maxsize = None)
+def split_compsite(pattern):
+    """Return the (sense site, antisense site or None) held in an enzyme compsite pattern"""
+    match = _COMPSITE_RE.fullmatch(pattern)
+    if match is None:
+        raise ValueError(f'Could not interpret the enzyme compsite {pattern}')
+    return match.group(1), match.group(2)
+
+@lru_cache(maxsize = None)
+def site_anchor(allowed, kmer_size, max_expansions):
+    """
+    Return the site offset and k-mer codes of the anchor window with the fewest expansions.
+    Returns (None, None) if the site is shorter than kmer_size or too degenerate to anchor
+    """
+    best_offset, best_size = None, None
+    for offset in range(len(allowed) - kmer_size + 1):
+        size = 1
+        for choices in allowed[offset:offset + kmer_size]:
+            size *= len(choices)
+        if best_size is None or size < best_size:
+            best_offset, best_size = offset, size
+
+    if best_offset is None or best_size > max_expansions:
+        return None, None
+
+    kmers = numpy.zeros(1, dtype = numpy.int64)
+    for choices in allowed[best_offset:best_offset + kmer_size]:
+        kmers = ((kmers[:, None] << 2) | numpy.array(choices, dtype = numpy.int64)).ravel()
+    return best_offset, kmers
+
+def _sense_group(name):
+    return name
+
+def _antisense_group(name):
+    return None
+
+#The 2-bit code of every ascii byte, 4 for anything other than ACGT
+_BASE_CODES = numpy.full(256, 4, dtype = numpy.uint8)
+for _code, _base in enumerate(_BASES):
+    _BASE_CODES[ord(_base)] = _code
+#The number of windows the KmerIndex is built from at a time
+BUILD_CHUNK = 1024 ** 2
+
+class _TextBases():
+    """The bases of a sequence string for a KmerIndex"""
+    def __init__(self, data: str):
+        self._letters = numpy.frombuffer(data.encode('ascii'), dtype = numpy.uint8)
+
+    def __len__(self):
+        return len(self._letters)
+
+    def codes(self, start, stop):
+        return _BASE_CODES[self._letters[start:stop]]
+
+    def letters(self, positions):
+        return self._letters[positions]
+
+class _PackedBases():
+    """
+    The bases of a PackedSeq for a KmerIndex, read from its 2-bit codes without decoding it. They are laid out
+    as IndexedSeq data: a leading space, the sequence, then its first tail bases again for a circular sequence
+    """
+    def __init__(self, packed_seq: PackedSeq, tail = 0):
+        self._seq = packed_seq
+        self._length = len(packed_seq)
+        self._tail = min(tail, self._length)
+
+    def __len__(self):
+        return 1 + self._length + self._tail
+
+    def codes(self, start, stop):
+        length = self._length
+        pieces = []
+        if start == 0 and stop > 0:
+            pieces.append(numpy.full(1, 4, dtype = numpy.uint8))
+        pieces.append(self._seq.codes(max(start - 1, 0), min(stop - 1, length)))
+        if stop - 1 > length:
+            pieces.append(self._seq.codes(max(start - 1 - length, 0), min(stop - 1 - length, self._tail)))
+        return numpy.concatenate(pieces)
+
+    def letters(self, positions):
+        positions = numpy.asarray(positions)
+        letters = self._seq.bases_at((positions - 1) % max(self._length, 1))
+        letters[positions == 0] = ord(' ')
+        return letters
+
+class KmerIndex():
+    """
+    A positional index of every k-mer in a sequence so that all recognition sites
+    can be located from one pass over the sequence rather than one regex per enzyme
+    """
+    def __init__(self, data, kmer_size = 4, max_expansions = 256):
+        """
+        data - the sequence string to index (as held in FormattedSeq.data), or the bases of a PackedSeq (see KmerIndex.from_packed)
+        kmer_size - the length of the k-mers used to anchor each site
+        max_expansions - sites whose best anchor expands to more k-mers than this are scanned directly
+        """
+        self._kmer_size = kmer_size
+        self._max_expansions = max_expansions
+        self._bases = _TextBases(data) if isinstance(data, str) else data
+        self._site_cache = {}
+
+        self._build_index()
+
+    @classmethod
+    def from_packed(cls, packed_seq: PackedSeq, tail = 0, kmer_size = 4, max_expansions = 256):
+        """
+        Index a PackedSeq from its 2-bit codes, laid out as the IndexedSeq data of the sequence (a leading space,
+        the sequence and tail bases carried over the origin) so the positions found are the same
+        """
+        return cls(_PackedBases(packed_seq, tail), kmer_size, max_expansions)
+
+    @property
+    def kmer_size(self):
+        return self._kmer_size
+
+    def __len__(self):
+        return len(self._bases)
+
+    def _windows(self, n_windows):
+        """Yield (first window, k-mer codes, whether the window is only ACGT) for every BUILD_CHUNK windows"""
+        k = self.kmer_size
+        kmer_dtype = numpy.int32 if k <= 15 else numpy.int64
+        for start in range(0, n_windows, BUILD_CHUNK):
+            n = min(BUILD_CHUNK, n_windows - start)
+            codes = self._bases.codes(start, start + n + k - 1)
+            kmers = numpy.zeros(n, dtype = kmer_dtype)
+            regular = numpy.ones(n, dtype = bool)
+            for j in range(k):
+                window = codes[j:j + n]
+                kmers = (kmers << 2) | (window & 3)
+                regular &= window < 4
+            yield start, kmers, regular
+
+    def _build_index(self):
+        """
+        Encode the sequence as 2-bit k-mers and group their start positions by k-mer, a chunk at a time.
+        The first pass counts the k-mers, the second puts each start in the slot of its k-mer
+        """
+        n_kmers = 4 ** self.kmer_size
+        n_windows = max(len(self._bases) - self.kmer_size + 1, 0)
+        position_dtype = numpy.int32 if len(self._bases) < 2 ** 31 else numpy.int64
+
+        counts = numpy.zeros(n_kmers, dtype = numpy.int64)
+        #Windows containing anything other than ACGT (N, IUPAC codes, the leading space) are always verified
+        irregular = [numpy.zeros(0, dtype = position_dtype)]
+        for start, kmers, regular in self._windows(n_windows):
+            counts += numpy.bincount(kmers[regular], minlength = n_kmers)
+            irregular.append((numpy.flatnonzero(~regular) + start).astype(position_dtype))
+
+        offsets = numpy.concatenate(([0], numpy.cumsum(counts)))
+        positions = numpy.empty(offsets[-1], dtype = position_dtype)
+        filled = offsets[:-1].copy()
+        for start, kmers, regular in self._windows(n_windows):
+            starts = numpy.flatnonzero(regular)
+            kmers = kmers[starts]
+            order = numpy.argsort(kmers, kind = 'stable')
+            kmers = kmers[order]
+            chunk_counts = numpy.bincount(kmers, minlength = n_kmers)
+            ranks = numpy.arange(len(kmers)) - (numpy.cumsum(chunk_counts) - chunk_counts)[kmers]
+            positions[filled[kmers] + ranks] = starts[order] + start
+            filled += chunk_counts
+
+        self._positions = positions
+        self._offsets = offsets
+        self._irregular = numpy.concatenate(irregular)
+
+    def _verify(self, starts, tables):
+        """Keep only the starts where every position of the site matches"""
+        starts = starts[(starts >= 0) & (starts + len(tables) <= len(self._bases))]
+        keep = numpy.ones(len(starts), dtype = bool)
+        for j, table in enumerate(tables):
+            keep &= table[self._bases.letters(starts + j)]
+        return starts[keep]
+
+    def _scan(self, tables):
+        """Check every start position directly, used for short or highly degenerate sites"""
+        n_starts = len(self._bases) - len(tables) + 1
+        found = [numpy.empty(0, dtype = numpy.int64)]
+        for start in range(0, max(n_starts, 0), BUILD_CHUNK):
+            n = min(BUILD_CHUNK, n_starts - start)
+            letters = self._bases.letters(numpy.arange(start, start + n + len(tables) - 1))
+            keep = numpy.ones(n, dtype = bool)
+            for j, table in enumerate(tables):
+                keep &= table[letters[j:j + n]]
+            found.append(numpy.flatnonzero(keep) + start)
+        return numpy.concatenate(found)
+
+    def find(self, site):
+        """Return a sorted array of the 0-based starts in data where site matches"""
+        starts = self._site_cache.get(site)
+        if starts is not None:
+            return starts
+
+        tables, allowed = compile_site(site)
+        offset, kmers = site_anchor(allowed, self.kmer_size, self._max_expansions)
+        if offset is None:
+            starts = self._scan(tables)
+        else:
+            offsets = self._offsets
+            candidates = [self._positions[offsets[kmer]:offsets[kmer + 1]] for kmer in kmers]
+            candidates.append(self._irregular)
+            candidates = numpy.concatenate(candidates) - offset
+            starts = numpy.unique(self._verify(candidates, tables))
+
+        self._site_cache[site] = starts
+        return starts
+
+class EnzymeSites():
+    """The compiled sites and cut behaviour of every enzyme in a RestrictionBatch"""
+    def __init__(self, rb):
+        self.enzymes = []
+        for enzyme in rb:
+            sense_site, antisense_site = split_compsite(enzyme.compsite.pattern)
+            self.enzymes.append((enzyme, sense_site, antisense_site))
+        self.max_size = max((enzyme.size for enzyme in rb), default = 1)
+
+    def matches(self, index, offset, first, last, spanning = None):
+        """
+        Yield (enzyme, cut sites) for the sites in index whose start, as an index
+        of the whole sequence (index position + offset), is within [first, last).
+        If spanning is a sequence length only sites that run past its end are kept
+        """
+        for enzyme, sense_site, antisense_site in self.enzymes:
+            if spanning is not None:
+                first = spanning - enzyme.size + 2
+            sense = index.find(sense_site) + offset
+            sense = sense[(sense >= first) & (sense < last)]
+            cuts = [cut for start in sense.tolist() for cut in enzyme._modify(start)]
+            if antisense_site is not None:
+                antisense = index.find(antisense_site) + offset
+                antisense = antisense[(antisense >= first) & (antisense < last)]
+                seen = set(sense.tolist()) #sense is preferred when both strands match at one start
+                cuts += [cut for start in antisense.tolist() if start not in seen for cut in enzyme._rev_modify(start)]
+            if cuts:
+                yield enzyme, cuts
+
+class IndexedSeq(FormattedSeq):
+    """
+    A FormattedSeq whose finditer answers from a KmerIndex so that the normal
+    Bio.Restriction enzyme.search can be used with precomputed site matches
+    """
+    #Circular sequences are indexed with this many bases carried over the origin
+    max_site_size = 32
+
+    def __init__(self, seq, linear = True, kmer_size = 4):
+        self._packed_seq = None
+        self._data = None
+        if isinstance(seq, PackedSeq):
+            #Indexed from the 2-bit codes, data is only decoded if FormattedSeq needs it
+            self._packed_seq = seq
+            self.lower = False
+            self.linear = linear
+            self.klass = Seq
+        else:
+            super().__init__(seq, linear)
+        self._kmer_size = kmer_size
+        self._index = None
+
+    @property
+    def data(self):
+        if self._data is None and self._packed_seq is not None:
+            self._data = ' ' + str(self._packed_seq)
+        return self._data
+
+    @data.setter
+    def data(self, data):
+        self._data = data
+
+    def __len__(self):
+        if self._packed_seq is not None:
+            return len(self._packed_seq)
+        return super().__len__()
+
+    @property
+    def index(self):
+        if self._index is None:
+            #Sites that span the origin are found in the first bases carried to the end
+            tail = 0 if self.is_linear() else self.max_site_size - 1
+            if self._packed_seq is not None:
+                self._index = KmerIndex.from_packed(self._packed_seq, tail, self._kmer_size)
+            else:
+                self._index = KmerIndex(self.data + self.data[1:tail + 1], self._kmer_size)
+        return self._index
+
+    def finditer(self, pattern, size):
+        """Return a list of (location, group) the same as FormattedSeq.finditer"""
+        if self.is_linear():
+            length = len(self) + 1
+        elif size <= self.max_site_size:
+            length = len(self) + 1 + min(size - 1, len(self))
+        else:
+            return super().finditer(pattern, size)
+
+        sense_site, antisense_site = split_compsite(pattern.pattern)
+        sense = self.index.find(sense_site)
+        sense = sense[sense + size <= length]
+        if antisense_site is None:
+            return [(int(start), _sense_group) for start in sense]
+
+        antisense = self.index.find(antisense_site)
+        antisense = antisense[antisense + size <= length]
+        #The regex alternation prefers the sense strand when both match at one start
+        antisense = numpy.setdiff1d(antisense, sense, assume_unique = True)
+        found = [(int(start), _sense_group) for start in sense]
+        found += [(int(start), _antisense_group) for start in antisense]
+        found.sort(key = lambda x: x[0])
+        return found
+
+def as_seq(input_seq):
+    """Return input_seq as a Bio.Seq.Seq for Bio.Restriction, copying the bases out of a CompositeSeq or PackedSeq"""
+    if isinstance(input_seq, (CompositeSeq, PackedSeq)):
+        return input_seq.to_seq()
+    return input_seq
+
+def analysis_from_mapping(rb, input_seq, linear, mapping):
+    """Wrap an already searched {enzyme : [cut sites]} mapping in a Bio.Restriction.Analysis"""
+    analysis = Analysis(rb, Seq(''), linear)
+    analysis.sequence = input_seq
+    analysis.mapping = mapping
+    return analysis
+
+def release_search(rb):
+    """
+    Drop the sequence and results Bio.Restriction keeps on every enzyme class after a search,
+    which would otherwise hold the last sequence searched (and its KmerIndex) for the life of the process
+    """
+    for enzyme in rb:
+        enzyme.dna = None
+        enzyme.results = None
+
+class AnalysisScanner():
+    """Search a RestrictionBatch with Bio.Restriction, one regex per enzyme"""
+    name = 'biopython'
+
+    def search(self, rb, input_seq, linear):
+        """Return {enzyme : [cut sites]} for every enzyme in rb"""
+        input_seq = as_seq(input_seq)
+        mapping = {enzyme: enzyme.search(input_seq, linear) for enzyme in rb}
+        release_search(rb)
+        return mapping
+
+    def analysis(self, rb, input_seq, linear):
+        """Return a Bio.Restriction.Analysis of input_seq"""
+        return analysis_from_mapping(rb, input_seq, linear, self.search(rb, input_seq, linear))
+
+class KmerScanner(AnalysisScanner):
+    """Search every enzyme in a RestrictionBatch from a single k-mer index of the sequence"""
+    name = 'kmer'
+
+    def __init__(self, kmer_size = 4):
+        self._kmer_size = kmer_size
+
+    @property
+    def kmer_size(self):
+        return self._kmer_size
+
+    def search(self, rb, input_seq, linear):
+        """Return {enzyme : [cut sites]} for every enzyme in rb"""
+        #A PackedSeq is indexed from its 2-bit codes rather than decoded
+        indexed_seq = IndexedSeq(input_seq if isinstance(input_seq, PackedSeq) else as_seq(input_seq), linear, self.kmer_size)
+        mapping = {enzyme: list(enzyme.search(indexed_seq)) for enzyme in rb}
+        release_search(rb)
+        return mapping
+
+SCANNERS = {
+    AnalysisScanner.name : AnalysisScanner,
+    KmerScanner.name : KmerScanner,
+}
+
+def get_scanner(scanner = None):
+    """
+    Return a scanner object from None (the default KmerScanner), a name in SCANNERS
+    or any object with search and analysis methods
+    """
+    if scanner is None:
+        return KmerScanner()
+    elif isinstance(scanner, str):
+        try:
+            return SCANNERS[scanner]()
+        except KeyError:
+            raise ValueError(f'Unknown scanner {scanner}. Choose from {", ".join(SCANNERS)}')
+    else:
+        return scanner
@@ -0,0 +1,228 @@
+from collections import namedtuple
+from itertools import chain
+
+import numpy
+
+from Bio.Restriction import RestrictionBatch
+
+from plasmidin.composite import CompositeSeq
+from plasmidin.cut_sites import CutSiteStore
+from plasmidin.site_scanner import AnalysisScanner, EnzymeSites, KmerIndex, get_scanner
+
+#A stretch of a spliced sequence copied from a sequence already searched.
+#cut_sites - the {enzyme_name : [cut sites]} or CutSiteStore of the source, searched - the enzyme names searched in the source,
+#source_start - the first base of the piece in the source, start - the first base in the spliced sequence
+SplicePiece = namedtuple('SplicePiece', ['cut_sites', 'searched', 'source_start', 'start', 'length'])
+
+def site_margin(enzymes):
+    """
+    Return the number of bases either side of a cut that can hold any base of the site that made it.
+    A cut further than this from the ends of a piece comes from a site wholly inside the piece
+    """
+    margin = 1
+    for enzyme in enzymes:
+        offsets = [abs(offset) for offset in (enzyme.fst5, enzyme.fst3, enzyme.scd5, enzyme.scd3) if offset is not None]
+        margin = max(margin, 2 * enzyme.size + max(offsets, default = 0))
+    return margin
+
+def _circular_slice(data, first, last):
+    """Return bases first to last (1-based, inclusive) of a circular sequence, wrapping past either end"""
+    length = len(data)
+    start = (first - 1) % length
+    size = last - first + 1
+    if start + size <= length:
+        return data[start:start + size]
+    return data[start:] + data[:size - (length - start)]
+
+def _cut_arrays(cut_sites, enzyme_ids):
+    """
+    Return (enzyme id, cut) arrays of every cut in {enzyme_name : [cut sites]}
+    or a CutSiteStore for the enzymes in enzyme_ids
+    """
+    if isinstance(cut_sites, CutSiteStore):
+        row_ids = numpy.array([enzyme_ids.get(enzyme_name, -1) for enzyme_name in cut_sites.enzyme_names], dtype = numpy.int64)
+        ids = numpy.repeat(row_ids, cut_sites.counts)
+        keep = ids >= 0
+        return ids[keep], cut_sites.positions[keep].astype(numpy.int64)
+    enzyme_names = [enzyme_name for enzyme_name in cut_sites if enzyme_name in enzyme_ids]
+    n_cuts = [len(cut_sites[enzyme_name]) for enzyme_name in enzyme_names]
+    ids = numpy.repeat(numpy.array([enzyme_ids[enzyme_name] for enzyme_name in enzyme_names], dtype = numpy.int64), n_cuts)
+    cuts = numpy.fromiter(chain.from_iterable(cut_sites[enzyme_name] for enzyme_name in enzyme_names), dtype = numpy.int64, count = sum(n_cuts))
+    return ids, cuts
+
+def _drop_cut(enzyme, cut, length, linear):
+    """Return a raw cut as Bio.Restriction reports it, or None if it is dropped from a linear sequence"""
+    if linear:
+        if enzyme.is_unknown() or 1 < cut <= length:
+            return cut
+        return None
+    if cut < 1:
+        return cut + length
+    if cut > length:
+        return cut - length
+    return cut
+
+class SpliceScanner(AnalysisScanner):
+    """
+    Search a sequence spliced together from pieces of sequences that have already been searched.
+    Cuts far enough inside a piece are copied from its source with their positions shifted and only
+    the bases around the joins (and the origin of a circular sequence) are rescanned,
+    so the cost scales with the number of joins rather than the sequence length.
+    Any other sequence, or enzymes not searched in every source, are searched in full with scanner
+    """
+    name = 'splice'
+
+    def __init__(self, seq, pieces, scanner = None, kmer_size = 4):
+        """
+        seq - the spliced sequence, a CompositeSeq (or Seq) whose bases are only copied out around the joins
+        pieces - SplicePiece for the stretches of seq to copy cuts from. Bases not in a piece are scanned
+        scanner - the scanner used for anything that can not be spliced. Defaults to the k-mer index scanner
+        """
+        self._seq = CompositeSeq.from_seq(seq)
+        self._length = len(seq)
+        self._pieces = list(pieces)
+        self._scanner = get_scanner(scanner)
+        self._kmer_size = kmer_size
+
+    @property
+    def pieces(self):
+        return self._pieces
+
+    @property
+    def scanner(self):
+        return self._scanner
+
+    def _spliced(self, input_seq):
+        if input_seq is self._seq:
+            return True
+        return len(input_seq) == self._length and str(input_seq).upper() == str(self._seq).upper()
+
+    def _interiors(self, margin):
+        """Return the (first cut, last cut, piece) copied from each piece"""
+        interiors = []
+        for piece in self._pieces:
+            first = piece.start + margin
+            last = piece.start + piece.length - margin
+            if first <= last:
+                interiors.append((first, last, piece))
+        interiors.sort(key = lambda x: x[0])
+        return interiors
+
+    def _rescan_intervals(self, interiors, linear):
+        """Return the (first cut, last cut) intervals not covered by any piece, merged over a circular origin"""
+        length = self._length
+        intervals = []
+        position = 1
+        for first, last, _ in interiors:
+            if first > position:
+                intervals.append((position, first - 1))
+            position = max(position, last + 1)
+        if position <= length:
+            intervals.append((position, length))
+
+        if not linear and len(intervals) > 1 and intervals[0][0] == 1 and intervals[-1][1] == length:
+            head = intervals.pop(0)
+            intervals[-1] = (intervals[-1][0], length + head[1])
+        return intervals
+
+    def _windows(self, intervals, margin, max_size, linear):
+        """Return the (first base, last base, bases) holding every site that can cut within each interval"""
+        length = self._length
+        windows = []
+        for first_cut, last_cut in intervals:
+            first, last = first_cut - margin, last_cut + margin + max_size
+            if linear:
+                first, last = max(first, 1), min(last, length)
+                windows.append((first, last, str(self._seq[first - 1:last]).upper()))
+            else:
+                windows.append((first, last, str(_circular_slice(self._seq, first, last)).upper()))
+        return windows
+
+    def _rescan(self, enzyme_sites, intervals, margin, linear):
+        """
+        Yield (enzyme, raw cut, cut) for the cuts within each interval. The windows around every interval 
+        share one KmerIndex, joined by newlines which no site can match across
+        """
+        length = self._length
+        windows = self._windows(intervals, margin, enzyme_sites.max_size, linear)
+        index = KmerIndex('\n'.join(bases for _, _, bases in windows), self._kmer_size)
+
+        position = 0 #the index of the window's first base in the KmerIndex
+        for (first_cut, last_cut), (first, last, bases) in zip(intervals, windows):
+            if linear:
+                shifts = [(first, last + 1, 0)]
+            else:
+                #Site starts are kept in 1 to length as Bio.Restriction does for circular sequences
+                shifts = [(first, 1, length), (max(first, 1), min(last, length) + 1, 0), (length + 1, last + 1, -length)]
+            for start, end, shift in shifts:
+                if start >= end:
+                    continue
+                for enzyme, cuts in enzyme_sites.matches(index, first - position + shift, start + shift, end + shift):
+                    for raw_cut in cuts:
+                        cut = _drop_cut(enzyme, raw_cut, length, linear)
+                        if cut is None:
+                            continue
+                        if first_cut <= cut <= last_cut or first_cut <= cut + length <= last_cut:
+                            yield enzyme, raw_cut, cut
+            position += len(bases) + 1
+
+    def splice_search(self, enzymes, linear):
+        """
+        Return {enzyme : [cut sites]} for the spliced sequence, ordered as Bio.Restriction orders them.
+        Returns None if a rescanned window would be longer than the sequence
+        """
+        enzymes = list(enzymes)
+        enzyme_ids = {str(enzyme) : i for i, enzyme in enumerate(enzymes)}
+        enzyme_sites = EnzymeSites(enzymes)
+        margin = site_margin(enzymes)
+        interiors = self._interiors(margin)
+        intervals = self._rescan_intervals(interiors, linear)
+        if any(last - first + 2 * margin + enzyme_sites.max_size >= self._length for first, last in intervals):
+            return None
+
+        #(enzyme id, raw cut, cut) arrays. A copied cut is never moved over an end so its raw cut is the cut
+        found_ids, found_raw_cuts, found_cuts = [], [], []
+        source_cuts = {}
+        for first, last, piece in interiors:
+            source = id(piece.cut_sites)
+            if source not in source_cuts:
+                source_cuts[source] = _cut_arrays(piece.cut_sites, enzyme_ids)
+            ids, cuts = source_cuts[source]
+            shift = piece.start - piece.source_start
+            keep = (cuts >= first - shift) & (cuts <= last - shift)
+            found_ids.append(ids[keep])
+            found_raw_cuts.append(cuts[keep] + shift)
+            found_cuts.append(cuts[keep] + shift)
+
+        rescanned = [(enzyme_ids[str(enzyme)], raw_cut, cut) for enzyme, raw_cut, cut in self._rescan(enzyme_sites, intervals, margin, linear)]
+        rescanned = numpy.array(rescanned, dtype = numpy.int64).reshape(-1, 3)
+        found_ids.append(rescanned[:, 0])
+        found_raw_cuts.append(rescanned[:, 1])
+        found_cuts.append(rescanned[:, 2])
+
+        ids = numpy.concatenate(found_ids)
+        order = numpy.lexsort((numpy.concatenate(found_raw_cuts), ids))
+        bounds = numpy.searchsorted(ids[order], numpy.arange(len(enzymes) + 1))
+        cuts = numpy.concatenate(found_cuts)[order].tolist()
+        return {enzyme : cuts[bounds[i]:bounds[i + 1]] for i, enzyme in enumerate(enzymes)}
+
+    def search(self, rb, input_seq, linear):
+        """Return {enzyme : [cut sites]} for every enzyme in rb"""
+        if not self._spliced(input_seq):
+            return self._scanner.search(rb, input_seq, linear)
+
+        spliced, others = [], []
+        for enzyme in rb:
+            #Palindromic enzymes cutting twice per site are listed site by site rather than sorted, so are searched in full
+            two_cuts = enzyme.is_palindromic() and enzyme.scd5 is not None
+            if not two_cuts and all(str(enzyme) in piece.searched for piece in self._pieces):
+                spliced.append(enzyme)
+            else:
+                others.append(enzyme)
+
+        mapping = self.splice_search(spliced, linear) if spliced else None
+        if mapping is None:
+            return self._scanner.search(rb, input_seq, linear)
+        if others:
+            mapping.update(self._scanner.search(RestrictionBatch(others), input_seq, linear))
+        return {enzyme : mapping[enzyme] for enzyme in rb}
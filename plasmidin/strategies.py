@@ -0,0 +1,140 @@
+import numpy
+import pandas
+
+from plasmidin.enzyme_snapshot import enzyme_snapshot
+
+STRATEGY_COLUMNS = [
+    'Backbone_enzymes', 'Insert_enzymes', 'Backbone_n_cut_sites', 'Insert_n_cut_sites',
+    'Directional', 'Reverse_insert', 'N_common_suppliers', 'Common_suppliers',
+    'Insert_fragment', 'Backbone_removed', 'Integrated_length',
+]
+
+def _usable_sites(cut_enzymes: dict):
+    """Return (enzyme names, cut sites) sorted by cut site for the enzymes integrate_seq can use"""
+    usable = [(cut_enzymes[enzyme_name][0], enzyme_name) for enzyme_name in enzyme_snapshot().unambiguous(list(cut_enzymes))]
+    usable.sort()
+    return [enzyme_name for _, enzyme_name in usable], numpy.array([site for site, _ in usable], dtype = numpy.int64)
+
+def _count_bits(masks, n_bits):
+    counts = numpy.zeros(masks.shape, dtype = numpy.int64)
+    for bit in range(n_bits):
+        counts += (masks >> bit) & 1
+    return counts
+
+def _pair_strategies(index, masks, backbone_names, backbone_sites, insert_names, insert_sites):
+    """
+    Test every pair of backbone single cutters against every pair of insert single cutters at once.
+    Pairs are taken in cut site order, the same as integrate_seq, so each unordered pair is tested once.
+    Pairs of enzymes cutting at the same site are left out
+    """
+    #Enzymes with no compatible partner on the other sequence can never be used
+    compatible = index.submatrix(backbone_names, insert_names)
+    keep_backbone = compatible.any(axis = 1)
+    keep_insert = compatible.any(axis = 0)
+    compatible = compatible[keep_backbone][:, keep_insert]
+    backbone_names = [name for name, keep in zip(backbone_names, keep_backbone) if keep]
+    insert_names = [name for name, keep in zip(insert_names, keep_insert) if keep]
+    backbone_sites = backbone_sites[keep_backbone]
+    insert_sites = insert_sites[keep_insert]
+
+    backbone_lhs, backbone_rhs = numpy.triu_indices(len(backbone_names), k = 1)
+    insert_lhs, insert_rhs = numpy.triu_indices(len(insert_names), k = 1)
+    #Enzymes cutting at the same site leave nothing between them to remove or insert
+    apart = backbone_sites[backbone_rhs] != backbone_sites[backbone_lhs]
+    backbone_lhs, backbone_rhs = backbone_lhs[apart], backbone_rhs[apart]
+    apart = insert_sites[insert_rhs] != insert_sites[insert_lhs]
+    insert_lhs, insert_rhs = insert_lhs[apart], insert_rhs[apart]
+
+    #The 2x2 compatible_enzymes_matrix for every (backbone pair, insert pair)
+    lhs_lhs = compatible[backbone_lhs][:, insert_lhs]
+    lhs_rhs = compatible[backbone_lhs][:, insert_rhs]
+    rhs_lhs = compatible[backbone_rhs][:, insert_lhs]
+    rhs_rhs = compatible[backbone_rhs][:, insert_rhs]
+
+    diagonal = lhs_lhs & rhs_rhs
+    anti_diagonal = lhs_rhs & rhs_lhs
+    ambiguous = (lhs_lhs.astype(int) + lhs_rhs != 1) | (rhs_lhs.astype(int) + rhs_rhs != 1)
+
+    backbone_pair, insert_pair = numpy.nonzero(diagonal | anti_diagonal)
+    backbone_masks = numpy.array([masks[name] for name in backbone_names], dtype = numpy.int64)
+    insert_masks = numpy.array([masks[name] for name in insert_names], dtype = numpy.int64)
+    backbone_lhs, backbone_rhs = backbone_lhs[backbone_pair], backbone_rhs[backbone_pair]
+    insert_lhs, insert_rhs = insert_lhs[insert_pair], insert_rhs[insert_pair]
+    return {
+        'backbone' : [(backbone_names[i], backbone_names[j]) for i, j in zip(backbone_lhs, backbone_rhs)],
+        'insert' : [(insert_names[i], insert_names[j]) for i, j in zip(insert_lhs, insert_rhs)],
+        'backbone_removed' : backbone_sites[backbone_rhs] - backbone_sites[backbone_lhs],
+        'insert_fragment' : insert_sites[insert_rhs] - insert_sites[insert_lhs],
+        'suppliers' : backbone_masks[backbone_lhs] & backbone_masks[backbone_rhs] & insert_masks[insert_lhs] & insert_masks[insert_rhs],
+        'directional' : ~ambiguous[backbone_pair, insert_pair],
+        'reverse' : anti_diagonal[backbone_pair, insert_pair],
+        }
+
+def _single_enzyme_strategies(index, masks, backbone_names, insert_cut_enzymes):
+    """A backbone single cutter opened once and an insert cut out by a compatible enzyme that cuts it twice"""
+    insert_names = enzyme_snapshot().unambiguous(list(insert_cut_enzymes))
+    compatible = index.submatrix(backbone_names, insert_names)
+    backbone_enzyme, insert_enzyme = numpy.nonzero(compatible)
+    n_strategies = len(backbone_enzyme)
+    insert_fragments = numpy.array([
+        insert_cut_enzymes[insert_names[j]][1] - insert_cut_enzymes[insert_names[j]][0] for j in insert_enzyme
+        ], dtype = numpy.int64)
+    return {
+        'backbone' : [(backbone_names[i], backbone_names[i]) for i in backbone_enzyme],
+        'insert' : [(insert_names[j], insert_names[j]) for j in insert_enzyme],
+        'backbone_removed' : numpy.zeros(n_strategies, dtype = numpy.int64),
+        'insert_fragment' : insert_fragments,
+        'suppliers' : numpy.array([masks[backbone_names[i]] & masks[insert_names[j]] for i, j in zip(backbone_enzyme, insert_enzyme)], dtype = numpy.int64),
+        'directional' : numpy.zeros(n_strategies, dtype = bool),
+        'reverse' : numpy.ones(n_strategies, dtype = bool),
+        }
+
+def enumerate_strategies(rsinserter, single_enzyme = True):
+    """
+    Return a ranked table of every backbone and insert enzyme pair that can be used with rsinserter.integrate_seq,
+    worked out from the cut sites and compatible ends only (no integrated sequences are made).
+
+    Pairs of single cutters are tested for the backbone and the insert, including different enzymes with
+    compatible ends. With single_enzyme a backbone single cutter and a compatible insert double cutter
+    are also included. Backbone_enzymes and Insert_enzymes are in the (5' cut, 3' cut) order for integrate_seq.
+    Ranked with directional strategies first, then the most suppliers selling every enzyme,
+    then the largest insert fragment and the smallest piece of backbone removed
+    """
+    index = rsinserter.compatibility_index
+    backbone_names, backbone_sites = _usable_sites(rsinserter.backbone_rsfinder.single_cut_enzymes)
+    insert_names, insert_sites = _usable_sites(rsinserter.insert_rsfinder.single_cut_enzymes)
+
+    insert_double_cutters = rsinserter.insert_rsfinder.n_cut_sites(2) if single_enzyme else {}
+    suppliers = rsinserter.backbone_rsfinder.supplier_index
+    enzyme_names = sorted(set(backbone_names) | set(insert_names) | set(insert_double_cutters))
+    masks = dict(zip(enzyme_names, suppliers.enzyme_masks(enzyme_names).tolist()))
+
+    strategies = [(1, 1, _pair_strategies(index, masks, backbone_names, backbone_sites, insert_names, insert_sites))]
+    if single_enzyme:
+        strategies.append((1, 2, _single_enzyme_strategies(index, masks, backbone_names, insert_double_cutters)))
+
+    backbone_length = len(rsinserter.backbone_rsfinder.seq_view)
+    tables = []
+    for backbone_n_cut_sites, insert_n_cut_sites, found in strategies:
+        common = found['suppliers']
+        tables.append(pandas.DataFrame({
+            'Backbone_enzymes' : pandas.Series(found['backbone'], dtype = object),
+            'Insert_enzymes' : pandas.Series(found['insert'], dtype = object),
+            'Backbone_n_cut_sites' : backbone_n_cut_sites,
+            'Insert_n_cut_sites' : insert_n_cut_sites,
+            'Directional' : found['directional'],
+            'Reverse_insert' : found['reverse'],
+            'N_common_suppliers' : _count_bits(common, len(suppliers.supplier_codes)),
+            'Common_suppliers' : [suppliers.mask_codes(mask) for mask in common.tolist()],
+            'Insert_fragment' : found['insert_fragment'],
+            'Backbone_removed' : found['backbone_removed'],
+            'Integrated_length' : backbone_length - found['backbone_removed'] + found['insert_fragment'],
+            }, columns = STRATEGY_COLUMNS))
+
+    table = pandas.concat(tables, ignore_index = True)
+    table = table.sort_values(
+        ['Directional', 'N_common_suppliers', 'Insert_fragment', 'Backbone_removed'],
+        ascending = [False, False, False, True],
+        kind = 'stable',
+        )
+    return table.reset_index(drop = True)
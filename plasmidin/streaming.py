@@ -0,0 +1,130 @@
+import string
+from collections import defaultdict, namedtuple
+
+from plasmidin.plasmidin import default_batch, remove_ambiguous_enzymes
+from plasmidin.site_scanner import KmerIndex, EnzymeSites
+
+StreamedCuts = namedtuple('StreamedCuts', ['record_id', 'cut_sites'])
+
+_IUPAC = 'ABCDGHKMNRSTVWY'
+_REMOVE_CHARS = str.maketrans('', '', string.whitespace + string.digits)
+#The most characters of a fasta line read at once
+READ_SIZE = 64 * 1024
+
+def _clean_line(line):
+    """Return a fasta sequence line in the same form as Bio.Restriction FormattedSeq data"""
+    seq = line.translate(_REMOVE_CHARS).upper()
+    if seq.strip(_IUPAC):
+        raise TypeError(f'Invalid character found in {line.strip()}')
+    return seq
+
+def iter_fasta_windows(fasta_file, window_size, overlap):
+    """
+    Read a (multi-)fasta file READ_SIZE characters at a time, yielding (record_id, start, window, last) where
+    start is the index of window[0] in ' ' + sequence (so index 1 is the first base)
+    and each window is window_size + overlap long (the last of a record may be shorter), sharing overlap bases with the previous one.
+    Long lines, such as an unwrapped chromosome, are split into windows too, so only one window
+    of each record is held in memory at a time
+    """
+    record_id = None
+    line_start = True
+    with open(fasta_file) as fasta:
+        for line in iter(lambda: fasta.readline(READ_SIZE), ''):
+            at_line_start, line_start = line_start, line.endswith('\n')
+            if at_line_start and line.startswith('>'):
+                if not line_start:
+                    line += fasta.readline()
+                    line_start = True
+                if record_id is not None:
+                    yield record_id, start, ''.join(buffer), True
+                record_id = line[1:].split(maxsplit = 1)[0] if line[1:].strip() else ''
+                start, buffer, buffer_length = 0, [' '], 1
+                continue
+            if record_id is None:
+                continue
+            seq = _clean_line(line)
+            buffer.append(seq)
+            buffer_length += len(seq)
+            if buffer_length >= window_size + overlap:
+                data = ''.join(buffer)
+                offset = 0
+                while len(data) - offset >= window_size + overlap:
+                    yield record_id, start, data[offset:offset + window_size + overlap], False
+                    start += window_size
+                    offset += window_size
+                data = data[offset:]
+                buffer, buffer_length = [data], len(data)
+        if record_id is not None:
+            yield record_id, start, ''.join(buffer), True
+
+def _place_cuts(enzyme, cuts, length, linear):
+    """Drop (linear) or wrap (circular) cuts that fall outside a sequence of length, as Bio.Restriction does"""
+    if linear:
+        if enzyme.is_unknown():
+            return cuts
+        return [cut for cut in cuts if 1 < cut <= length]
+    return [cut + length if cut < 1 else cut - length if cut > length else cut for cut in cuts]
+
+def stream_cut_sites(fasta_file, linear: bool, rb = None, remove_ambiguous = True, window_size = 1_000_000, kmer_size = 4):
+    """
+    Scan every record of a (multi-)fasta file in windows of window_size bases, yielding a
+    StreamedCuts(record_id, {enzyme_name : [cut sites]}) for each window as it is scanned.
+
+    Windows overlap by the longest recognition site - 1 so no site is missed, and for circular
+    records the first bases are carried to the end to find sites spanning the origin. Cuts that
+    depend on the record length (beyond either end) are held back and yielded with the last window,
+    so memory is bounded by window_size rather than the sequence length.
+    Cut sites are the same as RSFinder.all_cut_enzymes, but lists from different windows are
+    yielded separately (see collect_cut_sites)
+    """
+    if rb is None:
+        rb = default_batch()
+    if remove_ambiguous:
+        rb = remove_ambiguous_enzymes(rb)
+    enzyme_sites = EnzymeSites(rb)
+    overlap = enzyme_sites.max_size - 1
+
+    for record_id, start, window, last in iter_fasta_windows(fasta_file, window_size, overlap):
+        if start == 0:
+            head = window[1:overlap + 1]
+            pending = []
+        end = start + len(window)
+        owned_end = end if last else end - overlap
+        index = KmerIndex(window, kmer_size)
+
+        cut_sites = defaultdict(list)
+        for enzyme, cuts in enzyme_sites.matches(index, start, start, owned_end):
+            for cut in cuts:
+                if 1 < cut < end:
+                    cut_sites[enzyme.__name__].append(cut)
+                else: #needs the record length
+                    pending.append((enzyme, cut))
+
+        if last:
+            length = end - 1
+            if not linear and length > 0:
+                #Sites spanning the origin, as FormattedSeq.finditer adds data[1:size] for circular sequences
+                tail_start = max(end - overlap, 1)
+                junction = window[tail_start - start:] + head[:overlap]
+                junction_index = KmerIndex(junction, kmer_size)
+                for enzyme, cuts in enzyme_sites.matches(junction_index, tail_start, None, end, spanning = length):
+                    pending.extend((enzyme, cut) for cut in cuts)
+
+            for enzyme, cut in pending:
+                cut_sites[enzyme.__name__].extend(_place_cuts(enzyme, [cut], length, linear))
+
+        cut_sites = {enzyme_name : cuts for enzyme_name, cuts in cut_sites.items() if cuts}
+        if cut_sites or last:
+            yield StreamedCuts(record_id, cut_sites)
+
+def collect_cut_sites(streamed_cuts):
+    """Merge StreamedCuts into {record_id : {enzyme_name : sorted cut sites}}"""
+    records = defaultdict(lambda : defaultdict(list))
+    for record_id, cut_sites in streamed_cuts:
+        record = records[record_id]
+        for enzyme_name, cuts in cut_sites.items():
+            record[enzyme_name].extend(cuts)
+    return {
+        record_id : {enzyme_name : sorted(cuts) for enzyme_name, cuts in record.items()}
+        for record_id, record in records.items()
+        }
@@ -0,0 +1,84 @@
+import numpy
+
+from plasmidin.enzyme_snapshot import enzyme_snapshot
+
+class SupplierIndex():
+    """
+    A bitmask of the suppliers selling each enzyme in a RestrictionBatch, so supplier queries
+    are answered with bitwise operations over every enzyme at once rather than by reading
+    each enzyme's supplier list. Bit i of a mask is supplier_codes[i]
+    """
+    def __init__(self, enzyme_names, supplier_codes, masks):
+        self._enzyme_names = tuple(enzyme_names)
+        self._enzyme_index = {enzyme_name : i for i, enzyme_name in enumerate(self._enzyme_names)}
+        self._supplier_codes = tuple(supplier_codes)
+        self._supplier_bits = {code : 1 << i for i, code in enumerate(self._supplier_codes)}
+        self._masks = masks
+
+    @classmethod
+    def from_batch(cls, rb):
+        """Build the index for every enzyme in rb from the supplier masks of the enzyme snapshot"""
+        enzyme_names = sorted(str(enzyme) for enzyme in rb)
+        snapshot = enzyme_snapshot(rb)
+        return cls(enzyme_names, snapshot.supplier_codes, snapshot.supplier_masks(enzyme_names))
+
+    @property
+    def enzyme_names(self):
+        return self._enzyme_names
+
+    @property
+    def supplier_codes(self):
+        return self._supplier_codes
+
+    @property
+    def masks(self):
+        return self._masks
+
+    def __contains__(self, enzyme_name):
+        return str(enzyme_name) in self._enzyme_index
+
+    def __len__(self):
+        return len(self._enzyme_names)
+
+    def enzyme_masks(self, enzyme_names):
+        """Return the supplier bitmasks of enzyme_names. Enzymes not in the index have no suppliers"""
+        enzyme_index = self._enzyme_index
+        rows = numpy.array([enzyme_index.get(str(enzyme_name), -1) for enzyme_name in enzyme_names], dtype = numpy.int64)
+        masks = self._masks[rows] if len(rows) else numpy.zeros(0, dtype = numpy.int64)
+        return numpy.where(rows >= 0, masks, 0)
+
+    def supplier_mask(self, supplier_codes):
+        """Return the bitmask of supplier_codes, ignoring codes that sell no enzyme in the index"""
+        return sum(self._supplier_bits.get(code, 0) for code in set(supplier_codes))
+
+    def match(self, supplier_codes, require_all = False, enzyme_names = None):
+        """
+        Return a boolean array of the enzymes sold by any of supplier_codes,
+        or every one of them if require_all. enzyme_names defaults to every enzyme in the index
+        """
+        masks = self._masks if enzyme_names is None else self.enzyme_masks(enzyme_names)
+        query = self.supplier_mask(supplier_codes)
+        if require_all:
+            if any(code not in self._supplier_bits for code in supplier_codes):
+                return numpy.zeros(len(masks), dtype = bool)
+            return (masks & query) == query
+        return (masks & query) != 0
+
+    def enzymes(self, supplier_codes, require_all = False):
+        """Return the names of the enzymes sold by any (or with require_all every one) of supplier_codes"""
+        return [self._enzyme_names[i] for i in numpy.flatnonzero(self.match(supplier_codes, require_all))]
+
+    def mask_codes(self, mask):
+        """Return the supplier codes in a bitmask as a string"""
+        return ''.join(code for code in self._supplier_codes if mask & self._supplier_bits[code])
+
+_index_cache = {}
+
+def supplier_index(rb):
+    """Return the SupplierIndex for rb, building it only the first time a batch is seen"""
+    key = frozenset(str(enzyme) for enzyme in rb)
+    index = _index_cache.get(key)
+    if index is None:
+        index = SupplierIndex.from_batch(rb)
+        _index_cache[key] = index
+    return index
@@ -1,13 +1,21 @@
+import argparse
 from os import path
 from os import makedirs
 
 from plasmidin.plasmidin import RSInserter
-from plasmidin.plasmid_diagrams import PlasmidDrawer
+from plasmidin.rendering import RenderJob, render_many
+from plasmidin.profiling import Profiler
 
 #Quick functions
 def add_dirpath(outdir, filename):
     return path.join(outdir, filename)
 
+#0) Optionally profile the time spent in each stage
+parser = argparse.ArgumentParser()
+parser.add_argument('--profile', default = None, help = 'a file to write a Chrome trace of the time spent in each stage to')
+args = parser.parse_args()
+profiler = Profiler().start() if args.profile else None
+
 #1) Set up the folder if necessary:
 outdir = 'plasmidin_example_output'
 if not path.isdir(outdir):
@@ -44,32 +52,23 @@ rsinserter.insert_rsfinder.save_enzyme_table(insert_table, delimiter = ',')
 rsinserter.integrated_rsfinder.save_enzyme_table(integrated_table, delimiter = ',')
 
 #6) Create plasmid maps
-#a) Create the records to plot for the plasmid...
+#a) Create the records to plot for the plasmid, insert and integrated sequence...
 rsinserter.backbone_rsfinder.create_enzyme_records(max_n_cut_sites = 2)
-#Plot them using the input_seq created previously and the feature_info generated in the backgroud...
-pUC19_input_seq = rsinserter.backbone_rsfinder.input_seq
-pUC19_feature_info = rsinserter.backbone_rsfinder.feature_info
-pUC19_figure = add_dirpath(outdir, 'pUC19_restriction_map.pdf')
-
-plasmid_drawer = PlasmidDrawer(pUC19_input_seq, 'pUC19', pUC19_feature_info)
-plasmid_drawer.draw_gd_diagram(pUC19_figure, 'circular', {'pagesize' : 'A4', 'circle_core' : 0.5, 'track_size' : 0.1})
-
-#b) Create the records to plot for the insert...
 rsinserter.insert_rsfinder.create_enzyme_records(max_n_cut_sites = 2)
-#Plot them using the input_seq created previously and the feature_info generated in the backgroud...
-myinsert_input_seq = rsinserter.insert_rsfinder.input_seq
-myinsert_feature_info = rsinserter.insert_rsfinder.feature_info
-myinsert_figure = add_dirpath(outdir, 'myinsert_restriction_map.pdf')
-
-plasmid_drawer = PlasmidDrawer(myinsert_input_seq, 'insert_XbaI_BamHI', myinsert_feature_info)
-plasmid_drawer.draw_gd_diagram(myinsert_figure, 'linear', {'pagesize' : 'A4', 'track_size' : 1.0})
-
-#c) Create the records to plot for the integrated sequence...
 rsinserter.integrated_rsfinder.create_enzyme_records(max_n_cut_sites = 2)
-#Plot them using the input_seq created previously and the feature_info generated in the backgroud...
-integrated_input_seq = rsinserter.integrated_rsfinder.input_seq
-integrated_feature_info = rsinserter.integrated_rsfinder.feature_info
-integrated_figure = add_dirpath(outdir, 'integrated_pUC19_myinsert_restriction_map.pdf')
 
-plasmid_drawer = PlasmidDrawer(integrated_input_seq, 'plasmid_insert_XbaI_BamHI', integrated_feature_info)
-plasmid_drawer.draw_gd_diagram(integrated_figure, 'circular', {'pagesize' : 'A4', 'circle_core' : 0.5, 'track_size' : 0.1})
\ No newline at end of file
+#b) Plot them using the input_seq and the feature_info generated in the backgroud.
+#The maps are drawn in parallel, written to separate files and also combined into one PDF
+circular_settings = {'pagesize' : 'A4', 'circle_core' : 0.5, 'track_size' : 0.1}
+linear_settings = {'pagesize' : 'A4', 'track_size' : 1.0}
+render_jobs = [
+    RenderJob(rsinserter.backbone_rsfinder.input_seq, 'pUC19', rsinserter.backbone_rsfinder.feature_info, 'circular', circular_settings),
+    RenderJob(rsinserter.insert_rsfinder.input_seq, 'myinsert', rsinserter.insert_rsfinder.feature_info, 'linear', linear_settings),
+    RenderJob(rsinserter.integrated_rsfinder.input_seq, 'integrated_pUC19_myinsert', rsinserter.integrated_rsfinder.feature_info, 'circular', circular_settings),
+]
+render_many(render_jobs, outdir, combined_pdf = add_dirpath(outdir, 'all_restriction_maps.pdf'))
+
+if profiler is not None:
+    profiler.stop()
+    profiler.save_chrome_trace(args.profile)
+    print(profiler.report())
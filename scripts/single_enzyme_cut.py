@@ -1,13 +1,21 @@
+import argparse
 from os import path
 from os import makedirs
 
 from plasmidin.plasmidin import RSInserter
 from plasmidin.plasmid_diagrams import PlasmidDrawer
+from plasmidin.profiling import Profiler
 
 #Quick functions
 def add_dirpath(outdir, filename):
     return path.join(outdir, filename)
 
+#0) Optionally profile the time spent in each stage
+parser = argparse.ArgumentParser()
+parser.add_argument('--profile', default = None, help = 'a file to write a Chrome trace of the time spent in each stage to')
+args = parser.parse_args()
+profiler = Profiler().start() if args.profile else None
+
 #1) Set up the folder if necessary:
 outdir = 'XbaI_single_cut_output'
 if not path.isdir(outdir):
@@ -83,3 +91,8 @@ reverse_integrated_figure = add_dirpath(outdir, 'integrated_reverse_pUC19_myinse
 
 plasmid_drawer = PlasmidDrawer(reverse_integrated_input_seq, 'plasmid_insert_XbaI_XbaI', reverse_integrated_feature_info)
 plasmid_drawer.draw_gd_diagram(reverse_integrated_figure, 'circular', {'pagesize' : 'A4', 'circle_core' : 0.5, 'track_size' : 0.1})
+
+if profiler is not None:
+    profiler.stop()
+    profiler.save_chrome_trace(args.profile)
+    print(profiler.report())
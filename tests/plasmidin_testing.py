@@ -1,10 +1,33 @@
+import json
+import os
+import pickle
+import subprocess
+import sys
+from unittest import mock
 from collections import defaultdict
+from pathlib import Path
+
+import pandas
 
 from Bio.Seq import Seq
+from Bio.SeqFeature import SeqFeature, SimpleLocation
 from Bio.Restriction import RestrictionBatch, AllEnzymes, Analysis, CommOnly
 
-from plasmidin.plasmidin import RSFinder, RSInserter
-from plasmidin.plasmid_diagrams import PlasmidDrawer
+from plasmidin import cli, gel
+from plasmidin.plasmidin import RSFinder, RSInserter, parse_input_seq
+from plasmidin.plasmid_diagrams import PlasmidDrawer, cluster_features, coordinate_step
+from plasmidin.site_scanner import IndexedSeq, KmerScanner
+from plasmidin.compatibility import CompatibilityIndex
+from plasmidin.composite import CompositeSeq
+from plasmidin.packed import PackedSeq, pack_seq
+from plasmidin.cut_sites import CutSiteStore
+from plasmidin.features import FeatureRecords
+from plasmidin import enzyme_snapshot as enzyme_snapshot_module
+from plasmidin.enzyme_snapshot import EnzymeSnapshot, enzyme_snapshot, load_snapshot
+from plasmidin.profiling import Profiler
+from plasmidin.rendering import RenderJob, render_many
+from plasmidin.cache import DEFAULT_MAX_ENTRIES, DEFAULT_SITE_CACHE_BYTES, ResultCache, clear_site_cache, configure_site_cache, site_cache_info
+from plasmidin.streaming import collect_cut_sites, iter_fasta_windows, stream_cut_sites
 
 #Sometimes need to select the correct interpreter in vscode using >python: Select Interpreter then chosing the env
 def test_RSFinder():
@@ -42,7 +65,7 @@ def test_RSFinder():
     # print(rsfinder.supplier_names)
 
     rsfinder.create_enzyme_records(1)
-    for feature_info in rsfinder.feature_info[:10]:
+    for feature_info in rsfinder.feature_info.head(10):
         print(feature_info[1]['feature_name'])
         print(feature_info[0])
 
@@ -111,6 +134,500 @@ def test_pbr322():
     
     # print(max_key, max_cuts)
 
+def test_kmer_scanner_parity():
+    rb = RestrictionBatch(AllEnzymes)
+    seqs = [
+        parse_input_seq('data/pUC19_plasmid.fa'),
+        Seq('AAAAGAATTCNNNNNNAACGTTTAT'),
+        Seq('ATTTTCTGAATTCGCTAACGTTA'),
+        Seq('GAATTC'),
+    ]
+    for seq in seqs:
+        for linear in (True, False):
+            analysis = Analysis(rb, seq, linear)
+            kmer_sites = KmerScanner().search(rb, seq, linear)
+            for enzyme in rb:
+                assert kmer_sites[enzyme] == analysis.mapping[enzyme], (enzyme, linear)
+
+    rsfinder = RSFinder('data/pUC19_plasmid.fa', False)
+    #The site cache is keyed by scanner, so the biopython search is not answered from the kmer search
+    biopython_rsfinder = RSFinder('data/pUC19_plasmid.fa', False, scanner = 'biopython')
+    assert rsfinder.all_cut_enzymes == biopython_rsfinder.all_cut_enzymes
+    assert rsfinder.single_cut_enzymes == biopython_rsfinder.single_cut_enzymes
+
+def test_lazy_rsfinder():
+    rsfinder = RSFinder('data/pUC19_plasmid.fa', False, lazy = True)
+    assert rsfinder._analysis is None and rsfinder._enzyme_table is None
+
+    eager_rsfinder = RSFinder('data/pUC19_plasmid.fa', False)
+    assert rsfinder.single_cut_enzymes == eager_rsfinder.single_cut_enzymes
+    assert rsfinder._enzyme_table is None
+
+    rsfinder.change_rb(RestrictionBatch(['EcoRI', 'XbaI']), update = False)
+    assert rsfinder.all_cut_enzymes == {'EcoRI': [684], 'XbaI': [657]}
+
+def test_parse_input_seq(tmp_path):
+    #Fasta files are read without Bio.SeqIO and give the same sequence
+    from Bio import SeqIO
+    for fasta_file in ['data/pUC19_plasmid.fa', 'data/insert_XbaI_BamHI.fa', 'data/insert_XbaI_XbaI.fa']:
+        assert parse_input_seq(fasta_file) == SeqIO.read(fasta_file, 'fasta').seq
+    wrapped_file = tmp_path / 'wrapped.fa'
+    wrapped_file.write_text('comment\n>record\nACGT\r\nAC GT\n\nTT\n')
+    assert parse_input_seq(str(wrapped_file)) == SeqIO.read(wrapped_file, 'fasta').seq == 'ACGTACGTTT'
+    for text in ['', 'ACGT\n', '>one\nACGT\n>two\nACGT\n']:
+        fasta_file = tmp_path / 'bad.fa'
+        fasta_file.write_text(text)
+        try:
+            parse_input_seq(str(fasta_file))
+            assert False
+        except ValueError:
+            pass
+
+def test_batch_scan():
+    records = [parse_input_seq('data/pUC19_plasmid.fa'), parse_input_seq('data/insert_XbaI_BamHI.fa')]
+    for workers in (1, 2):
+        scans = {scan.record_id : scan for scan in RSFinder.batch(records, False, workers = workers, chunk_size = 1)}
+        assert scans['0'].all_cut_enzymes == RSFinder(records[0], False).all_cut_enzymes
+        assert scans['1'].single_cut_enzymes == RSFinder(records[1], False).single_cut_enzymes
+        assert len(scans['0'].enzyme_table_rows) == len(scans['0'].all_cut_enzymes)
+
+def test_stream_cut_sites(tmp_path):
+    fasta_file = tmp_path / 'records.fa'
+    with open('data/pUC19_plasmid.fa') as plasmid, open('data/insert_XbaI_BamHI.fa') as insert:
+        fasta_file.write_text(plasmid.read() + '\n' + insert.read())
+    records = {'pUC19' : parse_input_seq('data/pUC19_plasmid.fa'), 'XbaI_BamHIinsert' : parse_input_seq('data/insert_XbaI_BamHI.fa')}
+
+    for linear in (True, False):
+        streamed = collect_cut_sites(stream_cut_sites(str(fasta_file), linear, window_size = 100))
+        for record_id, seq in records.items():
+            expected = {enzyme_name : sorted(cut_sites) for enzyme_name, cut_sites in RSFinder(seq, linear).all_cut_enzymes.items()}
+            assert streamed[record_id] == expected, (record_id, linear)
+
+    #An unwrapped multi-megabase record is split into windows rather than read as one line
+    seq = str(records['pUC19']) * 800
+    unwrapped_file, wrapped_file = tmp_path / 'unwrapped.fa', tmp_path / 'wrapped.fa'
+    unwrapped_file.write_text(f'>genome\n{seq}\n>pUC19\n{records["pUC19"]}\n')
+    wrapped_file.write_text('>genome\n' + '\n'.join(seq[i:i + 60] for i in range(0, len(seq), 60)) + f'\n>pUC19\n{records["pUC19"]}\n')
+    windows = list(iter_fasta_windows(str(unwrapped_file), 100_000, 5))
+    assert len(seq) > 2_000_000 and max(len(window) for _, _, window, _ in windows) == 100_005
+    assert [record_id for record_id, _, _, last in windows if last] == ['genome', 'pUC19']
+    genome = [(start, window) for record_id, start, window, _ in windows if record_id == 'genome']
+    assert ''.join(window[5 if start else 1:] for start, window in genome) == seq.upper()
+    assert all(window[:5] == genome[i][1][-5:] for i, (start, window) in enumerate(genome[1:])) #each window keeps the overlap
+    rb = RestrictionBatch(['EcoRI', 'BamHI', 'HindIII', 'BsaI', 'NotI'])
+    for linear in (True, False):
+        streamed = collect_cut_sites(stream_cut_sites(str(unwrapped_file), linear, rb, window_size = 100_000))
+        assert streamed == collect_cut_sites(stream_cut_sites(str(wrapped_file), linear, rb, window_size = 100_000))
+        assert streamed['genome']['EcoRI'][:2] == [cut_site + len(records['pUC19']) * i for i in range(2) for cut_site in streamed['pUC19']['EcoRI']]
+
+def test_compatibility_index(tmp_path):
+    index = CompatibilityIndex.from_batch(CommOnly)
+    for enzyme_name in ('BamHI', 'XbaI', 'EcoRV', 'SacI', 'BsaI', 'AccB1I'):
+        compatible_end = {str(enzyme) for enzyme in AllEnzymes.get(enzyme_name).compatible_end()}
+        assert set(index.compatible_enzymes(enzyme_name)) == compatible_end & set(index.enzyme_names)
+    assert index.compatible('BamHI', 'BglII') and not index.compatible('BamHI', 'XbaI')
+
+    index.save(tmp_path / 'index.npz')
+    loaded_index = CompatibilityIndex.load(tmp_path / 'index.npz')
+    assert (loaded_index.matrix == index.matrix).all() and loaded_index.enzyme_names == index.enzyme_names
+
+def test_enumerate_strategies():
+    rsinserter = RSInserter('data/pUC19_plasmid.fa', 'data/insert_XbaI_BamHI.fa')
+    strategies = rsinserter.enumerate_strategies()
+    assert strategies['Directional'].iloc[0]
+    xba_bam = strategies[(strategies['Backbone_enzymes'] == ('XbaI', 'BamHI')) & (strategies['Insert_enzymes'] == ('XbaI', 'BamHI'))]
+    assert len(xba_bam) == 1 and not xba_bam['Reverse_insert'].iloc[0]
+    #No pair of enzymes cutting at the same site, only single enzyme strategies remove no backbone
+    assert (strategies['Insert_fragment'] > 0).all()
+    two_enzymes = strategies['Backbone_enzymes'].map(lambda enzymes: enzymes[0] != enzymes[1])
+    assert (strategies.loc[two_enzymes, 'Backbone_removed'] > 0).all()
+
+    for row in strategies.head(5).itertuples():
+        rsinserter.integrate_seq(row.Backbone_enzymes, row.Insert_enzymes, row.Backbone_n_cut_sites, row.Insert_n_cut_sites)
+        assert len(rsinserter.integrated_rsfinder.input_seq) == row.Integrated_length
+
+def test_incremental_integration():
+    strategies = [
+        ('data/insert_XbaI_BamHI.fa', ('XbaI', 'BamHI'), ('XbaI', 'BamHI'), 1),
+        ('data/insert_XbaI_BamHI.fa', ('BamHI', 'SmaI'), ('AluI', 'BamHI'), 1),
+        ('data/insert_XbaI_XbaI.fa', ('XbaI', 'XbaI'), ('XbaI', 'XbaI'), 2),
+    ]
+    for backbone_linear in (False, True):
+        for insert_seq, backbone_enzymes, insert_enzymes, insert_n_cut_sites in strategies:
+            rsinserter = RSInserter('data/pUC19_plasmid.fa', insert_seq, backbone_linear = backbone_linear)
+            rsinserter.integrate_seq(backbone_enzymes, insert_enzymes, 1, insert_n_cut_sites)
+            incremental = rsinserter.integrated_rsfinder, rsinserter._additional_integrated_rsfinder
+            clear_site_cache()
+            rsinserter.integrate_seq(backbone_enzymes, insert_enzymes, 1, insert_n_cut_sites, incremental = False)
+            full = rsinserter.integrated_rsfinder, rsinserter._additional_integrated_rsfinder
+            for incremental_rsfinder, full_rsfinder in zip(incremental, full):
+                if full_rsfinder is not None:
+                    assert incremental_rsfinder.analysis.mapping == full_rsfinder.analysis.mapping
+
+def test_result_cache(tmp_path):
+    clear_site_cache()
+    cache = ResultCache(tmp_path)
+    rsfinder = RSFinder('data/pUC19_plasmid.fa', False, cache = cache)
+    clear_site_cache()
+    cached_rsfinder = RSFinder('data/pUC19_plasmid.fa', False, cache = cache)
+    assert (cache.hits, cache.misses, len(cache)) == (1, 1, 1)
+    assert cached_rsfinder.analysis.mapping == rsfinder.analysis.mapping
+    assert cached_rsfinder.enzyme_table.equals(rsfinder.enzyme_table)
+
+    RSFinder('data/pUC19_plasmid.fa', True, cache = cache)
+    assert cache.misses == 2 and len(cache) == 2
+
+    small_cache = ResultCache(tmp_path / 'small.sqlite', max_bytes = cache.size() - 1)
+    clear_site_cache()
+    RSFinder('data/pUC19_plasmid.fa', False, cache = small_cache)
+    RSFinder('data/pUC19_plasmid.fa', True, cache = small_cache)
+    assert len(small_cache) == 1
+
+def test_site_cache():
+    clear_site_cache()
+    rsfinder = RSFinder('data/pUC19_plasmid.fa', False)
+    n_enzymes = len(rsfinder.rb)
+    assert site_cache_info().misses == n_enzymes and site_cache_info().entries == n_enzymes
+
+    rsfinder.change_rb(RestrictionBatch(['EcoRI', 'XbaI']))
+    assert rsfinder.all_cut_enzymes == {'EcoRI': [684], 'XbaI': [657]}
+    assert site_cache_info().hits == 2 and site_cache_info().misses == n_enzymes
+
+    assert site_cache_info().bytes < n_enzymes * 300
+
+    #Every scanner finds the same cut sites, so they share the cached enzymes
+    RSFinder('data/pUC19_plasmid.fa', False, scanner = 'biopython')
+    assert site_cache_info().entries == n_enzymes and site_cache_info().hits == 2 + n_enzymes
+
+    #An integrated sequence found by splicing is not searched again in full
+    rsinserter = RSInserter('data/pUC19_plasmid.fa', 'data/insert_XbaI_BamHI.fa')
+    rsinserter.integrate_seq(('XbaI', 'BamHI'), ('XbaI', 'BamHI'))
+    integrated = rsinserter.integrated_rsfinder
+    misses = site_cache_info().misses
+    assert RSFinder(integrated.seq_view, False).all_cut_enzymes == integrated.all_cut_enzymes
+    assert site_cache_info().misses == misses
+
+    configure_site_cache(max_entries = 10)
+    assert site_cache_info().entries == 10
+    configure_site_cache(max_bytes = 0)
+    assert site_cache_info().entries == 0 and site_cache_info().bytes == 0
+    configure_site_cache(max_entries = DEFAULT_MAX_ENTRIES, max_bytes = DEFAULT_SITE_CACHE_BYTES)
+    clear_site_cache()
+
+def test_filter_supplier():
+    rsfinder = RSFinder('data/pUC19_plasmid.fa', False)
+    any_supplier = rsfinder.filter_supplier(['N', 'B'], n_cut_sites = 1)
+    for enzyme_name, cut_sites in any_supplier.items():
+        assert {'N', 'B'} & set(AllEnzymes.get(enzyme_name).suppl) and len(cut_sites) == 1
+    assert list(rsfinder.supplier_table['Name']) == list(any_supplier)
+
+    every_supplier = rsfinder.filter_supplier(['N', 'B'], n_cut_sites = 1, require_all = True)
+    assert set(every_supplier) == {
+        enzyme_name for enzyme_name in any_supplier if {'N', 'B'} <= set(AllEnzymes.get(enzyme_name).suppl)
+        }
+
+def test_cut_store():
+    rsfinder = RSFinder('data/pUC19_plasmid.fa', False, lazy = True)
+    cut_store = rsfinder.cut_store
+    analysis = Analysis(rsfinder.rb, rsfinder.input_seq, False)
+    assert {str(enzyme) : cuts for enzyme, cuts in analysis.with_sites().items()} == rsfinder.all_cut_enzymes
+    assert list(rsfinder.n_cut_sites(2)) == [str(enzyme) for enzyme in analysis.with_N_sites(2)]
+    assert rsfinder.analysis.mapping == analysis.mapping
+    assert cut_store.offsets.dtype.itemsize == 4 and cut_store.positions.dtype.itemsize == 4
+
+    filtered = rsfinder.filter_enzymes(['EcoRI', 'HindIII', 'NotAnEnzyme'], n_cut_sites = 1)
+    assert filtered == {'EcoRI' : cut_store.cut_sites('EcoRI'), 'HindIII' : cut_store.cut_sites('HindIII')}
+
+def test_region_queries():
+    for linear in (True, False):
+        rsfinder = RSFinder('data/pUC19_plasmid.fa', linear, lazy = True)
+        length = len(rsfinder.input_seq)
+        all_cut_enzymes = rsfinder.all_cut_enzymes
+        for start, end in [(1, length + 1), (100, 500), (2500, 300), (396, 397)]:
+            if linear and end < start:
+                continue
+            def in_region(cut_site):
+                return start <= cut_site < end if start < end else cut_site >= start or cut_site < end
+            expected = {enzyme_name : [cut_site for cut_site in cut_sites if in_region(cut_site)] for enzyme_name, cut_sites in all_cut_enzymes.items()}
+            expected = {enzyme_name : cut_sites for enzyme_name, cut_sites in expected.items() if cut_sites}
+            assert rsfinder.enzymes_cutting_in(start, end) == expected
+            assert set(rsfinder.enzymes_not_cutting_in(start, end)) == set(all_cut_enzymes) - set(expected)
+
+        for position in (1, 50, length - 10):
+            nearest = rsfinder.nearest_cut_sites(position, k = 3)
+            distances = sorted(
+                min(abs(cut_site - position), length - abs(cut_site - position)) if not linear else abs(cut_site - position)
+                for cut_sites in all_cut_enzymes.values() for cut_site in cut_sites
+                )
+            assert [distance for _, _, distance in nearest] == distances[:3]
+
+def test_digest():
+    for linear in (True, False):
+        rsfinder = RSFinder('data/pUC19_plasmid.fa', linear, lazy = True)
+        length = len(rsfinder.input_seq)
+        fragments = rsfinder.digest(['EcoRI', 'HindIII'])
+        assert sum(fragment.length for fragment in fragments) == length
+        assert len(fragments) == (3 if linear else 2)
+
+        table = rsfinder.digest_table()
+        for enzymes, sizes in zip(table['Enzymes'], table['Fragment_sizes']):
+            expected = sorted((fragment.length for fragment in rsfinder.digest(enzymes)), reverse = True)
+            assert list(sizes) == expected, enzymes
+        n_enzymes = sum(1 for cut_sites in rsfinder.all_cut_enzymes.values() if len(cut_sites) <= 2)
+        assert len(table) == n_enzymes + n_enzymes * (n_enzymes - 1) // 2
+
+def test_diagnostic_digests():
+    rsinserter = RSInserter('data/pUC19_plasmid.fa', 'data/insert_XbaI_XbaI.fa')
+    rsinserter.integrate_seq(('XbaI', 'XbaI'), ('XbaI', 'XbaI'), 1, 2)
+    table = rsinserter.diagnostic_digests(k = 5)
+    assert len(table) == 5 and list(table['Score']) == sorted(table['Score'], reverse = True)
+    assert {'Forward_sizes', 'Reverse_sizes', 'Backbone_sizes'} <= set(table.columns)
+
+    best = table.iloc[0]
+    rsfinders = [rsinserter.integrated_rsfinder, rsinserter.additional_integrated_rsfinder, rsinserter.backbone_rsfinder]
+    for rsfinder, column in zip(rsfinders, ['Forward_sizes', 'Reverse_sizes', 'Backbone_sizes']):
+        assert sorted(fragment.length for fragment in rsfinder.digest(best['Enzymes'])) == sorted(best[column])
+    assert best['Resolved']
+
+    #The gel module is given the RSFinders rather than reading them from the RSInserter
+    table = gel.diagnostic_digests(rsinserter.integrated_rsfinder, rsinserter.backbone_rsfinder, k = 5)
+    assert 'Reverse_sizes' not in table.columns and len(table) == 5
+
+def test_composite_seq():
+    seq = parse_input_seq('data/pUC19_plasmid.fa')
+    composite = CompositeSeq.from_seq(seq)
+    assert str(composite[100:200] + composite[:50][::-1]) == str(seq[100:200] + seq[:50][::-1])
+    assert str(composite[500:100:-1]) == str(seq[500:100:-1]) and composite[-1] == seq[-1]
+
+    rsinserter = RSInserter('data/pUC19_plasmid.fa', 'data/insert_XbaI_BamHI.fa')
+    rsinserter.integrate_seq(('XbaI', 'BamHI'), ('XbaI', 'BamHI'))
+    integrated_view = rsinserter.integrated_rsfinder.seq_view
+    assert isinstance(integrated_view, CompositeSeq) and len(integrated_view.segments) == 3
+    #input_seq is still a Seq with all its methods
+    integrated_seq = rsinserter.integrated_rsfinder.input_seq
+    assert isinstance(integrated_seq, Seq) and str(integrated_seq) == str(integrated_view)
+    assert str(integrated_seq.reverse_complement()) == str(Seq(str(integrated_view)).reverse_complement())
+    assert integrated_seq.upper().find('TCTAGA') >= 0 and isinstance(integrated_seq[10:20], Seq)
+    rsfinder = RSFinder(integrated_seq, False)
+    assert rsfinder.all_cut_enzymes == rsinserter.integrated_rsfinder.all_cut_enzymes
+    rsinserter.integrated_rsfinder.create_enzyme_records()
+    plasmid_drawer = PlasmidDrawer(integrated_seq, 'integrated', rsinserter.integrated_rsfinder.feature_info)
+    assert plasmid_drawer.seq_length == len(rsfinder.input_seq)
+
+def test_packed_seq(tmp_path):
+    seq = parse_input_seq('data/pUC19_plasmid.fa')
+    seq = seq[:1000] + Seq('NNRYacgt') + seq[1000:]
+    packed = pack_seq(seq, tmp_path / 'backbone.pseq')
+    assert str(packed) == str(seq).upper() and packed.nbytes < len(seq) / 3
+    assert str(packed.reverse_complement()) == str(seq.reverse_complement()).upper()
+    assert str(packed[995:1010]) == str(seq[995:1010]).upper()
+    assert str(pickle.loads(pickle.dumps(packed))) == str(packed)
+
+    clear_site_cache()
+    #The packed sequence is indexed from its 2-bit codes, never decoded
+    with mock.patch.object(PackedSeq, 'to_seq', side_effect = AssertionError('decoded')), mock.patch.object(PackedSeq, '__str__', side_effect = AssertionError('decoded')):
+        packed_rsfinder = RSFinder(str(tmp_path / 'backbone.pseq'), False)
+        packed_rsfinder.all_cut_enzymes
+        reverse_sites = KmerScanner().search(packed_rsfinder.rb, packed.reverse_complement(), True)
+        assert IndexedSeq(packed, False).index._positions.itemsize == 4
+    assert isinstance(packed_rsfinder.input_seq, PackedSeq)
+    assert packed_rsfinder.all_cut_enzymes == RSFinder(seq, False).all_cut_enzymes
+    assert reverse_sites == KmerScanner().search(packed_rsfinder.rb, seq.reverse_complement(), True)
+
+    rsinserter = RSInserter(packed, 'data/insert_XbaI_BamHI.fa')
+    rsinserter.integrate_seq(('XbaI', 'BamHI'), ('XbaI', 'BamHI'))
+    clear_site_cache()
+    integrated_seq = rsinserter.integrated_rsfinder.input_seq
+    assert rsinserter.integrated_rsfinder.all_cut_enzymes == RSFinder(integrated_seq, False).all_cut_enzymes
+
+def test_cli(tmp_path):
+    manifest = tmp_path / 'manifest.csv'
+    manifest.write_text('backbone,insert\ndata/pUC19_plasmid.fa,data/insert_XbaI_BamHI.fa\ndata/pUC19_plasmid.fa,data/insert_XbaI_XbaI.fa\n')
+    output = tmp_path / 'strategies.csv'
+    assert cli.main(['screen', '--manifest', str(manifest), '-o', str(output), '--jobs', '1', '--top', '5', '--cache-dir', str(tmp_path / 'cache')]) == 0
+    strategies = pandas.read_csv(output)
+    assert list(strategies.groupby('Insert').size()) == [5, 5]
+
+    #Worker processes give the same strategies, in the order the pairs finish
+    parallel_output = tmp_path / 'strategies_parallel.csv'
+    cli.main(['screen', '--manifest', str(manifest), '-o', str(parallel_output), '--jobs', '2', '--top', '5', '--profile', str(tmp_path / 'trace.json')])
+    parallel_strategies = pandas.read_csv(parallel_output)
+    assert (
+        parallel_strategies.sort_values(['Insert', 'Backbone']).reset_index(drop = True)
+        .equals(strategies.sort_values(['Insert', 'Backbone']).reset_index(drop = True))
+        )
+    #The profile covers the pairs screened in the workers
+    events = json.loads((tmp_path / 'trace.json').read_text())['traceEvents']
+    worker_events = [event for event in events if event['pid'] != os.getpid()]
+    assert sum(event['name'] == 'RSInserter.enumerate_strategies' for event in worker_events) == 2
+
+    output = tmp_path / 'sites.tsv'
+    cli.main(['scan', 'data/pUC19_plasmid.fa', '-o', str(output), '--jobs', '1', '--enzymes', 'EcoRI,HindIII,NotI', '--suppliers', 'N'])
+    sites = pandas.read_csv(output, sep = '\t')
+    assert set(sites['Name']) == {'EcoRI', 'HindIII'}
+
+    #Blank linear cells take the command line default and strings are parsed, not truth tested
+    manifest.write_text('backbone,insert,backbone_linear,insert_linear\nb1.fa,i1.fa,,false\nb2.fa,i2.fa,no,\nb3.fa,i3.fa,TRUE,1\n')
+    assert cli.read_manifest(str(manifest)) == [('b1.fa', 'i1.fa', None, False), ('b2.fa', 'i2.fa', False, None), ('b3.fa', 'i3.fa', True, True)]
+    args = cli.build_parser().parse_args(['screen', '--manifest', str(manifest), '-o', '-'])
+    assert [linear for _, _, *linear in cli._screen_pairs(args)] == [[False, False], [False, True], [True, True]]
+    manifest.write_text('backbone,insert,backbone_linear\nb1.fa,i1.fa,maybe\n')
+    try:
+        cli.read_manifest(str(manifest))
+        assert False
+    except ValueError as error:
+        assert 'line 2 backbone_linear' in str(error)
+
+    #A first record without cut sites still writes the full header
+    fasta = tmp_path / 'uncut_first.fa'
+    fasta.write_text('>uncut\n' + 'A' * 40 + '\n' + open('data/pUC19_plasmid.fa').read())
+    output = tmp_path / 'uncut_first.csv'
+    cli.main(['scan', str(fasta), '-o', str(output), '--jobs', '1', '--enzymes', 'EcoRI,HindIII'])
+    sites = pandas.read_csv(output)
+    parallel_output = tmp_path / 'uncut_first_parallel.csv'
+    cli.main(['scan', str(fasta), '-o', str(parallel_output), '--jobs', '2', '--enzymes', 'EcoRI,HindIII'])
+    assert pandas.read_csv(parallel_output).equals(sites)
+    assert list(sites.columns) == ['Record', 'Name', 'N_sites', 'Cut_Locations', 'Cut_type', 'CommerciallyAvailable', 'Suppliers']
+    assert sites[['Record', 'Name', 'N_sites']].values.tolist() == [['pUC19', 'EcoRI', 1], ['pUC19', 'HindIII', 1]]
+
+def test_enzyme_snapshot(tmp_path):
+    snapshot = EnzymeSnapshot.from_enzymes()
+    snapshot.save(tmp_path / 'enzymes.snapshot')
+    snapshot = EnzymeSnapshot.open(tmp_path / 'enzymes.snapshot')
+    assert len(snapshot) == len(AllEnzymes)
+
+    enzymes = sorted(CommOnly)
+    assert snapshot.overhangs(enzymes) == [enzyme.overhang() for enzyme in enzymes]
+    assert snapshot.is_ambiguous(enzymes).tolist() == [enzyme.is_ambiguous() for enzyme in enzymes]
+    assert snapshot.supplier_lists(enzymes) == [enzyme.supplier_list() for enzyme in enzymes]
+    assert snapshot.site('EcoRI') == 'GAATTC'
+    assert snapshot.cut_offsets('EcoRI') == (1, -1, None, None)
+    bamhi, bglii, ecori = snapshot.end_groups(['BamHI', 'BglII', 'EcoRI']).tolist()
+    assert bamhi == bglii != ecori
+
+    #Enzymes missing from the snapshot are compiled from the RestrictionBatch
+    assert 'EcoRI' in enzyme_snapshot(RestrictionBatch(['EcoRI']))
+
+    #The snapshot is written to the user cache, never into the package
+    with mock.patch.dict(os.environ, {'XDG_CACHE_HOME' : str(tmp_path / 'cache')}):
+        snapshot = load_snapshot()
+        assert snapshot.path == str(tmp_path / 'cache' / 'plasmidin' / 'enzymes.snapshot')
+        assert len(snapshot) == len(AllEnzymes)
+        assert load_snapshot().path == snapshot.path
+    assert not (Path(enzyme_snapshot_module.__file__).parent / 'enzymes.snapshot').exists()
+    assert [path.name for path in (tmp_path / 'cache' / 'plasmidin').iterdir()] == ['enzymes.snapshot']
+
+def test_profiling():
+    RSFinder('data/pUC19_plasmid.fa', False) #nothing is recorded without a started Profiler
+    finished = []
+    with Profiler(callback = finished.append) as profiler:
+        rsinserter = RSInserter('data/pUC19_plasmid.fa', 'data/insert_XbaI_BamHI.fa')
+        rsinserter.integrate_seq(('XbaI', 'BamHI'), ('XbaI', 'BamHI'))
+    summary = profiler.summary()
+    assert summary['RSFinder.__init__']['calls'] == 3
+    assert summary['RSInserter.integrated_rsfinder']['calls'] == 1
+    assert summary['RSInserter.__init__']['self_s'] < summary['RSInserter.__init__']['total_s']
+    assert len(finished) == len(profiler.stages)
+
+    events = profiler.to_chrome_trace()['traceEvents']
+    assert {event['ph'] for event in events} == {'X'}
+    assert len(events) == len(profiler.stages)
+
+def test_cluster_features():
+    assert coordinate_step(2686) == 500
+    assert coordinate_step(100000) == 10000
+
+    features = [(SeqFeature(SimpleLocation(site, site + 1)), {'feature_name' : f'Enzyme{site}', 'label' : True}) for site in range(0, 10000, 5)]
+    clusters = cluster_features(features, 10000, resolution = 100, max_labels = 10)
+    assert len(clusters) == 100
+    first_feature, first_info = clusters.head(1)[0]
+    assert first_feature.location.start == 0 and first_feature.location.end == 96
+    assert first_info['feature_name'] == 'Enzyme0, Enzyme5, Enzyme10, Enzyme15 +16'
+    assert sum(info['label'] for _, info in clusters.values()) == 10
+    assert features[0][1]['feature_name'] == 'Enzyme0' #the feature_info given is not changed
+
+    plasmid_drawer = PlasmidDrawer(Seq('A' * 10000), 'dense', features, resolution = 100)
+    assert len(plasmid_drawer.gd_feature_set.features) == 100
+
+    #Clusters are ranked by how many enzymes they hold, not how many their shortened name shows
+    features = [(SeqFeature(SimpleLocation(site, site + 1)), {'feature_name' : f'Enzyme{site}'}) for site in list(range(16)) + list(range(500, 505))]
+    clusters = cluster_features(features, 1000, resolution = 2, max_labels = 1)
+    assert [info['feature_name'] for _, info in clusters.values()] == ['Enzyme0, Enzyme1, Enzyme2, Enzyme3 +12', 'Enzyme500, Enzyme501, Enzyme502, Enzyme503 +1']
+    assert [info['label'] for _, info in clusters.values()] == [False, True]
+
+    #Small maps are drawn with every feature unless clustering is asked for
+    rsfinder = RSFinder('data/pUC19_plasmid.fa', False)
+    rsfinder.create_enzyme_records(max_n_cut_sites = 2)
+    plasmid_drawer = PlasmidDrawer(rsfinder.input_seq, 'pUC19', rsfinder.feature_info)
+    assert len(plasmid_drawer.gd_feature_set.features) == len(rsfinder.feature_info)
+    assert all(feature.label for feature in plasmid_drawer.gd_feature_set.get_features())
+    plasmid_drawer = PlasmidDrawer(rsfinder.input_seq, 'pUC19', rsfinder.feature_info, cluster_threshold = None)
+    assert len(plasmid_drawer.gd_feature_set.features) < len(rsfinder.feature_info)
+
+def test_render_many(tmp_path):
+    rsfinder = RSFinder('data/pUC19_plasmid.fa', False)
+    rsfinder.create_enzyme_records(max_n_cut_sites = 2)
+    features = rsfinder.feature_info.values()
+    assert FeatureRecords.from_features(features) == rsfinder.feature_info
+    assert pickle.loads(pickle.dumps(rsfinder.feature_info)) == rsfinder.feature_info
+
+    settings = {'pagesize' : 'A4', 'circle_core' : 0.5, 'track_size' : 0.1}
+    jobs = [RenderJob(rsfinder.input_seq, f'pUC19_{i}', rsfinder.feature_info, 'circular', settings) for i in range(3)]
+    jobs.append(RenderJob(rsfinder.input_seq, 'pUC19_linear', rsfinder.feature_info, 'linear', {'track_size' : 1.0}, str(tmp_path / 'linear.svg')))
+    with Profiler() as profiler:
+        diagram_files = render_many(jobs, str(tmp_path), filetype = 'SVG', combined_pdf = str(tmp_path / 'maps.pdf'), workers = 2)
+    assert diagram_files[0] == str(tmp_path / 'pUC19_0_restriction_map.svg')
+    assert diagram_files[3] == str(tmp_path / 'linear.svg')
+    assert all(Path(diagram_file).exists() for diagram_file in diagram_files)
+    assert (tmp_path / 'maps.pdf').read_bytes().count(b'/Type /Page\n') == 4
+
+    #The workers' drawing stages are added to the started Profiler with their own pid
+    worker_stages = [record for record in profiler.stages if record.process != os.getpid()]
+    assert sum(record.name == 'PlasmidDrawer.__init__' for record in worker_stages) == 4
+    assert all(record.start >= 0 for record in worker_stages)
+    events = profiler.to_chrome_trace()['traceEvents']
+    assert {event['pid'] for event in events} == {record.process for record in worker_stages}
+
+def test_feature_records():
+    #XbaI cuts twice, once where BamHI also cuts, and BamHI's name must not spread to XbaI's other site
+    cut_store = CutSiteStore.from_mapping({'XbaI' : [10, 50], 'BamHI' : [10], 'EcoRI' : [30, 50, 70]})
+    records = FeatureRecords.from_cut_store(cut_store, max_n_cut_sites = 2)
+    assert records.starts.tolist() == [10, 50]
+    assert records.names == ('BamHI, XbaI', 'XbaI')
+    records = FeatureRecords.from_cut_store(cut_store, max_n_cut_sites = 3)
+    assert records.names == ('BamHI, XbaI', 'EcoRI', 'XbaI, EcoRI', 'EcoRI')
+    assert not records.starts.flags.writeable and not records.style_index.flags.writeable
+    feature, info = records[50]
+    assert (int(feature.location.start), info['feature_name'], info['label_angle']) == (50, 'XbaI, EcoRI', 45)
+
+    #feature_info reads as the {cut site : (SeqFeature, info)} dict it used to be
+    assert list(records) == records.keys() == [10, 30, 50, 70]
+    assert 30 in records and 20 not in records and records.get(20) is None
+    assert [info['feature_name'] for _, info in records.values()] == list(records.names)
+    feature_dict = records.to_dict()
+    assert list(feature_dict) == [10, 30, 50, 70] and feature_dict[70][1]['feature_name'] == 'EcoRI'
+    assert [(cut_site, info['feature_name']) for cut_site, (_, info) in records.items()][0] == (10, 'BamHI, XbaI')
+    try:
+        records[20]
+        assert False
+    except KeyError:
+        pass
+    assert [info['feature_name'] for _, info in records.head(2)] == ['BamHI, XbaI', 'EcoRI'] and len(records.head(10)) == 4
+
+    rsfinder = RSFinder('data/pUC19_plasmid.fa', False)
+    rsfinder.create_enzyme_records(max_n_cut_sites = 2)
+    for start, name in zip(rsfinder.feature_info.starts.tolist(), rsfinder.feature_info.names):
+        assert all(int(start) in rsfinder.cut_store.cut_sites(enzyme) for enzyme in name.split(', '))
+    for cut_site, (feature, info) in rsfinder.feature_info.items():
+        assert rsfinder.feature_info[cut_site][1] == info and int(feature.location.start) == cut_site
+
+def test_lazy_imports():
+    #Bio.Restriction, numpy, pandas, reportlab and the scanning modules are only imported by what needs them
+    modules = ['Bio.Restriction', 'Bio.SeqIO', 'numpy', 'pandas', 'reportlab', 'plasmidin.site_scanner', 'plasmidin.cache']
+    check = f'import sys, plasmidin.plasmidin; print([module for module in {modules!r} if module in sys.modules])'
+    result = subprocess.run([sys.executable, '-c', check], capture_output = True, text = True, check = True)
+    assert result.stdout.strip() == '[]'
+
 if __name__ == '__main__':
     # test_RSFinder()
     # test_RSInserter()